@@ -9,20 +9,46 @@ import secrets
 import string
 import smtplib
 import redis
+from redis.retry import Retry
+from redis.backoff import NoBackoff
 from functools import wraps
 from email.mime.text import MIMEText
 from flask import (
-    Flask, request, jsonify, make_response, send_from_directory
+    Flask, request, jsonify, make_response,
+    Response, stream_with_context
 )
 from flask_sqlalchemy import SQLAlchemy
+from werkzeug.security import safe_join
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from dotenv import load_dotenv
 from flask_socketio import SocketIO
 import socket as py_socket # Đổi tên để tránh xung đột
 import threading
+import selectors
 import json
-from sqlalchemy import or_, func
+import base64
+import time
+import queue
+import multiprocessing
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import or_, and_, func, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload, lazyload, deferred, undefer
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from auth_cache import TokenCache
+from feed_cache import FeedCache
+from view_buffer import ViewBuffer
+from counters import CounterBuffer
+from timelines import Timelines
+from search_index import SearchIndex, fold
+from tag_index import TagIndex
+from doc_processing import process_document
+from file_response import file_etag, send_file_response
+from zip_stream import stream_zip, unique_names
 
 # ==========================================================
 # 🔧 CẤU HÌNH CƠ BẢN
@@ -40,7 +66,9 @@ DB_USER = os.environ.get('DB_USER', 'root')
 DB_PASS = os.environ.get('DB_PASS', '')
 DB_HOST = os.environ.get('DB_HOST', 'localhost')
 DB_NAME = os.environ.get('DB_NAME', 'upload_file')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}'
+# DATABASE_URL (nếu có) ghi đè cấu hình MySQL, vd: sqlite:// khi chạy benchmark
+app.config['SQLALCHEMY_DATABASE_URI'] = (os.environ.get('DATABASE_URL')
+                                         or f'mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}')
 
 # Đồng bộ thư mục uploads với socket server (../storage/uploads)
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -60,12 +88,68 @@ REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
 # ==========================================================
 db = SQLAlchemy(app)
 bcrypt = Bcrypt(app)
+# Chạy nhiều worker / node: các worker dùng chung hàng đợi tin nhắn (Redis) để
+# socketio.emit tới được trình duyệt đang nối vào worker khác. Vd: redis://localhost:6379/0
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+# Định danh worker (duy nhất trong cụm), dùng làm tên kênh nhận tin chuyển tiếp của cầu nối
+WORKER_ID = os.environ.get('WORKER_ID') or f"{py_socket.gethostname()}:{os.getpid()}"
+# Thời gian giữ quyền "worker chủ" cầu nối của một upload_id (giây)
+BRIDGE_OWNER_TTL = int(os.environ.get('BRIDGE_OWNER_TTL', 3600))
 # Cấu hình SocketIO làm cầu nối
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=SOCKETIO_MESSAGE_QUEUE)
 
 # Nơi mà server.py (TCP) đang chạy
 TCP_SERVER_HOST = '127.0.0.1'
-TCP_SERVER_PORT = 6000
+TCP_SERVER_PORT = int(os.environ.get('TCP_PORT', 6000))  # cùng biến môi trường với server.py
+# Số kết nối TCP dùng chung giữa các trình duyệt và server.py
+TCP_POOL_SIZE = int(os.environ.get('TCP_POOL_SIZE', 4))
+# Buffer nhận của cầu nối (một buffer dùng chung cho luồng reactor)
+BRIDGE_RECV_BUFFER = 256 * 1024
+# Chunk lớn nhất server.py nhận (cùng biến môi trường MAX_CHUNK_SIZE với server.py)
+BRIDGE_MAX_CHUNK_SIZE = int(os.environ.get('MAX_CHUNK_SIZE', 8 * 1024 * 1024))
+# Phân trang danh sách tài liệu (keyset): số dòng mặc định / tối đa mỗi trang
+PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT', 50))
+PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 200))
+# Số dòng mỗi lô khi xuất toàn bộ danh sách ở chế độ ?stream=
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+# Chỉ mục tìm kiếm trong tiến trình: SEARCH_INDEX=0 để tắt (tìm bằng SQL như cũ)
+SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX', '1') != '0'
+SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH',
+                                   os.path.join(BASE_DIR, '..', 'storage', 'search_index.pkl'))
+# Chu kỳ đồng bộ thay đổi từ DB (worker khác ghi) và chu kỳ lưu snapshot (giây)
+SEARCH_INDEX_SYNC = int(os.environ.get('SEARCH_INDEX_SYNC', 30))
+SEARCH_INDEX_SAVE = int(os.environ.get('SEARCH_INDEX_SAVE', 300))
+# Số ký tự nội dung (trích từ file) đưa vào chỉ mục cho mỗi tài liệu
+SEARCH_CONTENT_CHARS = int(os.environ.get('SEARCH_CONTENT_CHARS', 20000))
+# Chỉ mục gợi ý tag: chu kỳ nạp lại từ DB (giây) để thấy thay đổi của worker khác
+TAG_INDEX_RELOAD = int(os.environ.get('TAG_INDEX_RELOAD', 300))
+# Xử lý sau upload (trích văn bản, đếm trang, hash): số tiến trình xử lý của mỗi worker API
+# (0 = worker này không chạy job, chỉ xếp hàng), số lần thử, thời gian chờ trước lần thử lại
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY', 30))
+# Job 'running' quá thời gian này (giây) được coi là mất (worker chết) và xếp hàng lại
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 600))
+JOB_POLL_INTERVAL = int(os.environ.get('JOB_POLL_INTERVAL', 5))
+# Lượt xem được gom trong bộ nhớ và ghi theo lô: chu kỳ ghi (giây), số lượt chờ tối đa trước khi ghi sớm
+VIEW_FLUSH_INTERVAL = int(os.environ.get('VIEW_FLUSH_INTERVAL', 5))
+VIEW_FLUSH_MAX = int(os.environ.get('VIEW_FLUSH_MAX', 5000))
+# Bộ đếm lượt xem / yêu thích trên bảng documents: chu kỳ đối chiếu với bảng gốc (giây, 0 = tắt),
+# số tài liệu tối đa của bảng xếp hạng phổ biến
+COUNTER_RECONCILE_INTERVAL = int(os.environ.get('COUNTER_RECONCILE_INTERVAL', 3600))
+POPULAR_LIMIT_MAX = int(os.environ.get('POPULAR_LIMIT_MAX', 50))
+# Timeline (vừa xem, yêu thích) trên Redis: số phần tử giữ mỗi user, thời gian sống (giây)
+TIMELINE_MAX_LEN = int(os.environ.get('TIMELINE_MAX_LEN', 200))
+TIMELINE_TTL = int(os.environ.get('TIMELINE_TTL', 7 * 86400))
+# Tải file qua API: '' = Flask tự gửi (hỗ trợ Range, ETag); 'x-accel' = nginx gửi qua
+# X-Accel-Redirect (location internal DOWNLOAD_ACCEL_PREFIX trỏ tới thư mục uploads);
+# 'x-sendfile' = Apache mod_xsendfile / lighttpd gửi theo đường dẫn tuyệt đối
+DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD', '')
+DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected-uploads/')
+# Số tài liệu tối đa trong một lần tải ZIP nhiều tài liệu
+ARCHIVE_MAX_DOCS = int(os.environ.get('ARCHIVE_MAX_DOCS', 200))
+# Thời gian sống của vé tải xuống qua socket server (giây)
+DOWNLOAD_TICKET_TTL = int(os.environ.get('DOWNLOAD_TICKET_TTL', 60))
 try:
     r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
     r.ping()
@@ -74,6 +158,32 @@ except redis.exceptions.ConnectionError as e:
     print(f"⚠️ Lỗi Redis: {e}")
     r = None
 
+# Cache token đã xác thực (token_required): AUTH_CACHE_TTL=0 để tắt,
+# AUTH_CACHE_REDIS=1 để dùng chung cache giữa các worker qua Redis
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 60))
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+auth_cache = TokenCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL,
+                        redis_client=r if os.environ.get('AUTH_CACHE_REDIS') == '1' else None)
+if auth_cache.redis is not None:
+    threading.Thread(target=auth_cache.listen_invalidations, daemon=True).start()
+
+# Cache feed public / chi tiết tài liệu trên Redis: FEED_CACHE_TTL=0 để tắt.
+# Client riêng với timeout ngắn: Redis chậm / mất kết nối thì đọc thẳng DB.
+FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', 30))
+DOC_CACHE_TTL = int(os.environ.get('DOC_CACHE_TTL', 300))
+feed_cache = FeedCache(
+    redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True,
+                socket_timeout=0.5, socket_connect_timeout=0.5,
+                retry=Retry(NoBackoff(), 0)),
+    ttl=FEED_CACHE_TTL)
+
+def invalidate_document_cache(doc_id, *visibilities):
+    """ Xóa cache chi tiết của tài liệu, và các feed public nếu tài liệu đang / đã từng public """
+    groups = [f"doc:{doc_id}"]
+    if 'public' in visibilities:
+        groups.append('public')
+    feed_cache.invalidate(*groups)
+
 # ==========================================================
 # 🧱 DATABASE MODELS
 # ==========================================================
@@ -125,8 +235,36 @@ class Document(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    # Kết quả xử lý sau upload (xem DocumentJob)
+    processing_status = db.Column(db.String(20), nullable=True)
+    page_count = db.Column(db.Integer, nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    content_text = deferred(db.Column(db.Text, nullable=True))
+    # Bộ đếm (số người đã xem / đã thích): cộng theo lô, đối chiếu định kỳ (reconcile_counters)
+    view_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    favorite_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     tags = db.relationship('Tag', secondary=document_tags, lazy='subquery',
                            backref=db.backref('documents', lazy=True))
+    __table_args__ = (
+        db.Index('idx_status_visibility_views', 'status', 'visibility', 'view_count', 'id'),
+        db.Index('idx_status_visibility_favorites', 'status', 'visibility', 'favorite_count', 'id'),
+    )
+
+class DocumentJob(db.Model):
+    """ Hàng đợi xử lý sau upload, mỗi tài liệu một job (document_id duy nhất) """
+    __tablename__ = 'document_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), unique=True, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending | running | done | failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    run_after = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    document = db.relationship('Document')
+    __table_args__ = (db.Index('idx_job_status_run_after', 'status', 'run_after'),)
 
 class Tag(db.Model):
     __tablename__ = 'tags'
@@ -136,23 +274,172 @@ class Tag(db.Model):
 # ==========================================================
 # 🔐 JWT DECORATOR
 # ==========================================================
-def record_view(user, document): 
-    try: 
-        view = UserDocumentView.query.filter_by(
-            user_id=user.id, 
-            document_id=document.id
-        ).first()
-        
-        if view: 
-            view.last_viewed_at = datetime.datetime.utcnow()
-        else: 
-            view = UserDocumentView(user_id=user.id, document_id=document.id)
-            db.session.add(view)
-         
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        print(f"Lỗi khi ghi lại lượt xem: {e}")
+COUNTERS = ('view_count', 'favorite_count')
+
+def apply_counter_deltas(deltas):
+    """
+    Cộng {(document_id, bộ đếm): delta} vào bảng documents (chưa commit).
+    Gom các tài liệu cùng delta vào một UPDATE ... WHERE id IN (...).
+    """
+    table = Document.__table__
+    groups = {}
+    for (doc_id, counter), delta in deltas.items():
+        if delta and counter in COUNTERS:
+            groups.setdefault((counter, delta), []).append(doc_id)
+    for (counter, delta), doc_ids in groups.items():
+        for i in range(0, len(doc_ids), 1000):
+            # Gán lại updated_at để MySQL (ON UPDATE CURRENT_TIMESTAMP) / onupdate không đổi nó
+            db.session.execute(table.update()
+                               .where(table.c.id.in_(doc_ids[i:i + 1000]))
+                               .values({counter: table.c[counter] + delta,
+                                        'updated_at': table.c.updated_at}))
+
+def flush_counters(deltas):
+    with app.app_context():
+        try:
+            apply_counter_deltas(deltas)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+counter_buffer = CounterBuffer(flush_counters, interval=VIEW_FLUSH_INTERVAL, max_pending=VIEW_FLUSH_MAX)
+atexit.register(counter_buffer.flush)
+
+def upsert_views(items):
+    """ Ghi một lô lượt xem [(user_id, document_id, viewed_at)] bằng upsert hàng loạt """
+    table = UserDocumentView.__table__
+    with app.app_context():
+        try:
+            for i in range(0, len(items), 1000):
+                chunk = items[i:i + 1000]
+                # Bỏ lượt xem của tài liệu đã bị xóa vĩnh viễn (tránh lỗi khóa ngoại cả lô)
+                live = {doc_id for (doc_id,) in db.session.query(Document.id)
+                        .filter(Document.id.in_({doc_id for _, doc_id, _ in chunk}))}
+                rows = [{'user_id': user_id, 'document_id': doc_id, 'last_viewed_at': viewed_at}
+                        for user_id, doc_id, viewed_at in chunk if doc_id in live]
+                if not rows:
+                    continue
+                # Người xem mới (chưa có dòng) -> tăng view_count trong cùng giao dịch với upsert
+                seen = set(db.session.query(UserDocumentView.user_id, UserDocumentView.document_id)
+                           .filter(UserDocumentView.user_id.in_({row['user_id'] for row in rows}),
+                                   UserDocumentView.document_id.in_({row['document_id'] for row in rows})))
+                new_viewers = {}
+                for row in rows:
+                    if (row['user_id'], row['document_id']) not in seen:
+                        key = (row['document_id'], 'view_count')
+                        new_viewers[key] = new_viewers.get(key, 0) + 1
+                apply_counter_deltas(new_viewers)
+                dialect = db.engine.dialect.name
+                if dialect == 'mysql':
+                    stmt = mysql_insert(table).values(rows)
+                    stmt = stmt.on_duplicate_key_update(last_viewed_at=func.greatest(
+                        table.c.last_viewed_at, stmt.inserted.last_viewed_at))
+                elif dialect == 'sqlite':
+                    stmt = sqlite_insert(table).values(rows)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['user_id', 'document_id'],
+                        set_={'last_viewed_at': func.max(table.c.last_viewed_at, stmt.excluded.last_viewed_at)})
+                else:
+                    for row in rows:
+                        db.session.merge(UserDocumentView(**row))
+                    continue
+                db.session.execute(stmt)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+view_buffer = ViewBuffer(upsert_views, interval=VIEW_FLUSH_INTERVAL, max_pending=VIEW_FLUSH_MAX)
+# Ghi nốt các lượt xem còn trong buffer khi tiến trình dừng
+atexit.register(view_buffer.flush)
+
+def recent_views_from_db(user_id, limit):
+    """ [(document_id, last_viewed_at)] mới nhất trước: DB gộp với lượt xem còn trong buffer """
+    pending = view_buffer.pending(user_id)
+    rows = db.session.query(UserDocumentView.document_id, UserDocumentView.last_viewed_at) \
+        .filter(UserDocumentView.user_id == user_id) \
+        .order_by(UserDocumentView.last_viewed_at.desc(), UserDocumentView.document_id.desc()) \
+        .limit(limit + len(pending)).all()
+    latest = dict(rows)
+    for doc_id, viewed_at in pending.items():
+        if doc_id not in latest or viewed_at > latest[doc_id]:
+            latest[doc_id] = viewed_at
+    return sorted(latest.items(), key=lambda kv: (kv[1], kv[0]), reverse=True)[:limit]
+
+def favorites_from_db(user_id, limit):
+    """ [(document_id, created_at)] yêu thích mới nhất trước """
+    return db.session.query(UserFavorite.document_id, UserFavorite.created_at) \
+        .filter(UserFavorite.user_id == user_id) \
+        .order_by(UserFavorite.created_at.desc(), UserFavorite.document_id.desc()) \
+        .limit(limit).all()
+
+# Timeline vừa xem / yêu thích theo user trên Redis (MySQL vẫn là nguồn gốc, xem timelines.py)
+timelines = Timelines(feed_cache.redis, {'views': recent_views_from_db, 'favorites': favorites_from_db},
+                      additive=('views',), max_len=TIMELINE_MAX_LEN, ttl=TIMELINE_TTL)
+
+def favorited_ids(user_id, doc_ids):
+    """ Các tài liệu trong doc_ids mà user đã thích (Redis, thiếu thì hỏi DB) """
+    ids = timelines.members('favorites', user_id, doc_ids)
+    if ids is None:
+        ids = {doc_id for (doc_id,) in db.session.query(UserFavorite.document_id)
+               .filter(UserFavorite.user_id == user_id, UserFavorite.document_id.in_(list(doc_ids)))}
+    return ids
+
+def mark_favorites(docs, user_id, batch=STREAM_BATCH_SIZE):
+    """ Gắn d.is_favorited cho từng tài liệu (kiểm tra theo lô), giữ nguyên thứ tự """
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) >= batch:
+            yield from _mark_favorites(chunk, user_id)
+            chunk = []
+    yield from _mark_favorites(chunk, user_id)
+
+def _mark_favorites(chunk, user_id):
+    ids = favorited_ids(user_id, [d.id for d in chunk]) if chunk else set()
+    for doc in chunk:
+        doc.is_favorited = doc.id in ids
+        yield doc
+
+def record_view(user, document_id): 
+    """ Ghi nhận lượt xem vào buffer (không mở transaction trong request đọc) """
+    viewed_at = datetime.datetime.utcnow()
+    view_buffer.add(user.id, document_id, viewed_at)
+    timelines.touch('views', user.id, document_id, viewed_at)
+
+class CachedUser:
+    """ Snapshot nhẹ của User lấy từ cache token; chỉ tải bản ghi thật khi cần (vd: check_password) """
+
+    def __init__(self, id, name, email):
+        self.id = id
+        self.name = name
+        self.email = email
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = User.query.get(self.id)
+        return self._model
+
+    def __getattr__(self, attr):
+        return getattr(self.model, attr)
+
+
+def decode_login_token(token):
+    """
+    Giải mã token đăng nhập (/api/login). Vé ngắn hạn (có 'scope', vd: vé tải xuống) ký cùng
+    SECRET_KEY nhưng không được dùng thay token đăng nhập -> InvalidTokenError.
+    """
+    data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+    if data.get('scope') or 'user_id' not in data:
+        raise jwt.InvalidTokenError('scoped ticket is not a login token')
+    return data
 
 def token_required(f):
     @wraps(f)
@@ -164,8 +451,13 @@ def token_required(f):
         if not token:
             return jsonify({'message': 'Token missing!'}), 401
 
+        cached = auth_cache.get(token)
+        if cached:
+            # Cache trúng: không giải mã lại JWT, không truy vấn bảng users
+            return f(CachedUser(**cached[1]), *args, **kwargs)
+
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            data = decode_login_token(token)
             current_user = User.query.get(data['user_id'])
             if not current_user:
                 return jsonify({'message': 'User not found!'}), 401
@@ -174,6 +466,7 @@ def token_required(f):
         except jwt.InvalidTokenError:
             return jsonify({'message': 'Invalid token!'}), 401
 
+        auth_cache.put(token, data, {'id': current_user.id, 'name': current_user.name, 'email': current_user.email})
         return f(current_user, *args, **kwargs)
     return decorated
 
@@ -225,6 +518,7 @@ def change_password(current_user):
         return jsonify({'message': 'Mật khẩu cũ không đúng'}), 400
     current_user.set_password(data.get('new_password'))
     db.session.commit()
+    auth_cache.invalidate_user(current_user.id)
     return jsonify({'message': 'Đổi mật khẩu thành công'}), 200
 
 
@@ -282,6 +576,7 @@ def reset_password():
         return jsonify({"error": "User not found"}), 404
     user.set_password(new_password)
     db.session.commit()
+    auth_cache.invalidate_user(user.id)
     r.delete(f"otp:{email}")
     return jsonify({"message": "Password reset successfully"}), 200
 
@@ -297,18 +592,520 @@ def update_me(current_user):
     if not name:
         return jsonify({'message': 'Tên không được để trống'}), 400
         
-    current_user.name = name
+    # current_user có thể là snapshot từ cache token -> sửa trên bản ghi thật
+    user = User.query.get(current_user.id)
+    user.name = name
     db.session.commit()
+    auth_cache.invalidate_user(user.id)
+    # Tên người đăng nằm trong chi tiết tài liệu và feed trang chủ
+    doc_ids = [doc_id for (doc_id,) in db.session.query(Document.id).filter_by(user_id=user.id)]
+    feed_cache.invalidate('public', *[f"doc:{doc_id}" for doc_id in doc_ids])
      
     return jsonify({
         'message': 'Cập nhật thông tin thành công',
         'user': {
-            'id': current_user.id,
-            'name': current_user.name,
-            'email': current_user.email
+            'id': user.id,
+            'name': user.name,
+            'email': user.email
         }
     }), 200
 # ==========================================================
+# 📑 PHÂN TRANG (KEYSET)
+# ==========================================================
+# Trang sau được lọc bằng (thời gian, id) của dòng cuối trang trước thay vì OFFSET:
+# chi phí mỗi trang không tăng theo độ sâu và không trùng/sót dòng khi có tài liệu mới.
+def encode_cursor(ts, row_id):
+    raw = json.dumps([ts.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """ Trả về (datetime, id); ValueError nếu cursor hỏng """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        return datetime.datetime.fromisoformat(ts), int(row_id)
+    except Exception:
+        raise ValueError('invalid cursor')
+
+def page_size():
+    try:
+        limit = int(request.args.get('limit', PAGE_SIZE_DEFAULT))
+    except ValueError:
+        limit = PAGE_SIZE_DEFAULT
+    return max(1, min(limit, PAGE_SIZE_MAX))
+
+def keyset_after(query, ts_col, id_col, ts, row_id):
+    """ Lọc các dòng đứng sau (ts, row_id) theo thứ tự (ts_col, id_col) giảm dần """
+    return query.filter(or_(ts_col < ts, and_(ts_col == ts, id_col < row_id)))
+
+def keyset_page(query, ts_col, id_col, key=None):
+    """
+    Lấy một trang theo (ts_col, id_col) giảm dần, dùng ?cursor=&limit= của request.
+    key(row) -> (ts, id) để tạo cursor từ dòng cuối (mặc định: row.created_at, row.id).
+    Trả về (rows, next_cursor); next_cursor = None khi hết dữ liệu.
+    """
+    limit = page_size()
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = keyset_after(query, ts_col, id_col, *decode_cursor(cursor))
+    rows = query.order_by(ts_col.desc(), id_col.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(*(key(last) if key else (last.created_at, last.id)))
+    return rows, next_cursor
+
+# ==========================================================
+# 🌊 XUẤT TOÀN BỘ DANH SÁCH (STREAMING)
+# ==========================================================
+# ?stream=json (một mảng JSON) hoặc ?stream=ndjson (mỗi dòng một tài liệu):
+# duyệt query theo từng lô keyset và gửi dần, bộ nhớ không tăng theo số dòng.
+STREAM_FORMATS = ('json', 'ndjson')
+
+def iter_keyset(query, ts_col, id_col, key=None, batch=STREAM_BATCH_SIZE):
+    """ Duyệt toàn bộ query theo lô (ts_col, id_col) giảm dần """
+    last = None
+    while True:
+        q = keyset_after(query, ts_col, id_col, *last) if last else query
+        rows = q.order_by(ts_col.desc(), id_col.desc()).limit(batch).all()
+        if not rows:
+            return
+        last = key(rows[-1]) if key else (rows[-1].created_at, rows[-1].id)
+        yield from rows
+        # Không giữ object của các lô đã gửi trong identity map của session
+        db.session.expunge_all()
+        if len(rows) < batch:
+            return
+
+def stream_documents(rows, serialize, fmt):
+    """ Response dạng generator cho ?stream=json|ndjson """
+    def generate():
+        buf = []
+        if fmt == 'json':
+            yield '{"documents": ['
+        for i, row in enumerate(rows):
+            item = json.dumps(serialize(row))
+            buf.append(item + '\n' if fmt == 'ndjson' else (',' if i else '') + item)
+            if len(buf) >= 100:
+                yield ''.join(buf)
+                buf = []
+        if buf:
+            yield ''.join(buf)
+        if fmt == 'json':
+            yield ']}'
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def documents_response(query, serialize, ts_col=None, id_col=None, key=None):
+    """ Trả một trang (keyset) hoặc toàn bộ danh sách nếu có ?stream= """
+    ts_col = ts_col if ts_col is not None else Document.created_at
+    id_col = id_col if id_col is not None else Document.id
+    fmt = request.args.get('stream')
+    if fmt:
+        if fmt not in STREAM_FORMATS:
+            return jsonify({'message': 'stream phải là json hoặc ndjson'}), 400
+        return stream_documents(iter_keyset(query, ts_col, id_col, key), serialize, fmt)
+
+    try:
+        rows, next_cursor = keyset_page(query, ts_col, id_col, key)
+    except ValueError:
+        return jsonify({'message': 'Cursor không hợp lệ'}), 400
+    return jsonify({'documents': [serialize(row) for row in rows], 'next_cursor': next_cursor}), 200
+
+# ==========================================================
+# 🔎 CHỈ MỤC TÌM KIẾM
+# ==========================================================
+# Mỗi tiến trình giữ một SearchIndex. Ghi (tạo/sửa/xóa) ở worker này cập nhật ngay;
+# thay đổi từ worker khác được đồng bộ theo updated_at mỗi SEARCH_INDEX_SYNC giây.
+search_index = SearchIndex()
+search_index_ready = threading.Event()
+search_index_started = threading.Lock()
+
+def index_document(doc, index=None):
+    """ Cập nhật chỉ mục theo trạng thái hiện tại của tài liệu (chỉ 'uploaded' được tìm thấy) """
+    index = index if index is not None else search_index
+    if doc.status != 'uploaded':
+        index.remove(doc.id)
+        return
+    created_ts = doc.created_at.timestamp() if doc.created_at else 0
+    index.add(doc.id, doc.user_id, doc.visibility, created_ts,
+              doc.filename, doc.description or '', [t.name for t in doc.tags],
+              (doc.content_text or '')[:SEARCH_CONTENT_CHARS])
+
+def build_search_index():
+    """ Dựng chỉ mục từ đầu từ DB """
+    index = SearchIndex()
+    index.bulk()
+    query = Document.query.options(selectinload(Document.tags), undefer(Document.content_text)) \
+        .filter_by(status='uploaded')
+    for doc in iter_keyset(query, Document.created_at, Document.id, batch=5000):
+        index_document(doc, index)
+    db.session.remove()
+    return index
+
+def sync_search_index(index, since):
+    """ Nạp lại tài liệu đổi sau thời điểm `since` và bỏ tài liệu đã xóa vĩnh viễn; trả về số thay đổi """
+    changed = 0
+    # updated_at lưu theo UTC (datetime.utcnow); lùi 1 giây để không sót bản ghi cùng giây
+    since_dt = datetime.datetime.utcfromtimestamp(since - 1)
+    query = Document.query.options(selectinload(Document.tags), undefer(Document.content_text)) \
+        .filter(Document.updated_at >= since_dt)
+    for doc in query:
+        index_document(doc, index)
+        changed += 1
+
+    # Bỏ vào / lấy ra khỏi thùng rác đã đổi updated_at (nạp ở trên); chỉ xóa vĩnh viễn để lại
+    # tài liệu thừa trong chỉ mục. Đếm (dùng index status) trước, chỉ quét id khi số lượng lệch.
+    live_count = db.session.query(func.count(Document.id)).filter(Document.status == 'uploaded').scalar()
+    if live_count != len(index):
+        live = {doc_id for (doc_id,) in db.session.query(Document.id).filter(Document.status == 'uploaded')}
+        for doc_id in [doc_id for doc_id in list(index.docs) if doc_id not in live]:
+            index.remove(doc_id)
+            changed += 1
+    db.session.remove()
+    return changed
+
+def search_index_worker():
+    """ Luồng nền: nạp snapshot (hoặc dựng mới), rồi đồng bộ và lưu snapshot định kỳ """
+    global search_index
+    with app.app_context():
+        started = time.time()
+        index = None
+        try:
+            index = SearchIndex.load(SEARCH_INDEX_PATH)
+        except Exception as e:
+            print(f"[Search] ⚠️ Không đọc được snapshot chỉ mục: {e}")
+        fresh = index is None
+        if fresh:
+            index = build_search_index()
+        # Các ghi trong lúc dựng/nạp đi vào chỉ mục cũ -> đồng bộ lại sau khi đổi sang chỉ mục mới
+        search_index = index
+        changed = sync_search_index(index, started if fresh else min(index.saved_at, started))
+        search_index_ready.set()
+        print(f"[Search] ✅ Chỉ mục sẵn sàng: {len(index)} tài liệu ({time.time() - started:.1f}s).")
+
+        last_sync, last_save, dirty = started, 0.0, fresh or changed > 0
+        while True:
+            time.sleep(SEARCH_INDEX_SYNC)
+            now = time.time()
+            try:
+                dirty = sync_search_index(index, last_sync) > 0 or dirty
+                last_sync = now
+                if dirty and now - last_save >= SEARCH_INDEX_SAVE:
+                    index.save(SEARCH_INDEX_PATH, saved_at=last_sync)
+                    last_save, dirty = now, False
+            except Exception as e:
+                print(f"[Search] ⚠️ Lỗi đồng bộ chỉ mục: {e}")
+                db.session.rollback()
+
+def start_search_index():
+    """ Khởi động luồng chỉ mục (một lần mỗi tiến trình) """
+    if SEARCH_INDEX_ENABLED and search_index_started.acquire(blocking=False):
+        threading.Thread(target=search_index_worker, daemon=True).start()
+
+def load_documents_by_ids(ids, user_id):
+    """ Nạp tài liệu theo thứ tự ids (theo lô), kiểm tra lại trạng thái / quyền xem trong DB """
+    for i in range(0, len(ids), STREAM_BATCH_SIZE):
+        chunk = ids[i:i + STREAM_BATCH_SIZE]
+        rows = Document.query \
+            .options(selectinload(Document.tags), selectinload(Document.owner)) \
+            .filter(Document.id.in_(chunk), Document.status == 'uploaded',
+                    or_(Document.visibility == 'public', Document.user_id == user_id))
+        by_id = {d.id: d for d in rows}
+        for doc_id in chunk:
+            if doc_id in by_id:
+                yield by_id[doc_id]
+        db.session.expunge_all()
+
+# ==========================================================
+# 🏷️ TAG (tra / tạo theo lô, chỉ mục gợi ý)
+# ==========================================================
+tag_index = TagIndex()
+tag_index_ready = threading.Event()
+tag_index_lock = threading.Lock()
+tag_index_started = threading.Lock()
+
+def resolve_tags(raw_names):
+    """
+    Chuẩn hóa tên tag và lấy / tạo các Tag theo lô (thay cho một truy vấn mỗi tag):
+    một SELECT ... IN, và một INSERT nhiều dòng (bỏ qua tag worker khác vừa tạo) cho tag mới.
+    """
+    names = list(dict.fromkeys(t.strip().lower() for t in raw_names or [] if isinstance(t, str) and t.strip()))
+    if not names:
+        return []
+    found = {t.name: t for t in Tag.query.filter(Tag.name.in_(names))}
+    # Collation không phân biệt dấu (MySQL *_ci): "toan" trả về tag "toán" đã có
+    by_fold = {fold(name): tag for name, tag in found.items()}
+    new = [name for name in names if name not in found and fold(name) not in by_fold]
+    if new:
+        table = Tag.__table__
+        rows = [{'name': name} for name in new]
+        dialect = db.engine.dialect.name
+        if dialect == 'mysql':
+            db.session.execute(mysql_insert(table).prefix_with('IGNORE').values(rows))
+        elif dialect == 'sqlite':
+            db.session.execute(sqlite_insert(table).values(rows).on_conflict_do_nothing())
+        else:
+            for name in new:
+                with db.session.begin_nested():
+                    db.session.add(Tag(name=name))
+        for tag in Tag.query.filter(Tag.name.in_(new)):
+            found[tag.name] = by_fold[fold(tag.name)] = tag
+            tag_index.add(tag.name)
+    tags = [found.get(name) or by_fold.get(fold(name)) for name in names]
+    return list({tag.id: tag for tag in tags if tag is not None}.values())
+
+def listed_tags(doc):
+    """ Tên tags tính vào số lần dùng của chỉ mục gợi ý (chỉ tài liệu public đang hiển thị) """
+    if doc.visibility == 'public' and doc.status == 'uploaded':
+        return [t.name for t in doc.tags]
+    return []
+
+def load_tag_index():
+    """ Dựng chỉ mục gợi ý từ DB: mọi tag, đếm số tài liệu public đang dùng """
+    listed = and_(Document.id == document_tags.c.document_id,
+                  Document.visibility == 'public', Document.status == 'uploaded')
+    rows = db.session.query(Tag.name, func.count(Document.id)) \
+        .outerjoin(document_tags, document_tags.c.tag_id == Tag.id) \
+        .outerjoin(Document, listed) \
+        .group_by(Tag.id, Tag.name)
+    return TagIndex(dict(rows))
+
+def ensure_tag_index():
+    """ Nạp chỉ mục lần đầu nếu luồng nền chưa chạy (vd: chạy bằng gunicorn) """
+    global tag_index
+    if tag_index_ready.is_set():
+        return
+    with tag_index_lock:
+        if not tag_index_ready.is_set():
+            tag_index = load_tag_index()
+            tag_index_ready.set()
+
+def tag_index_worker():
+    """ Luồng nền: nạp chỉ mục khi khởi động, rồi nạp lại định kỳ (sửa lệch do worker khác ghi) """
+    global tag_index
+    with app.app_context():
+        while True:
+            try:
+                if tag_index_ready.is_set():
+                    tag_index = load_tag_index()
+                else:
+                    ensure_tag_index()
+                    print(f"[Tags] ✅ Chỉ mục gợi ý tag sẵn sàng: {len(tag_index)} tag.")
+            except Exception as e:
+                print(f"[Tags] ⚠️ Lỗi nạp chỉ mục tag: {e}")
+            finally:
+                db.session.remove()
+            time.sleep(TAG_INDEX_RELOAD)
+
+def start_tag_index():
+    """ Khởi động luồng chỉ mục tag (một lần mỗi tiến trình) """
+    if tag_index_started.acquire(blocking=False):
+        threading.Thread(target=tag_index_worker, daemon=True).start()
+
+# ==========================================================
+# ⚙️ XỬ LÝ SAU UPLOAD (JOB)
+# ==========================================================
+# Hàng đợi lưu trong bảng document_jobs (không mất khi khởi động lại). Luồng điều phối
+# nhận job bằng UPDATE có điều kiện (nhiều worker không nhận trùng), chạy doc_processing
+# trong process pool giới hạn JOB_WORKERS, rồi ghi kết quả vào Document.
+job_wakeup = threading.Event()
+job_results = queue.Queue()
+job_dispatcher_started = threading.Lock()
+
+def enqueue_document_job(doc, force=False):
+    """
+    Xếp hàng xử lý tài liệu (gọi trước commit). Idempotent: job đang chờ / đang chạy thì
+    giữ nguyên; job đã xong / lỗi chỉ chạy lại khi force=True.
+    """
+    job = DocumentJob.query.filter_by(document_id=doc.id).first() if doc.id else None
+    if job is None:
+        job = DocumentJob(document=doc)
+        db.session.add(job)
+    elif job.status in ('pending', 'running') or not force:
+        return job
+    job.status, job.attempts, job.last_error = 'pending', 0, None
+    job.run_after = datetime.datetime.utcnow()
+    doc.processing_status = 'pending'
+    return job
+
+def claim_jobs(limit):
+    """ Nhận tối đa `limit` job đến hạn; trả về [(job_id, document_id, file_path, content_hash)] """
+    now = datetime.datetime.utcnow()
+    # Job của worker đã chết (running quá JOB_TIMEOUT) được xếp hàng lại
+    DocumentJob.query.filter(DocumentJob.status == 'running',
+                             DocumentJob.locked_at < now - datetime.timedelta(seconds=JOB_TIMEOUT)) \
+        .update({'status': 'pending', 'locked_by': None}, synchronize_session=False)
+    db.session.commit()
+
+    candidates = db.session.query(DocumentJob.id).filter(DocumentJob.status == 'pending',
+                                                         DocumentJob.run_after <= now) \
+        .order_by(DocumentJob.run_after, DocumentJob.id).limit(limit * 2).all()
+    claimed = []
+    for (job_id,) in candidates:
+        if len(claimed) >= limit:
+            break
+        taken = DocumentJob.query.filter_by(id=job_id, status='pending').update({
+            'status': 'running', 'locked_by': WORKER_ID, 'locked_at': now,
+            'attempts': DocumentJob.attempts + 1,
+        }, synchronize_session=False)
+        db.session.commit()
+        if taken:
+            claimed.append(job_id)
+    if not claimed:
+        return []
+
+    rows = db.session.query(DocumentJob.id, Document.id, Document.file_path, Document.content_hash) \
+        .join(Document, Document.id == DocumentJob.document_id) \
+        .filter(DocumentJob.id.in_(claimed)).all()
+    Document.query.filter(Document.id.in_([row[1] for row in rows])) \
+        .update({'processing_status': 'processing'}, synchronize_session=False)
+    db.session.commit()
+    return rows
+
+def finish_job(job_id, result=None, error=None):
+    """ Ghi kết quả (hoặc lỗi) của một job; bỏ qua nếu job đã bị worker khác nhận lại """
+    job = DocumentJob.query.get(job_id)
+    if job is None or job.status != 'running' or job.locked_by != WORKER_ID:
+        return
+    doc = Document.query.get(job.document_id)
+    job.locked_by = job.locked_at = None
+    if error is not None:
+        job.last_error = error[:2000]
+        if job.attempts >= JOB_MAX_ATTEMPTS:
+            job.status = 'failed'
+            doc.processing_status = 'failed'
+            print(f"[Job] ❌ Tài liệu {doc.id} xử lý thất bại sau {job.attempts} lần: {error}")
+        else:
+            # Thử lại sau JOB_RETRY_DELAY, 2x, 4x...
+            job.status = 'pending'
+            job.run_after = datetime.datetime.utcnow() + datetime.timedelta(
+                seconds=JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+            doc.processing_status = 'pending'
+        db.session.commit()
+        return
+
+    job.status, job.last_error = 'done', None
+    doc.processing_status = 'done'
+    doc.page_count = result['page_count']
+    doc.content_hash = result['content_hash']
+    doc.content_text = result['text']
+    db.session.commit()
+    index_document(doc)
+    invalidate_document_cache(doc.id)
+    print(f"[Job] ✅ Đã xử lý tài liệu {doc.id}: {doc.page_count} trang, {len(result['text'])} ký tự.")
+
+def job_dispatcher():
+    """ Luồng nền: nhận job từ DB, chạy trong process pool, ghi kết quả """
+    # spawn: tiến trình con không thừa hưởng luồng / kết nối DB của tiến trình API
+    new_pool = lambda: ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    pool, running = new_pool(), 0
+    with app.app_context():
+        while True:
+            job_wakeup.wait(JOB_POLL_INTERVAL)
+            job_wakeup.clear()
+            try:
+                while True:
+                    try:
+                        job_id, result, error = job_results.get_nowait()
+                    except queue.Empty:
+                        break
+                    running -= 1
+                    finish_job(job_id, result, error)
+
+                claimed = claim_jobs(JOB_WORKERS - running) if running < JOB_WORKERS else []
+                for job_id, doc_id, file_path, content_hash in claimed:
+                    abs_path = os.path.join(app.config['UPLOAD_FOLDER'], file_path)
+                    try:
+                        future = pool.submit(process_document, abs_path, content_hash)
+                    except BrokenProcessPool:
+                        # Một tiến trình con chết (vd: hết bộ nhớ) làm hỏng cả pool: tạo pool mới
+                        pool.shutdown(wait=False)
+                        pool = new_pool()
+                        future = pool.submit(process_document, abs_path, content_hash)
+                    future.add_done_callback(lambda f, job_id=job_id: job_done(job_id, f))
+                    running += 1
+            except Exception as e:
+                print(f"[Job] ⚠️ Lỗi điều phối job: {e}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+def job_done(job_id, future):
+    """ Gọi từ luồng của pool: chuyển kết quả về luồng điều phối (chỉ luồng đó ghi DB) """
+    error = future.exception()
+    job_results.put((job_id, None if error else future.result(),
+                     f"{type(error).__name__}: {error}" if error else None))
+    job_wakeup.set()
+
+def start_job_dispatcher():
+    """ Khởi động luồng điều phối job (một lần mỗi tiến trình, nếu JOB_WORKERS > 0) """
+    if JOB_WORKERS > 0 and job_dispatcher_started.acquire(blocking=False):
+        threading.Thread(target=job_dispatcher, daemon=True).start()
+    job_wakeup.set()
+
+# ==========================================================
+# 📊 ĐỐI CHIẾU BỘ ĐẾM
+# ==========================================================
+# view_count / favorite_count được cộng theo lô nên có thể lệch (tiến trình dừng khi còn
+# buffer, ghi trùng giữa các worker...). Job định kỳ đếm lại từ bảng gốc và sửa các dòng lệch.
+counter_reconciler_started = threading.Lock()
+
+def reconcile_counters(batch=5000):
+    """ Đếm lại bộ đếm theo từng khoảng id, chỉ ghi các tài liệu bị lệch; trả về số tài liệu đã sửa """
+    view_buffer.flush()
+    counter_buffer.flush()
+    table = Document.__table__
+    # Chỉ sửa khi bộ đếm chưa đổi kể từ lúc đọc: lô cộng chen giữa chừng không bị ghi đè
+    fix = table.update() \
+        .where(table.c.id == bindparam('doc_id'),
+               table.c.view_count == bindparam('old_views'),
+               table.c.favorite_count == bindparam('old_favorites')) \
+        .values(view_count=bindparam('views'), favorite_count=bindparam('favorites'),
+                updated_at=table.c.updated_at)
+    repaired, last_id = 0, 0
+    while True:
+        rows = db.session.query(Document.id, Document.view_count, Document.favorite_count) \
+            .filter(Document.id > last_id).order_by(Document.id).limit(batch).all()
+        if not rows:
+            return repaired
+        first_id, last_id = rows[0][0], rows[-1][0]
+        views = dict(db.session.query(UserDocumentView.document_id, func.count())
+                     .filter(UserDocumentView.document_id.between(first_id, last_id))
+                     .group_by(UserDocumentView.document_id))
+        favorites = dict(db.session.query(UserFavorite.document_id, func.count())
+                         .filter(UserFavorite.document_id.between(first_id, last_id))
+                         .group_by(UserFavorite.document_id))
+        fixes = [{'doc_id': doc_id, 'old_views': view_count, 'old_favorites': favorite_count,
+                  'views': views.get(doc_id, 0), 'favorites': favorites.get(doc_id, 0)}
+                 for doc_id, view_count, favorite_count in rows
+                 if (view_count, favorite_count) != (views.get(doc_id, 0), favorites.get(doc_id, 0))]
+        if fixes:
+            db.session.execute(fix, fixes)
+        db.session.commit()
+        repaired += len(fixes)
+
+def counter_reconcile_worker():
+    """ Luồng nền: đối chiếu ngay khi khởi động (điền bộ đếm sau khi nâng cấp CSDL), rồi định kỳ """
+    with app.app_context():
+        while True:
+            started = time.time()
+            try:
+                repaired = reconcile_counters()
+                print(f"[Counters] ✅ Đối chiếu bộ đếm: sửa {repaired} tài liệu ({time.time() - started:.1f}s).")
+            except Exception as e:
+                print(f"[Counters] ⚠️ Lỗi đối chiếu bộ đếm: {e}")
+                db.session.rollback()
+            time.sleep(COUNTER_RECONCILE_INTERVAL)
+
+def start_counter_reconciler():
+    """ Khởi động luồng đối chiếu bộ đếm (một lần mỗi tiến trình, nếu COUNTER_RECONCILE_INTERVAL > 0) """
+    if COUNTER_RECONCILE_INTERVAL > 0 and counter_reconciler_started.acquire(blocking=False):
+        threading.Thread(target=counter_reconcile_worker, daemon=True).start()
+
+# ==========================================================
 # 📄 DOCUMENT APIs
 # ==========================================================
 @app.route('/api/documents', methods=['POST'])
@@ -325,15 +1122,17 @@ def create_document(current_user):
         file_path=relative_path,
         description=data.get('description'),
         visibility=data.get('visibility', 'private'),
-        user_id=current_user.id
+        user_id=current_user.id,
+        processing_status='pending'
     )
-    tags = data.get('tags', [])
-    for t in tags:
-        tag = Tag.query.filter_by(name=t.strip().lower()).first() or Tag(name=t.strip().lower())
-        db.session.add(tag)
-        doc.tags.append(tag)
+    doc.tags = resolve_tags(data.get('tags', []))
     db.session.add(doc)
+    enqueue_document_job(doc)
     db.session.commit()
+    index_document(doc)
+    tag_index.update([], listed_tags(doc))
+    invalidate_document_cache(doc.id, doc.visibility)
+    start_job_dispatcher()
     print(f"[Flask] ✅ Metadata saved for {filename}")
     return jsonify({'message': 'Tạo metadata thành công', 'document_id': doc.id}), 201
 
@@ -342,14 +1141,14 @@ def create_document(current_user):
 def list_documents(current_user):
     user_docs_only = request.args.get('user') == 'true'
 
+    # Danh sách này không trả tags: bỏ eager-load (lazy='subquery') của quan hệ tags
     if user_docs_only:
-        query = Document.query.filter_by(
+        query = Document.query.options(lazyload(Document.tags)).filter_by(
             user_id=current_user.id,
             status='uploaded'
         )
     else:
-        from sqlalchemy import or_
-        query = Document.query.filter(
+        query = Document.query.options(lazyload(Document.tags)).filter(
             or_(
                 Document.user_id == current_user.id,
                 Document.visibility == 'public'
@@ -357,28 +1156,39 @@ def list_documents(current_user):
             Document.status == 'uploaded'
         )
 
-    docs = [{
+    return documents_response(query, lambda d: {
         'id': d.id,
         'filename': d.filename,
         'visibility': d.visibility,
         'user_id': d.user_id
-    } for d in query.all()]
-    return jsonify({'documents': docs}), 200
+    })
 
 @app.route('/api/documents/public', methods=['GET'])
 def list_public_documents():
-    docs = Document.query.filter_by(visibility='public', status='uploaded').all()
-    return jsonify({
-        'documents': [
-            {
-                'id': d.id,
-                'filename': d.filename,
-                'description': d.description,
-                'file_path': d.file_path,
-                'tags': [t.name for t in d.tags]
-            } for d in docs
-        ]
-    }), 200
+    # Tags nạp bằng một truy vấn IN cho cả trang, không lazy-load từng dòng
+    query = Document.query.options(selectinload(Document.tags)) \
+                          .filter_by(visibility='public', status='uploaded')
+    serialize = lambda d: {
+        'id': d.id,
+        'filename': d.filename,
+        'description': d.description,
+        'file_path': d.file_path,
+        'tags': [t.name for t in d.tags]
+    }
+    cursor = request.args.get('cursor')
+    if request.args.get('stream'):
+        return documents_response(query, serialize)
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'message': 'Cursor không hợp lệ'}), 400
+
+    # Từng trang (limit, cursor) được cache; tạo / sửa / xóa tài liệu public xóa cả nhóm 'public'
+    body = feed_cache.get_or_compute(
+        'public', f"page:{page_size()}:{cursor or ''}",
+        lambda: documents_response(query, serialize)[0].get_data(as_text=True))
+    return Response(body, mimetype='application/json')
 
 @app.route('/api/documents/<int:doc_id>/download', methods=['GET'])
 @token_required
@@ -388,10 +1198,88 @@ def download(current_user, doc_id):
         return jsonify({'message': 'Không tìm thấy tài liệu'}), 404
     if doc.user_id != current_user.id and doc.visibility == 'private':
         return jsonify({'message': 'Không có quyền truy cập'}), 403
-    record_view(current_user, doc)
-    directory = os.path.join(app.config['UPLOAD_FOLDER'], os.path.dirname(doc.file_path))
-    filename = os.path.basename(doc.file_path)
-    return send_from_directory(directory, filename, as_attachment=True)
+    record_view(current_user, doc.id)
+    abs_path = safe_join(app.config['UPLOAD_FOLDER'], doc.file_path)
+    if not abs_path or not os.path.isfile(abs_path):
+        return jsonify({'message': 'Không tìm thấy file'}), 404
+
+    # Range / ETag / If-None-Match: trình xem PDF, video tua tới đâu tải tới đó, tải dở thì tải tiếp
+    offload_path = None
+    if DOWNLOAD_OFFLOAD == 'x-accel':
+        offload_path = DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + doc.file_path.replace(os.sep, '/').lstrip('/')
+    elif DOWNLOAD_OFFLOAD == 'x-sendfile':
+        offload_path = os.path.abspath(abs_path)
+    return send_file_response(request, abs_path, file_etag(abs_path, doc.content_hash),
+                              os.path.basename(doc.file_path),
+                              offload=DOWNLOAD_OFFLOAD or None, offload_path=offload_path)
+
+@app.route('/api/documents/archive', methods=['POST'])
+@token_required
+def download_archive(current_user):
+    """
+    Tải nhiều tài liệu một lần (thư mục môn học, danh sách yêu thích...): body {"document_ids": [...]}.
+    ZIP được tạo dần trong lúc gửi: không file tạm, bộ nhớ không phụ thuộc kích thước file.
+    """
+    data = request.get_json(silent=True) or {}
+    ids = data.get('document_ids')
+    if not isinstance(ids, list) or not ids or any(type(i) is not int for i in ids):
+        return jsonify({'message': 'document_ids phải là danh sách id tài liệu'}), 400
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > ARCHIVE_MAX_DOCS:
+        return jsonify({'message': f'Tối đa {ARCHIVE_MAX_DOCS} tài liệu mỗi lần tải'}), 400
+
+    # Kiểm tra quyền như download: tài liệu private chỉ chủ sở hữu được tải
+    docs = {d.id: d for d in Document.query.options(lazyload(Document.tags)).filter(Document.id.in_(ids))}
+    missing = [doc_id for doc_id in ids if doc_id not in docs]
+    if missing:
+        return jsonify({'message': 'Không tìm thấy tài liệu', 'document_ids': missing}), 404
+    forbidden = [doc_id for doc_id in ids
+                 if docs[doc_id].user_id != current_user.id and docs[doc_id].visibility == 'private']
+    if forbidden:
+        return jsonify({'message': 'Không có quyền truy cập', 'document_ids': forbidden}), 403
+
+    paths = [safe_join(app.config['UPLOAD_FOLDER'], docs[doc_id].file_path) for doc_id in ids]
+    lost = [doc_id for doc_id, path in zip(ids, paths) if not path or not os.path.isfile(path)]
+    if lost:
+        return jsonify({'message': 'Không tìm thấy file', 'document_ids': lost}), 404
+    for doc_id in ids:
+        record_view(current_user, doc_id)
+
+    names = unique_names(os.path.basename(docs[doc_id].file_path) for doc_id in ids)
+    archive_name = f"tai-lieu-{datetime.datetime.now():%Y%m%d-%H%M%S}.zip"
+    return Response(stream_zip(list(zip(names, paths))), mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename="{archive_name}"',
+        'Cache-Control': 'no-store',
+        # nginx: gửi ngay từng đoạn, không gom cả response vào buffer
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/api/documents/<int:doc_id>/download-ticket', methods=['POST'])
+@token_required
+def issue_download_ticket(current_user, doc_id):
+    """ Cấp vé ngắn hạn để tải file trực tiếp từ socket server (sendfile), không chiếm worker Flask """
+    doc = Document.query.get(doc_id)
+    if not doc:
+        return jsonify({'message': 'Không tìm thấy tài liệu'}), 404
+    if doc.user_id != current_user.id and doc.visibility == 'private':
+        return jsonify({'message': 'Không có quyền truy cập'}), 403
+    record_view(current_user, doc.id)
+
+    ticket = jwt.encode({
+        'scope': 'download',
+        'doc_id': doc.id,
+        'user_id': current_user.id,
+        'file_path': doc.file_path,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=DOWNLOAD_TICKET_TTL)
+    }, app.config['SECRET_KEY'], algorithm="HS256")
+
+    return jsonify({
+        'ticket': ticket,
+        'expires_in': DOWNLOAD_TICKET_TTL,
+        'filename': doc.filename,
+        # Tải xuống chỉ có trên cổng TCP của server.py (cổng WebSocket chỉ nhận upload)
+        'socket_url': os.environ.get('DOWNLOAD_SOCKET_URL', f'tcp://{TCP_SERVER_HOST}:{TCP_SERVER_PORT}')
+    }), 200
 
 @app.route('/api/documents/<int:doc_id>/trash', methods=['POST'])
 @token_required
@@ -401,8 +1289,12 @@ def trash_document(current_user, doc_id):
     if not doc or doc.user_id != current_user.id:
         return jsonify({'message': 'Không có quyền xóa'}), 403
 
+    old_tags = listed_tags(doc)
     doc.status = 'trashed'  
     db.session.commit()
+    index_document(doc)
+    tag_index.update(old_tags, [])
+    invalidate_document_cache(doc.id, doc.visibility)
     return jsonify({'message': 'Đã chuyển vào thùng rác'}), 200
 
 @app.route('/api/documents/<int:doc_id>/restore', methods=['POST'])
@@ -413,8 +1305,12 @@ def restore_document(current_user, doc_id):
     if not doc or doc.user_id != current_user.id:
         return jsonify({'message': 'Không có quyền'}), 403
 
+    old_tags = listed_tags(doc)
     doc.status = 'uploaded'
     db.session.commit()
+    index_document(doc)
+    tag_index.update(old_tags, listed_tags(doc))
+    invalidate_document_cache(doc.id, doc.visibility)
     return jsonify({'message': 'Khôi phục thành công'}), 200
 
 @app.route('/api/documents/<int:doc_id>/permanent', methods=['DELETE'])
@@ -435,13 +1331,60 @@ def permanent_delete_document(current_user, doc_id):
             print(f"[Flask] 🗑️ File/Folder deleted: {full_dir_path}")
         except Exception as e:
             print(f"Lỗi xóa file vật lý: {e}") 
+    # Gỡ khỏi timeline của những người đã thích / đã xem
+    favorited_by = [user_id for (user_id,) in db.session.query(UserFavorite.user_id).filter_by(document_id=doc.id)]
+    viewed_by = {user_id for (user_id,) in db.session.query(UserDocumentView.user_id).filter_by(document_id=doc.id)}
     UserFavorite.query.filter_by(document_id=doc.id).delete() 
     UserDocumentView.query.filter_by(document_id=doc.id).delete() 
+    viewed_by |= view_buffer.discard_document(doc.id)
+    counter_buffer.discard_document(doc.id)
+    DocumentJob.query.filter_by(document_id=doc.id).delete()
+    visibility = doc.visibility
+    old_tags = listed_tags(doc)
     doc.tags.clear() 
     db.session.flush()  
     db.session.delete(doc)
     db.session.commit()
+    search_index.remove(doc_id)
+    tag_index.update(old_tags, [])
+    invalidate_document_cache(doc_id, visibility)
+    for user_id in favorited_by:
+        timelines.remove('favorites', user_id, doc_id)
+    for user_id in viewed_by:
+        timelines.remove('views', user_id, doc_id)
     return jsonify({'message': 'Xóa tài liệu vĩnh viễn thành công'}), 200
+
+@app.route('/api/documents/<int:doc_id>/processing', methods=['GET'])
+@token_required
+def get_processing_status(current_user, doc_id):
+    """ Trạng thái xử lý sau upload (UI hỏi định kỳ đến khi done / failed) """
+    doc = Document.query.get(doc_id)
+    if not doc:
+        return jsonify({'message': 'Không tìm thấy tài liệu'}), 404
+    if doc.user_id != current_user.id and doc.visibility == 'private':
+        return jsonify({'message': 'Không có quyền truy cập'}), 403
+
+    job = DocumentJob.query.filter_by(document_id=doc.id).first()
+    return jsonify({
+        'document_id': doc.id,
+        'status': doc.processing_status,
+        'attempts': job.attempts if job else 0,
+        'error': job.last_error if job and doc.user_id == current_user.id else None,
+        'page_count': doc.page_count,
+        'content_hash': doc.content_hash
+    }), 200
+
+@app.route('/api/documents/<int:doc_id>/processing', methods=['POST'])
+@token_required
+def retry_processing(current_user, doc_id):
+    """ Chủ tài liệu yêu cầu xử lý lại (vd: sau khi job thất bại) """
+    doc = Document.query.get(doc_id)
+    if not doc or doc.user_id != current_user.id:
+        return jsonify({'message': 'Không có quyền'}), 403
+    enqueue_document_job(doc, force=True)
+    db.session.commit()
+    start_job_dispatcher()
+    return jsonify({'message': 'Đã xếp hàng xử lý', 'status': doc.processing_status}), 202
 # ==========================================================
 # 🚀 SOCKET TRIGGER
 # ==========================================================
@@ -462,24 +1405,37 @@ def trigger_upload(current_user):
 @token_required
 def get_document_detail(current_user, doc_id):
     """ API để xem chi tiết 1 file (dùng cho modal xem trước) """
-    doc = Document.query.get(doc_id)
-    if not doc:
+    def load():
+        doc = Document.query.get(doc_id)
+        if not doc:
+            return 'null'
+        # Lưu kèm chủ sở hữu / chế độ hiển thị để kiểm tra quyền khi đọc từ cache
+        return app.json.dumps({
+            'user_id': doc.user_id,
+            'visibility': doc.visibility,
+            'payload': {
+                'id': doc.id,
+                'filename': doc.filename,
+                'file_path': doc.file_path,
+                'visibility': doc.visibility,
+                'description': doc.description,
+                'created_at': doc.created_at,
+                'tags': [t.name for t in doc.tags],
+                'owner_name': doc.owner.name,
+                'processing_status': doc.processing_status,
+                'page_count': doc.page_count
+            }
+        })
+
+    cached = json.loads(feed_cache.get_or_compute(f"doc:{doc_id}", 'detail', load, ttl=DOC_CACHE_TTL))
+    if not cached:
         return jsonify({'message': 'Không tìm thấy tài liệu'}), 404
     
     # Kiểm tra quyền: Hoặc là chủ file, hoặc file là public
-    if doc.user_id != current_user.id and doc.visibility == 'private':
+    if cached['user_id'] != current_user.id and cached['visibility'] == 'private':
         return jsonify({'message': 'Không có quyền truy cập'}), 403
-    record_view(current_user, doc)
-    return jsonify({
-        'id': doc.id,
-        'filename': doc.filename,
-        'file_path': doc.file_path,
-        'visibility': doc.visibility,
-        'description': doc.description,
-        'created_at': doc.created_at,
-        'tags': [t.name for t in doc.tags],
-        'owner_name': doc.owner.name 
-    }), 200
+    record_view(current_user, doc_id)
+    return jsonify(cached['payload']), 200
 
 
 @app.route('/api/documents/<int:doc_id>', methods=['PUT'])
@@ -496,6 +1452,8 @@ def update_document(current_user, doc_id):
         return jsonify({'message': 'Không có quyền chỉnh sửa'}), 403
 
     data = request.get_json()
+    old_visibility = doc.visibility
+    old_tags = listed_tags(doc)
     
     # Cập nhật các trường
     if 'description' in data:
@@ -505,97 +1463,367 @@ def update_document(current_user, doc_id):
     
     # Xử lý tags
     if 'tags' in data:
-        doc.tags.clear() # Xóa tag cũ
-        for t in data.get('tags', []):
-            tag_name = t.strip().lower()
-            if tag_name:
-                tag = Tag.query.filter_by(name=tag_name).first() or Tag(name=tag_name)
-                db.session.add(tag)
-                doc.tags.append(tag)
+        doc.tags = resolve_tags(data.get('tags'))
 
+    # Đổi tags không sửa cột nào của documents: cập nhật updated_at để worker khác đồng bộ chỉ mục
+    doc.updated_at = datetime.datetime.utcnow()
     db.session.commit()
+    index_document(doc)
+    tag_index.update(old_tags, listed_tags(doc))
+    # Đổi public <-> private: feed public thay đổi theo cả chế độ cũ lẫn mới
+    invalidate_document_cache(doc.id, old_visibility, doc.visibility)
     return jsonify({'message': 'Cập nhật thành công'}), 200
 
 # ==========================================================
 # 🔌 SOCKET-IO BRIDGE (CẦU NỐI)
 # ==========================================================
 
-# Lưu trữ các kết nối TCP cho mỗi client trình duyệt
-client_tcp_sockets = {}
+# Mọi trình duyệt dùng chung một pool nhỏ kết nối TCP tới server.py.
+# Phản hồi của server luôn kèm upload_id -> định tuyến về đúng trình duyệt (sid).
+upload_routes = {}          # upload_id -> sid (gắn khi 'start', chỉ sid đó gửi tiếp được)
+upload_route_users = {}     # upload_id -> user_id của token trong 'start'
+pending_chunk_headers = {}  # sid -> header 'chunk' đang chờ phần bytes đi kèm
+tcp_pool = [None] * TCP_POOL_SIZE
+tcp_pool_lock = threading.Lock()
+
+
+class BridgeConnection:
+    """ Một kết nối TCP dùng chung tới server.py, có khóa ghi để các khung không lẫn vào nhau """
+
+    def __init__(self, index):
+        self.index = index
+        self.sock = py_socket.create_connection((TCP_SERVER_HOST, TCP_SERVER_PORT))
+        self.sock.setsockopt(py_socket.SOL_SOCKET, py_socket.SO_RCVBUF, BRIDGE_RECV_BUFFER)
+        self.write_lock = threading.Lock()
+        self.sids = set()  # các trình duyệt đang đi qua kết nối này
+        self.closed = False
+        self.inbuf = bytearray()  # phần dòng chưa trọn nhận từ server
+        bridge_reactor.add(self)
+        print(f'[SocketIO] 🔗 Đã mở kết nối TCP dùng chung #{index} tới cổng {TCP_SERVER_PORT}.')
+
+    def send(self, *parts):
+        """ Gửi liền khối (vd: header chunk + dữ liệu) """
+        with self.write_lock:
+            for part in parts:
+                self.sock.sendall(part)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        bridge_reactor.remove(self)
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+
+class BridgeReactor:
+    """
+    Một luồng duy nhất (selectors) đọc phản hồi của mọi kết nối TCP trong pool.
+    Mỗi vòng: recv_into buffer lớn, tách dòng tăng dần, gom phản hồi theo trình duyệt
+    rồi emit một lần cho mỗi sid.
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.buf = bytearray(BRIDGE_RECV_BUFFER)
+        self.thread = None
+        # socketpair để đánh thức select() khi có kết nối mới được thêm vào
+        self._wake_r, self._wake_w = py_socket.socketpair()
+        self._wake_r.setblocking(False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+    def add(self, bridge):
+        with self.lock:
+            self.selector.register(bridge.sock, selectors.EVENT_READ, bridge)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self._wake()
+
+    def remove(self, bridge):
+        with self.lock:
+            try:
+                self.selector.unregister(bridge.sock)
+            except (KeyError, ValueError):
+                pass
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+
+    def run(self):
+        view = memoryview(self.buf)
+        while True:
+            try:
+                events = self.selector.select()
+            except Exception as e:
+                # vd: socket vừa bị đóng từ luồng khác; luồng reactor không được chết
+                print(f'[SocketIO] ⚠️ Lỗi select của cầu nối TCP: {e}')
+                time.sleep(0.1)
+                continue
+            batches = {}  # sid -> [phản hồi]
+            dead = []
+            for key, _ in events:
+                bridge = key.data
+                if bridge is None:
+                    try:
+                        self._wake_r.recv(4096)
+                    except OSError:
+                        pass
+                    continue
+                # Lỗi của một kết nối chỉ đóng kết nối đó, các kết nối khác vẫn chạy
+                try:
+                    n = bridge.sock.recv_into(self.buf)
+                    if not n:
+                        dead.append(bridge) # Server TCP đã đóng
+                        continue
+                    bridge.inbuf += view[:n]
+                    self._parse_lines(bridge, batches)
+                except Exception as e:
+                    print(f'[SocketIO] Lỗi đọc TCP #{bridge.index}: {e}')
+                    dead.append(bridge)
+
+            for sid, messages in batches.items():
+                try:
+                    if len(messages) == 1:
+                        # Gửi phản hồi về đúng trình duyệt
+                        socketio.emit('tcp_response', messages[0], room=sid)
+                    else:
+                        socketio.emit('tcp_responses', messages, room=sid)
+                except Exception as e:
+                    print(f'[SocketIO] Lỗi gửi phản hồi tới {sid}: {e}')
+
+            for bridge in dead:
+                # Kết nối hỏng: báo cho các trình duyệt đang dùng nó, lần upload sau sẽ mở kết nối mới
+                try:
+                    bridge.close()
+                    for sid in list(bridge.sids):
+                        socketio.emit('server_error', {'reason': 'TCP connection lost'}, room=sid)
+                except Exception as e:
+                    print(f'[SocketIO] Lỗi đóng kết nối TCP #{bridge.index}: {e}')
+                print(f'[SocketIO] ❎ Đã đóng kết nối TCP dùng chung #{bridge.index}.')
+
+    @staticmethod
+    def _parse_lines(bridge, batches):
+        """ Tách các dòng JSON trọn vẹn (server TCP kết thúc mỗi tin nhắn bằng \\n) """
+        inbuf = bridge.inbuf
+        start = 0
+        while True:
+            end = inbuf.find(b'\n', start)
+            if end < 0:
+                break
+            raw = bytes(inbuf[start:end])
+            start = end + 1
+            try:
+                message_json = json.loads(raw)
+            except Exception:
+                print(f'[SocketIO] Lỗi parse JSON từ TCP: {raw}')
+                continue
+            sid = upload_routes.get(message_json.get('upload_id'))
+            if sid:
+                batches.setdefault(sid, []).append(message_json)
+            else:
+                print(f'[SocketIO] Phản hồi không có trình duyệt nhận: {message_json}')
+        if start:
+            del inbuf[:start]
+
+
+bridge_reactor = BridgeReactor()
+
+
+def get_bridge_connection(sid):
+    """ Lấy (mở lazily) kết nối trong pool cho trình duyệt này """
+    index = hash(sid) % TCP_POOL_SIZE
+    with tcp_pool_lock:
+        conn = tcp_pool[index]
+        if conn is None or conn.closed:
+            conn = tcp_pool[index] = BridgeConnection(index)
+        return conn
+
 
 @socketio.on('connect')
 def handle_connect():
-    sid = request.sid
-    print(f'[SocketIO] ✅ Client {sid} đã kết nối (Trình duyệt).')
+    # Không mở TCP ở đây: kết nối chỉ được lấy từ pool khi trình duyệt bắt đầu upload
+    print(f'[SocketIO] ✅ Client {request.sid} đã kết nối (Trình duyệt).')
+
+
+# ----------------------------------------------------------
+# 🌐 NHIỀU WORKER: ĐỊNH TUYẾN CẦU NỐI QUA REDIS
+# ----------------------------------------------------------
+# Mỗi upload_id có một worker chủ giữ kết nối TCP của nó (khóa bridge:owner:<upload_id>).
+# Trình duyệt có thể đang nối vào worker khác (cân bằng tải, reconnect): tin nhắn của nó được
+# đẩy sang kênh Redis của worker chủ, còn phản hồi đi về qua message_queue của SocketIO.
+bridge_redis = redis.Redis.from_url(SOCKETIO_MESSAGE_QUEUE) if SOCKETIO_MESSAGE_QUEUE else None
+
+
+def bridge_channel(worker_id):
+    return f"bridge:relay:{worker_id}"
 
-    # Tạo một kết nối TCP MỚI đến server.py cho client này
-    try:
-        sock = py_socket.socket(py_socket.AF_INET, py_socket.SOCK_STREAM)
-        sock.connect((TCP_SERVER_HOST, TCP_SERVER_PORT))
-        client_tcp_sockets[sid] = sock
-        print(f'[SocketIO] 🔗 Đã tạo cầu nối TCP tới cổng 6000 cho {sid}.')
 
-        # Bắt đầu một luồng riêng để lắng nghe phản hồi từ server.py
-        threading.Thread(target=tcp_response_listener, args=(sid, sock), daemon=True).start()
+def bridge_owner(upload_id):
+    """ Worker chủ của upload_id; chưa có thì worker này nhận quyền """
+    key = f"bridge:owner:{upload_id}"
+    if bridge_redis.set(key, WORKER_ID, nx=True, ex=BRIDGE_OWNER_TTL):
+        return WORKER_ID
+    owner = bridge_redis.get(key)
+    return owner.decode('utf-8') if owner else WORKER_ID
+
+
+def forward_to_owner(owner, sid, header, data=b""):
+    """ Đẩy tin nhắn sang worker chủ. False nếu không còn worker nào nghe kênh đó """
+    payload = json.dumps({'sid': sid, 'header': header}).encode('utf-8') + b"\n" + data
+    return bridge_redis.publish(bridge_channel(owner), payload) > 0
+
+
+def bridge_reject(sid, upload_id, reason):
+    """ Trả lỗi cho trình duyệt như một phản hồi của server, không gửi gì xuống TCP """
+    socketio.emit('tcp_response', {'status': 'error', 'upload_id': upload_id, 'reason': reason}, room=sid)
+
+def check_bridge_message(sid, header, data):
+    """
+    Kiểm tra tin nhắn trước khi ghi vào kết nối TCP dùng chung (một khung sai làm lệch
+    luồng của mọi upload khác trên kết nối đó). Trả về header đã chuẩn hóa, None nếu từ chối.
+    - upload_id chỉ được gắn với sid khi 'start' (token hợp lệ); sid khác chỉ nhận lại được
+      upload_id của cùng người dùng (trình duyệt kết nối lại để resume)
+    - chunk: độ dài bytes phải đúng header['length'] và không vượt BRIDGE_MAX_CHUNK_SIZE
+    """
+    upload_id = header.get('upload_id')
+    if not isinstance(upload_id, str) or not upload_id:
+        bridge_reject(sid, None, 'missing_upload_id')
+        return None
+    action = header.get('action')
+    if action == 'start':
+        metadata = header.get('metadata')
+        try:
+            user_id = decode_login_token((metadata or {}).get('token') or '')['user_id']
+        except (jwt.InvalidTokenError, AttributeError):
+            bridge_reject(sid, upload_id, 'unauthorized')
+            return None
+        if upload_routes.get(upload_id) not in (None, sid) and upload_route_users.get(upload_id) != user_id:
+            print(f'[SocketIO] 🚫 {sid} cố nhận upload {upload_id} của người dùng khác.')
+            bridge_reject(sid, upload_id, 'forbidden')
+            return None
+        upload_routes[upload_id] = sid
+        upload_route_users[upload_id] = user_id
+    elif upload_routes.get(upload_id) != sid:
+        bridge_reject(sid, upload_id, 'forbidden')
+        return None
+
+    if action != 'chunk':
+        return header
+    try:
+        length, offset = int(header.get('length')), int(header.get('offset'))
+    except (TypeError, ValueError):
+        bridge_reject(sid, upload_id, 'invalid_length')
+        return None
+    if not isinstance(data, (bytes, bytearray)) or length != len(data) or not 0 < length <= BRIDGE_MAX_CHUNK_SIZE \
+            or offset < 0:
+        print(f'[SocketIO] 🚫 Chunk sai độ dài từ {sid} (header={header.get("length")}, '
+              f'bytes={len(data) if data is not None else None}).')
+        bridge_reject(sid, upload_id, 'invalid_length')
+        return None
+    return {'action': 'chunk', 'upload_id': upload_id, 'offset': offset, 'length': length}
+
+def relay_local(sid, header, data=None):
+    """ Gửi tin nhắn (và phần bytes của chunk) tới server.py qua pool TCP của worker này """
+    header = check_bridge_message(sid, header, data)
+    if header is None:
+        return
+    try:
+        bridge = get_bridge_connection(sid)
     except Exception as e:
-        print(f'[SocketIO] ❌ Không thể kết nối tới server TCP (cổng 6000): {e}')
+        print(f'[SocketIO] ❌ Không thể kết nối tới server TCP (cổng {TCP_SERVER_PORT}): {e}')
         socketio.emit('server_error', {'reason': 'Cannot connect to TCP server'}, room=sid)
+        return
+    bridge.sids.add(sid)
+    line = (json.dumps(header) + "\n").encode('utf-8')
+    try:
+        if data is None:
+            bridge.send(line)
+        else:
+            # Header + bytes gửi liền để không xen với khung của trình duyệt khác
+            bridge.send(line, data)
+    except Exception as e:
+        print(f'[SocketIO] Lỗi khi gửi dữ liệu tới TCP: {e}')
+        bridge.close()
 
-def tcp_response_listener(sid, tcp_sock):
-    """ Lắng nghe phản hồi từ server.py (TCP) và gửi về trình duyệt """
-    buffer = b""
+
+def relay_message(sid, header, data=None):
+    """ Chuyển tin nhắn của trình duyệt tới server.py, qua worker chủ nếu chạy nhiều worker """
+    upload_id = header.get('upload_id')
+    if bridge_redis is not None and upload_id:
+        try:
+            owner = bridge_owner(upload_id)
+            if owner != WORKER_ID:
+                if forward_to_owner(owner, sid, header, data if data is not None else b""):
+                    return
+                # Worker chủ đã dừng: worker này nhận quyền và tự chuyển tiếp
+                print(f'[SocketIO] ⚠️ Worker {owner} không phản hồi, nhận cầu nối của {upload_id}.')
+                bridge_redis.set(f"bridge:owner:{upload_id}", WORKER_ID, ex=BRIDGE_OWNER_TTL)
+            elif header.get('action') == 'start':
+                bridge_redis.expire(f"bridge:owner:{upload_id}", BRIDGE_OWNER_TTL)
+        except redis.exceptions.RedisError as e:
+            print(f'[SocketIO] ⚠️ Lỗi Redis khi định tuyến cầu nối, tự chuyển tiếp: {e}')
+    relay_local(sid, header, data)
+
+
+def bridge_relay_listener():
+    """ Nhận tin nhắn các worker khác chuyển sang cho những upload mà worker này làm chủ """
+    pubsub = bridge_redis.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(bridge_channel(WORKER_ID))
+    print(f'[SocketIO] 🌐 Worker {WORKER_ID} đang nhận tin chuyển tiếp của cầu nối.')
     try:
-        while True:
-            data = tcp_sock.recv(1024)
-            if not data:
-                break # Server TCP đã đóng
-
-            buffer += data
-            # Server TCP gửi tin nhắn JSON bằng \n
-            while b'\n' in buffer:
-                message_raw, buffer = buffer.split(b'\n', 1)
-                try:
-                    message_json = json.loads(message_raw.decode('utf-8'))
-                    # Gửi phản hồi về đúng trình duyệt
-                    socketio.emit('tcp_response', message_json, room=sid)
-                except Exception:
-                    print(f'[SocketIO] Lỗi parse JSON từ TCP: {message_raw}')
+        for item in pubsub.listen():
+            head, _, data = item['data'].partition(b"\n")
+            try:
+                message = json.loads(head)
+            except Exception:
+                print(f'[SocketIO] Tin chuyển tiếp không hợp lệ: {head[:200]}')
+                continue
+            header = message['header']
+            relay_local(message['sid'], header, data if header.get('action') == 'chunk' else None)
+    except redis.exceptions.RedisError as e:
+        print(f'[SocketIO] ❌ Mất kết nối Redis của cầu nối: {e}')
 
-    except Exception as e:
-        print(f'[SocketIO] Lỗi luồng TCP listener: {e}')
 
-    # Dọn dẹp khi kết nối hỏng
-    if sid in client_tcp_sockets:
-        del client_tcp_sockets[sid]
-    print(f'[SocketIO] ❎ Đã đóng luồng listener cho {sid}.')
+if bridge_redis is not None:
+    threading.Thread(target=bridge_relay_listener, daemon=True).start()
 
 
 @socketio.on('tcp_message')
 def handle_tcp_message(message):
     """ Nhận tin nhắn từ trình duyệt và chuyển tiếp đến server.py (TCP) """
     sid = request.sid
-    if sid not in client_tcp_sockets:
-        return # Lỗi, client chưa kết nối
-
-    tcp_sock = client_tcp_sockets[sid]
-
-    try:
-        if isinstance(message, dict): # Gửi JSON (header)
-            tcp_sock.sendall((json.dumps(message) + "\n").encode('utf-8'))
-        elif isinstance(message, bytes): # Gửi Bytes (chunk)
-            tcp_sock.sendall(message)
-    except Exception as e:
-        print(f'[SocketIO] Lỗi khi gửi dữ liệu tới TCP: {e}')
+    if isinstance(message, dict): # Gửi JSON (header)
+        if message.get('action') == 'chunk':
+            # Giữ header lại, gửi cùng phần bytes
+            pending_chunk_headers[sid] = message
+            return
+        relay_message(sid, message)
+    elif isinstance(message, bytes): # Gửi Bytes (chunk)
+        header = pending_chunk_headers.pop(sid, None)
+        if header is None:
+            print(f'[SocketIO] Bỏ qua chunk không có header từ {sid}.')
+            return
+        relay_message(sid, header, message)
 
 @socketio.on('disconnect')
 def handle_disconnect():
     sid = request.sid
-    if sid in client_tcp_sockets:
-        # Đóng kết nối TCP khi trình duyệt ngắt kết nối
-        try:
-            client_tcp_sockets[sid].close()
-        except Exception: pass
-        del client_tcp_sockets[sid]
+    # Chỉ gỡ định tuyến của trình duyệt này, kết nối TCP dùng chung vẫn giữ
+    for upload_id, owner in list(upload_routes.items()):
+        if owner == sid:
+            upload_routes.pop(upload_id, None)
+            upload_route_users.pop(upload_id, None)
+    pending_chunk_headers.pop(sid, None)
+    for bridge in tcp_pool:
+        if bridge:
+            bridge.sids.discard(sid)
     print(f'[SocketIO] ❎ Client {sid} đã ngắt kết nối (Trình duyệt).')
 @app.route('/api/documents/recent-public', methods=['GET'])
 def get_recent_public_documents():
@@ -607,24 +1835,61 @@ def get_recent_public_documents():
         # Sắp xếp theo ngày tạo, mới nhất trước
         # Lọc chỉ 'public'
         # Lấy 2 kết quả
-        recent_docs = Document.query.filter_by(visibility='public') \
-                                    .order_by(Document.created_at.desc()) \
-                                    .limit(2).all()
-        
-        docs_list = [{
-            'id': d.id,
-            'filename': d.filename,
-            # Lấy tên người đăng
-            'owner_name': d.owner.name, 
-            # Định dạng ngày cho dễ đọc
-            'created_at': d.created_at.strftime('%d/%m/%Y') 
-        } for d in recent_docs]
-        
-        return jsonify({'documents': docs_list}), 200
+        def load():
+            recent_docs = Document.query.options(joinedload(Document.owner)) \
+                                        .filter_by(visibility='public', status='uploaded') \
+                                        .order_by(Document.created_at.desc()) \
+                                        .limit(2).all()
+
+            docs_list = [{
+                'id': d.id,
+                'filename': d.filename,
+                # Lấy tên người đăng
+                'owner_name': d.owner.name, 
+                # Định dạng ngày cho dễ đọc
+                'created_at': d.created_at.strftime('%d/%m/%Y') 
+            } for d in recent_docs]
+            return app.json.dumps({'documents': docs_list})
+
+        # Trang chủ gọi API này cho mọi lượt truy cập: đọc từ cache, chỉ một request tính lại khi hết hạn
+        return Response(feed_cache.get_or_compute('public', 'recent', load), mimetype='application/json')
     
     except Exception as e:
         print(f"Lỗi /api/documents/recent-public: {e}")
         return jsonify({'message': 'Lỗi máy chủ khi lấy tài liệu'}), 500
+
+@app.route('/api/documents/popular', methods=['GET'])
+def get_popular_documents():
+    """
+    Tài liệu public phổ biến nhất, xếp theo bộ đếm trên bảng documents (không COUNT(*)).
+    ?by=views|favorites, ?limit= (tối đa POPULAR_LIMIT_MAX). Không cần token.
+    """
+    by = request.args.get('by', 'views')
+    column = {'views': Document.view_count, 'favorites': Document.favorite_count}.get(by)
+    if column is None:
+        return jsonify({'message': 'by phải là views hoặc favorites'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), POPULAR_LIMIT_MAX)
+    except ValueError:
+        return jsonify({'message': 'limit không hợp lệ'}), 400
+
+    def load():
+        docs = Document.query.options(joinedload(Document.owner), lazyload(Document.tags)) \
+                             .filter_by(visibility='public', status='uploaded') \
+                             .order_by(column.desc(), Document.id.desc()) \
+                             .limit(limit).all()
+        return app.json.dumps({'documents': [{
+            'id': d.id,
+            'filename': d.filename,
+            'owner_name': d.owner.name,
+            'created_at': d.created_at.strftime('%d/%m/%Y'),
+            'view_count': d.view_count,
+            'favorite_count': d.favorite_count
+        } for d in docs]})
+
+    # Bộ đếm đổi liên tục nên không xóa cache theo lượt xem: bảng xếp hạng cũ tối đa FEED_CACHE_TTL giây
+    return Response(feed_cache.get_or_compute('public', f"popular:{by}:{limit}", load),
+                    mimetype='application/json')
 # ==========================================================
 # 📄 API (Vừa xem, Yêu thích, Thùng rác)
 # ==========================================================
@@ -633,11 +1898,15 @@ def get_recent_public_documents():
 @token_required
 def get_recently_viewed(current_user): 
     try: 
-        docs = Document.query \
-            .join(UserDocumentView, Document.id == UserDocumentView.document_id) \
-            .filter(UserDocumentView.user_id == current_user.id) \
-            .order_by(UserDocumentView.last_viewed_at.desc()) \
-            .limit(2).all()
+        # Timeline trên Redis; Redis lỗi thì gộp DB với lượt xem còn trong buffer (chưa flush)
+        limit = 2
+        page = timelines.page('views', current_user.id, limit)
+        if page is None:
+            page = recent_views_from_db(current_user.id, limit)
+        top = [doc_id for doc_id, _ in page]
+        by_id = {d.id: d for d in Document.query.options(joinedload(Document.owner))
+                 .filter(Document.id.in_(top))}
+        docs = [by_id[doc_id] for doc_id in top if doc_id in by_id]
         
         docs_list = [{
             'id': d.id,
@@ -654,63 +1923,147 @@ def get_recently_viewed(current_user):
 @app.route('/api/documents/trash', methods=['GET'])
 @token_required
 def get_trash(current_user):
-    """ MỚI: Lấy danh sách file trong thùng rác """
-    trashed_docs = Document.query.filter_by(
+    """ MỚI: Lấy danh sách file trong thùng rác (mới bỏ vào trước, phân trang theo updated_at) """
+    query = Document.query.options(lazyload(Document.tags)).filter_by(
         user_id=current_user.id, 
         status='trashed'
-    ).order_by(Document.updated_at.desc()).all()
-    
-    docs_list = [{ 'id': d.id, 'filename': d.filename } for d in trashed_docs]
-    return jsonify({'documents': docs_list}), 200
+    )
+    return documents_response(query, lambda d: { 'id': d.id, 'filename': d.filename },
+                              Document.updated_at, Document.id, key=lambda d: (d.updated_at, d.id))
 
 @app.route('/api/documents/favorites', methods=['GET'])
 @token_required
 def get_favorites(current_user):
-    """ MỚI: Lấy danh sách file yêu thích """
-    fav_docs = Document.query \
+    """ MỚI: Lấy danh sách file yêu thích (mới thích trước) """
+    serialize = lambda row: {
+        'id': row[0].id,
+        'filename': row[0].filename,
+        'owner_name': row[0].owner.name,
+        'description': row[0].description
+    }
+
+    # Trang lấy từ timeline trên Redis (không JOIN / sắp xếp trong DB), chỉ nạp tài liệu theo id
+    cursor = request.args.get('cursor')
+    if not request.args.get('stream'):
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'message': 'Cursor không hợp lệ'}), 400
+        limit = page_size()
+        page = timelines.page('favorites', current_user.id, limit + 1, before)
+        if page is not None:
+            by_id = {d.id: d for d in Document.query
+                     .options(joinedload(Document.owner), lazyload(Document.tags))
+                     .filter(Document.id.in_([doc_id for doc_id, _ in page[:limit]]))}
+            rows = [(by_id[doc_id], at) for doc_id, at in page[:limit] if doc_id in by_id]
+            next_cursor = encode_cursor(page[limit - 1][1], page[limit - 1][0]) if len(page) > limit else None
+            return jsonify({'documents': [serialize(row) for row in rows], 'next_cursor': next_cursor}), 200
+
+    # Người đăng nạp bằng JOIN trong cùng truy vấn, không truy vấn riêng cho từng tài liệu
+    query = db.session.query(Document, UserFavorite.created_at) \
         .join(UserFavorite, Document.id == UserFavorite.document_id) \
-        .filter(UserFavorite.user_id == current_user.id) \
-        .order_by(UserFavorite.created_at.desc()).all()
-
-    docs_list = [{
-        'id': d.id,
-        'filename': d.filename,
-        'owner_name': d.owner.name,
-        'description': d.description
-    } for d in fav_docs]
-    
-    return jsonify({'documents': docs_list}), 200
+        .options(joinedload(Document.owner), lazyload(Document.tags)) \
+        .filter(UserFavorite.user_id == current_user.id)
+    return documents_response(query, serialize, UserFavorite.created_at, Document.id,
+                              key=lambda row: (row[1], row[0].id))
 
 @app.route('/api/documents/<int:doc_id>/favorite', methods=['POST'])
 @token_required
 def toggle_favorite(current_user, doc_id):
     """ MỚI: Bật/Tắt yêu thích (toggle) """
-    doc = Document.query.get(doc_id)
-    if not doc:
+    if not db.session.query(Document.id).filter_by(id=doc_id).first():
         return jsonify({'message': 'Không tìm thấy tài liệu'}), 404
+    user_id = current_user.id  # sau commit không phải nạp lại current_user
 
-    fav = UserFavorite.query.filter_by(
-        user_id=current_user.id, 
-        document_id=doc.id
-    ).first()
-    
-    if fav: 
-        db.session.delete(fav)
+    # Đã thích chưa: hỏi timeline trên Redis trước, chỉ xuống DB khi Redis không chắc
+    if doc_id in favorited_ids(user_id, [doc_id]):
+        removed = UserFavorite.query.filter_by(user_id=user_id, document_id=doc_id) \
+            .delete(synchronize_session=False)
         db.session.commit()
-        return jsonify({'message': 'Đã bỏ yêu thích', 'isFavorited': False}), 200
-    else: 
-        new_fav = UserFavorite(user_id=current_user.id, document_id=doc.id)
-        db.session.add(new_fav)
+        timelines.remove('favorites', user_id, doc_id)
+        if removed:
+            counter_buffer.add(doc_id, 'favorite_count', -1)
+            return jsonify({'message': 'Đã bỏ yêu thích', 'isFavorited': False}), 200
+        # Redis cũ hơn DB (đã bỏ thích ở nơi khác): coi như lượt bấm này là thích
+
+    created_at = datetime.datetime.utcnow()
+    db.session.add(UserFavorite(user_id=user_id, document_id=doc_id, created_at=created_at))
+    try:
         db.session.commit()
-        return jsonify({'message': 'Đã yêu thích', 'isFavorited': True}), 201
+        counter_buffer.add(doc_id, 'favorite_count', 1)
+    except IntegrityError:
+        # Đã thích (bấm trùng từ tab khác): giữ nguyên trạng thái đã thích
+        db.session.rollback()
+        created_at = UserFavorite.query.get((user_id, doc_id)).created_at
+    timelines.touch('favorites', user_id, doc_id, created_at)
+    return jsonify({'message': 'Đã yêu thích', 'isFavorited': True}), 201
 @app.route('/api/documents/search', methods=['GET'])
 @token_required
 def search_documents(current_user): 
     keyword = request.args.get('q', '').strip()
     if not keyword:
         return jsonify({'message': 'Vui lòng nhập từ khóa tìm kiếm'}), 400
- 
-    docs_query = Document.query \
+
+    fmt = request.args.get('stream')
+    if fmt and fmt not in STREAM_FORMATS:
+        return jsonify({'message': 'stream phải là json hoặc ndjson'}), 400
+    # Kết quả xếp theo điểm (không phải theo thời gian) nên phân trang bằng offset, không dùng cursor
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'message': 'offset không hợp lệ'}), 400
+    limit = page_size()
+
+    def serialize(d):
+        return {
+            'id': d.id,
+            'filename': d.filename,
+            'description': d.description,
+            'visibility': d.visibility,
+            'user_id': d.user_id,
+            'tags': [t.name for t in d.tags],
+            'owner_name': d.owner.name,
+            'is_favorited': d.is_favorited
+        }
+
+    start_search_index()
+    if search_index_ready.is_set():
+        # Chỉ mục trả id theo điểm; DB chỉ nạp đúng các tài liệu cần trả về
+        if fmt:
+            ids, total = search_index.search(keyword, current_user.id)
+        else:
+            ids, total = search_index.search(keyword, current_user.id, limit=limit, offset=offset)
+        rows = mark_favorites(load_documents_by_ids(ids, current_user.id), current_user.id)
+        if fmt:
+            return stream_documents(rows, serialize, fmt)
+        docs = [serialize(d) for d in rows]
+    else:
+        # Chỉ mục chưa sẵn sàng (đang dựng hoặc bị tắt): tìm bằng SQL
+        docs_query = sql_search_query(keyword, current_user.id)
+        if fmt:
+            rows = mark_favorites(iter_keyset(docs_query, Document.created_at, Document.id), current_user.id)
+            return stream_documents(rows, serialize, fmt)
+        rows = docs_query.order_by(Document.created_at.desc(), Document.id.desc()) \
+                         .offset(offset).limit(limit + 1).all()
+        more = len(rows) > limit
+        docs = [serialize(d) for d in mark_favorites(rows[:limit], current_user.id)]
+        total = None
+
+    if total is not None:
+        more = offset + limit < total
+    next_offset = offset + limit if more else None
+    if not docs and not offset:
+        return jsonify({'message': 'Không tìm thấy tài liệu nào', 'documents': [], 'total': 0,
+                        'next_offset': None}), 200
+
+    return jsonify({'documents': docs, 'total': total if total is not None else offset + len(docs),
+                    'next_offset': next_offset}), 200
+
+def sql_search_query(keyword, user_id):
+    """ Tìm bằng ILIKE trên DB (dự phòng khi chỉ mục chưa sẵn sàng) """
+    # Tags và người đăng nạp theo lô (selectin), không truy vấn riêng từng tài liệu
+    return Document.query \
+        .options(selectinload(Document.tags), selectinload(Document.owner)) \
         .outerjoin(document_tags) \
         .outerjoin(Tag) \
         .filter(
@@ -722,30 +2075,39 @@ def search_documents(current_user):
             ), 
             or_(
                 Document.visibility == 'public',
-                Document.user_id == current_user.id
+                Document.user_id == user_id
             )
-        ).distinct() \
-        .order_by(Document.created_at.desc())
+        ).distinct()
 
-    docs = [{
-        'id': d.id,
-        'filename': d.filename,
-        'description': d.description,
-        'visibility': d.visibility,
-        'user_id': d.user_id,
-        'tags': [t.name for t in d.tags],
-        'owner_name': d.owner.name
-    } for d in docs_query.all()]
-
-    if not docs:
-        return jsonify({'message': 'Không tìm thấy tài liệu nào', 'documents': []}), 200
-
-    return jsonify({'documents': docs}), 200
+# ==========================================================
+# 🏷️ API TAG
+# ==========================================================
+@app.route('/api/tags/suggest', methods=['GET'])
+def suggest_tags():
+    """ Gợi ý tag cho ô nhập tag (autocomplete): ?q=tiền tố&limit=. Không cần token. """
+    prefix = request.args.get('q', '')
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        return jsonify({'message': 'limit không hợp lệ'}), 400
+    ensure_tag_index()
+    tags = [{'name': name, 'count': count} for name, count in tag_index.suggest(prefix, limit)]
+    response = jsonify({'tags': tags})
+    # Gọi theo từng phím gõ: cho trình duyệt cache ngắn
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
 # ==========================================================
 # 🏁 MAIN ENTRY 
 # ==========================================================
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
-    print("🚀 Khởi chạy Flask (API) và SocketIO (Cầu nối) trên cổng 5000...")
-    socketio.run(app, debug=True, port=5000, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    # Với reloader của debug, chỉ tiến trình con (WERKZEUG_RUN_MAIN) phục vụ request
+    if os.environ.get('WERKZEUG_RUN_MAIN'):
+        start_search_index()
+        start_job_dispatcher()
+        start_counter_reconciler()
+        start_tag_index()
+    port = int(os.environ.get('PORT', 5000))
+    print(f"🚀 Khởi chạy Flask (API) và SocketIO (Cầu nối) trên cổng {port} (worker {WORKER_ID})...")
+    socketio.run(app, debug=True, port=port, allow_unsafe_werkzeug=True)
\ No newline at end of file
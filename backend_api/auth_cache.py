@@ -0,0 +1,153 @@
+"""
+auth_cache.py
+-------------
+Cache token đã xác thực cho token_required.
+
+- Khóa: sha256(token), không giữ token gốc trong bộ nhớ / Redis
+- Giá trị: claims đã giải mã + snapshot nhẹ của user (id, name, email)
+- TTL + LRU trong tiến trình, tùy chọn thêm tầng dùng chung qua Redis
+- Xóa theo user khi đổi / đặt lại mật khẩu hoặc đổi tên; các worker khác
+  được báo qua kênh pub/sub của Redis
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+INVALIDATE_CHANNEL = "authcache:invalidate"
+
+
+def token_key(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenCache:
+    """ Cache (claims, user) theo token; ttl <= 0 hoặc maxsize <= 0 là tắt cache """
+
+    def __init__(self, maxsize=10000, ttl=60, redis_client=None, redis_ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis = redis_client
+        self.redis_ttl = redis_ttl
+        self._data = OrderedDict()  # key -> (hết hạn lúc, claims, user)
+        self._by_user = {}          # user_id -> {key}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.maxsize > 0
+
+    # ------------------------------
+    # 📥 Đọc / ghi
+    # ------------------------------
+    def get(self, token):
+        """ Trả về (claims, user) nếu token còn trong cache và chưa hết hạn, ngược lại None """
+        if not self.enabled:
+            return None
+        key, now = token_key(token), time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            if entry:
+                self._drop(key)
+
+        if self.redis is not None:
+            raw = self._redis(lambda: self.redis.get(f"authcache:tok:{key}"))
+            if raw:
+                data = json.loads(raw)
+                if data["claims"].get("exp", now + 1) > now:
+                    self._store(key, data["claims"], data["user"], now)
+                    self.hits += 1
+                    return data["claims"], data["user"]
+
+        self.misses += 1
+        return None
+
+    def put(self, token, claims, user):
+        """ Lưu claims + snapshot user (dict có 'id'); không giữ quá thời điểm exp của token """
+        if not self.enabled:
+            return
+        key, now = token_key(token), time.time()
+        self._store(key, claims, user, now)
+
+        if self.redis is not None:
+            ttl = int(min(self.redis_ttl, claims.get("exp", now + self.redis_ttl) - now))
+            if ttl > 0:
+                user_key = f"authcache:user:{user['id']}"
+
+                def write():
+                    pipe = self.redis.pipeline()
+                    pipe.set(f"authcache:tok:{key}", json.dumps({"claims": claims, "user": user}), ex=ttl)
+                    pipe.sadd(user_key, key)
+                    pipe.expire(user_key, self.redis_ttl)
+                    pipe.execute()
+                self._redis(write)
+
+    def _store(self, key, claims, user, now):
+        expires_at = min(now + self.ttl, claims.get("exp", float("inf")))
+        with self._lock:
+            self._drop(key)
+            self._data[key] = (expires_at, claims, user)
+            self._by_user.setdefault(user["id"], set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+
+    def _drop(self, key):
+        """ Xóa một khóa (gọi khi đang giữ _lock) """
+        entry = self._data.pop(key, None)
+        if entry:
+            keys = self._by_user.get(entry[2]["id"])
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[entry[2]["id"]]
+
+    # ------------------------------
+    # 🧹 Xóa theo user
+    # ------------------------------
+    def invalidate_user(self, user_id):
+        """ Xóa mọi token của user (đổi mật khẩu, đặt lại mật khẩu, đổi tên) """
+        self._invalidate_local(user_id)
+        if self.redis is None:
+            return
+
+        def drop_shared():
+            user_key = f"authcache:user:{user_id}"
+            keys = self.redis.smembers(user_key)
+            pipe = self.redis.pipeline()
+            for key in keys:
+                pipe.delete(f"authcache:tok:{key}")
+            pipe.delete(user_key)
+            pipe.publish(INVALIDATE_CHANNEL, str(user_id))
+            pipe.execute()
+        self._redis(drop_shared)
+
+    def _invalidate_local(self, user_id):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+
+    def listen_invalidations(self):
+        """ Luồng nền: nhận lệnh xóa cache của user từ các worker khác """
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(INVALIDATE_CHANNEL)
+        try:
+            for message in pubsub.listen():
+                self._invalidate_local(int(message["data"]))
+        except Exception as e:
+            print(f"⚠️ Mất kết nối kênh xóa cache token: {e}")
+
+    def _redis(self, fn):
+        """ Gọi Redis; lỗi thì bỏ qua tầng Redis (cache trong tiến trình vẫn chạy) """
+        try:
+            return fn()
+        except Exception as e:
+            print(f"⚠️ Lỗi Redis (cache token): {e}")
+            return None
@@ -0,0 +1,74 @@
+"""
+bench_auth.py
+-------------
+Đo số truy vấn DB và thời gian mỗi request của token_required, có và không có cache token.
+
+Chạy trên SQLite trong bộ nhớ (không cần MySQL), gọi các API cần đăng nhập bằng
+test client của Flask và đếm câu lệnh SQL qua event của SQLAlchemy.
+
+    python bench_auth.py --requests 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jwt
+from sqlalchemy import event
+
+import app as backend
+from auth_cache import TokenCache
+
+ENDPOINTS = ["/api/me", "/api/documents"]
+
+
+def setup():
+    with backend.app.app_context():
+        backend.db.create_all()
+        user = backend.User(name="bench", email="bench@example.com")
+        user.set_password("bench")
+        backend.db.session.add(user)
+        backend.db.session.commit()
+        return jwt.encode({"user_id": user.id, "exp": time.time() + 3600},
+                          backend.app.config["SECRET_KEY"], algorithm="HS256")
+
+
+def run(label, token, n, queries):
+    client = backend.app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    queries[0] = 0
+    started = time.perf_counter()
+    for i in range(n):
+        resp = client.get(ENDPOINTS[i % len(ENDPOINTS)], headers=headers)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<12}{queries[0] / n:>12.2f}{elapsed / n * 1000:>10.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark cache token của token_required")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    token = setup()
+    queries = [0]
+    with backend.app.app_context():
+        @event.listens_for(backend.db.engine, "before_cursor_execute")
+        def count(*_):
+            queries[0] += 1
+
+    print(f"{args.requests} request ({', '.join(ENDPOINTS)})")
+    print(f"{'cache':<12}{'SQL/request':>12}{'ms/req':>10}")
+    backend.auth_cache = TokenCache(ttl=0)
+    run("tắt", token, args.requests, queries)
+    backend.auth_cache = TokenCache(ttl=60)
+    run("bật", token, args.requests, queries)
+    print(f"hit/miss: {backend.auth_cache.hits}/{backend.auth_cache.misses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+bench_search.py
+---------------
+So sánh tìm kiếm bằng SQL (ILIKE '%từ khóa%' như trước) với chỉ mục SearchIndex.
+
+Sinh N tài liệu giả (tên file, mô tả, tags tiếng Việt) vào một file SQLite, rồi đo:
+- thời gian dựng chỉ mục, ghi / đọc snapshot
+- độ trễ mỗi truy vấn: SQL (LIKE + join tags) và chỉ mục (trang đầu 50 kết quả)
+
+    python bench_search.py --docs 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from search_index import SearchIndex
+
+SUBJECTS = ["Giải tích", "Đại số tuyến tính", "Xác suất thống kê", "Vật lý đại cương", "Hóa học",
+            "Lập trình Python", "Cấu trúc dữ liệu", "Mạng máy tính", "Hệ điều hành", "Cơ sở dữ liệu",
+            "Kinh tế vi mô", "Kinh tế vĩ mô", "Triết học", "Tiếng Anh", "Trí tuệ nhân tạo",
+            "Học máy", "An toàn thông tin", "Kỹ thuật phần mềm", "Toán rời rạc", "Xử lý ảnh"]
+KINDS = ["Đề thi", "Bài giảng", "Giáo trình", "Tóm tắt", "Bài tập", "Đáp án", "Slide", "Đề cương"]
+WORDS = ["cuối kỳ", "giữa kỳ", "chương", "có lời giải", "tham khảo", "năm học", "ôn tập",
+         "trắc nghiệm", "tự luận", "nâng cao", "cơ bản", "thực hành", "lý thuyết", "ví dụ"]
+TAGS = ["toán", "lý", "hóa", "cntt", "kinh tế", "ngoại ngữ", "đề thi", "slide", "k65", "k66", "k67"]
+EXTS = [".pdf", ".docx", ".pptx", ".txt"]
+QUERIES = ["giải tích", "de thi cuoi ky", "python", "mạng", "xac suat thong ke",
+           "kinh tế vĩ", "đáp án chương 3", "trí tuệ nhân tạo 2023", "k66", "hoc may"]
+USERS = 1000
+
+
+def generate(path, n, seed=1):
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE documents (id INTEGER PRIMARY KEY, user_id INT, filename TEXT, description TEXT,
+                                visibility TEXT, status TEXT, created_at REAL);
+        CREATE TABLE tags (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+        CREATE TABLE document_tags (document_id INT, tag_id INT, PRIMARY KEY (document_id, tag_id));
+    """)
+    conn.executemany("INSERT INTO tags (id, name) VALUES (?, ?)", enumerate(TAGS, 1))
+    now, batch = time.time(), []
+    for i in range(1, n + 1):
+        subject = rnd.choice(SUBJECTS)
+        filename = f"{rnd.choice(KINDS)} {subject} {rnd.randint(1, 12)} {rnd.randint(2015, 2025)}{rnd.choice(EXTS)}"
+        description = " ".join(rnd.sample(WORDS, 3)) + f" {subject.lower()}"
+        visibility = "public" if rnd.random() < 0.7 else "private"
+        status = "uploaded" if rnd.random() < 0.95 else "trashed"
+        batch.append((i, rnd.randint(1, USERS), filename, description, visibility, status, now - i))
+        if len(batch) == 50000:
+            conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            conn.executemany("INSERT INTO document_tags VALUES (?, ?)",
+                             [(row[0], t) for row in batch for t in rnd.sample(range(1, len(TAGS) + 1), 2)])
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+        conn.executemany("INSERT INTO document_tags VALUES (?, ?)",
+                         [(row[0], t) for row in batch for t in rnd.sample(range(1, len(TAGS) + 1), 2)])
+    conn.commit()
+    return conn
+
+
+def build(conn):
+    index = SearchIndex()
+    index.bulk()
+    tags = {}
+    for doc_id, name in conn.execute(
+            "SELECT dt.document_id, t.name FROM document_tags dt JOIN tags t ON t.id = dt.tag_id"):
+        tags.setdefault(doc_id, []).append(name)
+    for doc_id, user_id, filename, description, visibility, created_at in conn.execute(
+            "SELECT id, user_id, filename, description, visibility, created_at FROM documents "
+            "WHERE status = 'uploaded'"):
+        index.add(doc_id, user_id, visibility, created_at, filename, description, tags.get(doc_id, ()))
+    return index
+
+
+def sql_search(conn, keyword, user_id, limit):
+    like = f"%{keyword}%"
+    return conn.execute("""
+        SELECT DISTINCT d.id FROM documents d
+        LEFT JOIN document_tags dt ON dt.document_id = d.id
+        LEFT JOIN tags t ON t.id = dt.tag_id
+        WHERE d.status = 'uploaded'
+          AND (d.filename LIKE ? OR d.description LIKE ? OR t.name LIKE ?)
+          AND (d.visibility = 'public' OR d.user_id = ?)
+        ORDER BY d.created_at DESC LIMIT ?""", (like, like, like, user_id, limit)).fetchall()
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tìm kiếm: SQL LIKE vs chỉ mục trong tiến trình")
+    parser.add_argument("--docs", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench_search_")
+    db_path, snapshot = os.path.join(workdir, "docs.db"), os.path.join(workdir, "search_index.pkl")
+
+    conn, t = timed(lambda: generate(db_path, args.docs))
+    print(f"📦 Sinh {args.docs} tài liệu: {t:.1f}s")
+    index, t = timed(lambda: build(conn))
+    print(f"🔨 Dựng chỉ mục: {t:.1f}s ({len(index)} tài liệu, {len(index.postings)} từ)")
+    _, t = timed(lambda: index.save(snapshot))
+    print(f"💾 Ghi snapshot: {t:.1f}s ({os.path.getsize(snapshot) / 1e6:.0f} MB)")
+    _, t = timed(lambda: SearchIndex.load(snapshot))
+    print(f"📂 Đọc snapshot: {t:.1f}s")
+
+    print(f"\n{'truy vấn':<26}{'SQL ms':>10}{'index ms':>10}{'kết quả':>10}")
+    for q in QUERIES:
+        user_id = random.randint(1, USERS)
+        sql_t = min(timed(lambda: sql_search(conn, q, user_id, args.limit))[1] for _ in range(args.repeat))
+        idx_t = min(timed(lambda: index.search(q, user_id, limit=args.limit))[1] for _ in range(args.repeat))
+        _, total = index.search(q, user_id, limit=args.limit)
+        print(f"{q:<26}{sql_t * 1000:>10.1f}{idx_t * 1000:>10.1f}{total:>10}")
+
+    conn.close()
+    for name in os.listdir(workdir):
+        os.remove(os.path.join(workdir, name))
+    os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+counters.py
+-----------
+Gom thay đổi bộ đếm của tài liệu (vd: favorite_count +1 / -1) trong bộ nhớ, ghi xuống DB theo lô.
+
+- Các thay đổi của cùng (tài liệu, bộ đếm) trước lần ghi được cộng dồn thành một
+- Luồng nền ghi mỗi `interval` giây, hoặc sớm hơn khi có `max_pending` bộ đếm chờ ghi
+- Ghi lỗi: cộng lại vào buffer để lần sau ghi tiếp
+- Bộ đếm có thể lệch so với bảng gốc (tiến trình dừng đột ngột, ghi trùng...):
+  job đối chiếu định kỳ (reconcile_counters trong app.py) sửa lại
+"""
+
+import threading
+
+
+class CounterBuffer:
+    """ flush_fn({(document_id, tên bộ đếm): delta}) ghi một lô xuống DB """
+
+    def __init__(self, flush_fn, interval=5, max_pending=5000):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.max_pending = max_pending
+        self._deltas = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, document_id, counter, delta=1):
+        with self._lock:
+            self._put((document_id, counter), delta)
+            full = len(self._deltas) >= self.max_pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _put(self, key, delta):
+        """ Gọi khi đang giữ _lock """
+        total = self._deltas.get(key, 0) + delta
+        if total:
+            self._deltas[key] = total
+        else:
+            self._deltas.pop(key, None)
+
+    def discard_document(self, document_id):
+        """ Bỏ các thay đổi chưa ghi của tài liệu (tài liệu bị xóa vĩnh viễn) """
+        with self._lock:
+            for key in [key for key in self._deltas if key[0] == document_id]:
+                del self._deltas[key]
+
+    # ------------------------------
+    # 💾 Ghi xuống DB
+    # ------------------------------
+    def flush(self):
+        """ Ghi toàn bộ buffer; trả về số bộ đếm đã ghi """
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._deltas = self._deltas, {}
+            if not deltas:
+                return 0
+            try:
+                self.flush_fn(deltas)
+            except Exception as e:
+                print(f"⚠️ Lỗi ghi bộ đếm ({len(deltas)}), sẽ thử lại: {e}")
+                with self._lock:
+                    for key, delta in deltas.items():
+                        self._put(key, delta)
+                return 0
+            return len(deltas)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
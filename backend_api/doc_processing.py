@@ -0,0 +1,119 @@
+"""
+doc_processing.py
+-----------------
+Xử lý tài liệu sau khi upload (chạy trong process pool, không đụng tới DB / Flask).
+
+- Trích văn bản (PDF, DOCX, TXT) để đưa vào chỉ mục tìm kiếm
+- Đếm số trang (PDF, DOCX nếu file có ghi số trang)
+- Tính SHA-256 nội dung nếu chưa biết
+
+PDF dùng thư viện pypdf nếu có; không có thì chỉ đếm trang theo cấu trúc file.
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# Giới hạn văn bản lưu lại cho mỗi tài liệu (ký tự)
+MAX_TEXT_CHARS = 200000
+HASH_CHUNK = 1024 * 1024
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_SPACES_RE = re.compile(r"[ \t\r\f\v]+")
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _clip(parts):
+    """ Ghép các đoạn văn bản, dừng khi đủ MAX_TEXT_CHARS """
+    out, size = [], 0
+    for part in parts:
+        if not part:
+            continue
+        out.append(part)
+        size += len(part)
+        if size >= MAX_TEXT_CHARS:
+            break
+    text = _SPACES_RE.sub(" ", "\n".join(out))
+    return text[:MAX_TEXT_CHARS].strip()
+
+
+# ------------------------------
+# 📄 Theo định dạng
+# ------------------------------
+def extract_txt(path):
+    with open(path, "rb") as f:
+        raw = f.read(MAX_TEXT_CHARS * 4)
+    return _clip([raw.decode("utf-8-sig", errors="replace")]), None
+
+
+def extract_pdf(path):
+    if PdfReader is not None:
+        reader = PdfReader(path)
+        pages = reader.pages
+
+        def texts():
+            for page in pages:
+                yield page.extract_text() or ""
+        return _clip(texts()), len(pages)
+
+    # Không có pypdf: đếm đối tượng /Type /Page, không trích văn bản
+    if os.path.getsize(path) == 0:
+        return "", 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        return "", sum(1 for _ in _PDF_PAGE_RE.finditer(m))
+
+
+def extract_docx(path):
+    with zipfile.ZipFile(path) as z:
+        paragraphs, current = [], []
+        with z.open("word/document.xml") as f:
+            for _, elem in ET.iterparse(f, events=("end",)):
+                if elem.tag == _W_NS + "t" and elem.text:
+                    current.append(elem.text)
+                elif elem.tag == _W_NS + "p":
+                    paragraphs.append("".join(current))
+                    current = []
+                    elem.clear()
+                    if sum(map(len, paragraphs)) >= MAX_TEXT_CHARS:
+                        break
+
+        # Số trang do Word ghi lại khi lưu (docProps/app.xml), có thể không có
+        page_count = None
+        if "docProps/app.xml" in z.namelist():
+            match = re.search(rb"<(?:\w+:)?Pages>(\d+)<", z.read("docProps/app.xml"))
+            if match:
+                page_count = int(match.group(1))
+    return _clip(paragraphs), page_count
+
+
+EXTRACTORS = {".pdf": extract_pdf, ".docx": extract_docx, ".txt": extract_txt}
+
+
+def process_document(path, known_hash=None):
+    """
+    Xử lý một file. Trả về dict: text, page_count, content_hash.
+    Định dạng không hỗ trợ: chỉ tính hash. Lỗi đọc file ném ngoại lệ (job sẽ được thử lại).
+    """
+    extractor = EXTRACTORS.get(os.path.splitext(path)[1].lower())
+    text, page_count = extractor(path) if extractor else ("", None)
+    return {
+        "text": text,
+        "page_count": page_count,
+        "content_hash": known_hash or file_sha256(path),
+    }
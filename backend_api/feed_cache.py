@@ -0,0 +1,110 @@
+"""
+feed_cache.py
+-------------
+Cache Redis cho các payload đọc nhiều (feed tài liệu public, chi tiết tài liệu).
+
+- Khóa theo "thế hệ" của từng nhóm (vd: public, doc:<id>): xóa cache = INCR thế hệ,
+  các khóa cũ không còn được đọc và tự hết hạn theo TTL. Ghi muộn từ request đọc dữ liệu
+  cũ (trước khi bị xóa) rơi vào thế hệ cũ nên không làm bẩn cache.
+- Chống stampede: khi hết hạn, chỉ request giữ khóa SET NX tính lại; các request khác
+  chờ ngắn giá trị mới, quá hạn chờ thì tự tính (không ghi cache).
+- Redis lỗi / không có: tính trực tiếp từ DB, tạm ngừng gọi Redis trong `retry_after` giây
+  để request không phải chờ timeout liên tục.
+"""
+
+import random
+import time
+
+GEN_TTL = 86400  # thế hệ sống lâu hơn mọi giá trị cache
+
+
+class FeedCache:
+    """ get_or_compute(nhóm, khóa, hàm tính) -> chuỗi (JSON); ttl <= 0 là tắt cache """
+
+    def __init__(self, redis_client=None, ttl=30, lock_ttl=5, wait=1.0, retry_after=30, prefix="feedcache"):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait = wait
+        self.retry_after = retry_after
+        self.prefix = prefix
+        self._down_until = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def available(self):
+        return self.redis is not None and self.ttl > 0 and time.time() >= self._down_until
+
+    # ------------------------------
+    # 📥 Đọc
+    # ------------------------------
+    def get_or_compute(self, group, key, compute, ttl=None):
+        """
+        Trả về giá trị (str) của `key` trong nhóm `group`; thiếu thì gọi compute() -> str
+        rồi lưu với TTL (có jitter để các khóa không hết hạn cùng lúc).
+        """
+        if not self.available:
+            return compute()
+        value = None
+        try:
+            gen = self.redis.get(self._gen_key(group)) or "0"
+            data_key = f"{self.prefix}:{group}:{gen}:{key}"
+            value = self.redis.get(data_key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+            self.misses += 1
+            lock_key = f"{self.prefix}:lock:{group}:{gen}:{key}"
+            if not self.redis.set(lock_key, "1", nx=True, ex=self.lock_ttl):
+                # Request khác đang tính lại: chờ giá trị mới thay vì cùng truy vấn DB
+                deadline = time.time() + self.wait
+                while time.time() < deadline:
+                    time.sleep(0.05)
+                    value = self.redis.get(data_key)
+                    if value is not None:
+                        return value
+                return compute()
+
+            try:
+                value = compute()
+                ttl = ttl or self.ttl
+                self.redis.set(data_key, value, ex=ttl + random.randint(0, max(1, ttl // 10)))
+            finally:
+                self.redis.delete(lock_key)
+            return value
+        except Exception as e:
+            if not self._failed(e):
+                raise
+            return value if value is not None else compute()
+
+    # ------------------------------
+    # 🧹 Xóa
+    # ------------------------------
+    def invalidate(self, *groups):
+        """ Xóa cache của các nhóm (tăng thế hệ); gọi sau khi commit thay đổi """
+        if not groups or self.redis is None or self.ttl <= 0:
+            return
+        try:
+            pipe = self.redis.pipeline()
+            for group in groups:
+                pipe.incr(self._gen_key(group))
+                pipe.expire(self._gen_key(group), GEN_TTL)
+            pipe.execute()
+        except Exception as e:
+            if not self._failed(e):
+                raise
+
+    def _gen_key(self, group):
+        return f"{self.prefix}:gen:{group}"
+
+    def _failed(self, e):
+        """ Lỗi Redis: tạm tắt cache; trả về False nếu lỗi không phải của Redis """
+        if not isinstance(e, (ConnectionError, TimeoutError, OSError)) and \
+                type(e).__module__.split(".")[0] != "redis":
+            return False
+        if time.time() >= self._down_until:
+            print(f"⚠️ Lỗi Redis (cache feed), tạm dùng DB trực tiếp {self.retry_after}s: {e}")
+        self._down_until = time.time() + self.retry_after
+        return True
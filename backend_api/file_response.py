@@ -0,0 +1,194 @@
+"""
+file_response.py
+----------------
+Trả file tài liệu qua HTTP: Range (một / nhiều đoạn), ETag mạnh, GET có điều kiện,
+và tùy chọn giao việc gửi byte cho proxy (X-Accel-Redirect của nginx, X-Sendfile).
+
+- ETag do nơi gọi cung cấp (hash nội dung, hoặc mtime + kích thước)
+- If-Match / If-Unmodified-Since -> 412; If-None-Match / If-Modified-Since -> 304
+- Range chỉ áp dụng khi If-Range (nếu có) còn khớp; các đoạn chồng / liền nhau được gộp,
+  quá MAX_RANGES đoạn hoặc sai cú pháp thì bỏ qua Range (trả cả file)
+- Đọc file theo từng khối: bộ nhớ không phụ thuộc kích thước file
+"""
+
+import datetime
+import mimetypes
+import os
+import re
+import secrets
+import unicodedata
+from urllib.parse import quote
+
+from werkzeug.http import http_date
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
+
+MAX_RANGES = 32
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$", re.ASCII)
+
+
+def file_etag(path, content_hash=None):
+    """ ETag mạnh: hash nội dung nếu đã có, không thì mtime + kích thước """
+    if content_hash:
+        return f"sha256-{content_hash}"
+    st = os.stat(path)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def parse_ranges(header, size):
+    """
+    'bytes=0-99,200-,-50' -> [(start, end)] (end không tính), đã sắp xếp và gộp.
+    None: không phải Range hợp lệ (bỏ qua, trả cả file). []: không đoạn nào nằm trong file (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    parts = spec.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+    ranges, unsatisfiable = [], False
+    for part in parts:
+        if not part.strip():
+            continue
+        match = _RANGE_RE.match(part)
+        if not match or match.group(0).strip() == "-":
+            return None
+        first, last = match.groups()
+        if not first:
+            # Hậu tố: n byte cuối
+            start, end = max(0, size - int(last)), size
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = min(int(last) + 1, size) if last else size
+        if start < end:
+            ranges.append((start, end))
+        else:
+            unsatisfiable = True
+    if not ranges and not unsatisfiable:
+        return None
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _content_disposition(filename):
+    """ attachment; filename (ASCII) + filename* (UTF-8) cho tên có dấu """
+    ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    ascii_name = ascii_name.replace("\\", "").replace('"', "") or "download"
+    value = f'attachment; filename="{ascii_name}"'
+    if ascii_name != filename:
+        value += f"; filename*=UTF-8''{quote(filename, safe='')}"
+    return value
+
+
+def _read(path, ranges, chunk_size):
+    """ Sinh byte của các đoạn [(start, end)] """
+    with open(path, "rb") as f:
+        for start, end in ranges:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                block = f.read(min(chunk_size, remaining))
+                if not block:
+                    return
+                remaining -= len(block)
+                yield block
+
+
+def _multipart(path, ranges, size, mimetype, boundary, chunk_size):
+    """ (độ dài, generator) của thân multipart/byteranges """
+    heads = [(f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+              f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n").encode("latin-1")
+             for start, end in ranges]
+    tail = f"\r\n--{boundary}--\r\n".encode("latin-1")
+    length = sum(map(len, heads)) + sum(end - start for start, end in ranges) + len(tail)
+
+    def body():
+        for head, part in zip(heads, ranges):
+            yield head
+            yield from _read(path, [part], chunk_size)
+        yield tail
+    return length, body()
+
+
+def send_file_response(request, path, etag, download_name, mimetype=None,
+                       offload=None, offload_path=None, chunk_size=CHUNK_SIZE):
+    """
+    Response cho GET/HEAD một file đã kiểm tra quyền.
+    offload: None | 'x-accel' | 'x-sendfile'. Với 'x-accel', offload_path là URI nội bộ của nginx
+    (nginx tự xử lý Range); với 'x-sendfile' là đường dẫn tuyệt đối của file.
+    """
+    st = os.stat(path)
+    size = st.st_size
+    last_modified = datetime.datetime.fromtimestamp(int(st.st_mtime), tz=datetime.timezone.utc)
+    mimetype = mimetype or mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+
+    headers = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(last_modified),
+        "Accept-Ranges": "bytes",
+        # Tải cần đăng nhập: không cho cache dùng chung, trình duyệt hỏi lại bằng ETag
+        "Cache-Control": "private, no-cache",
+    }
+
+    # GET có điều kiện (RFC 7232, mục 6)
+    if request.if_match:
+        if not request.if_match.contains(etag):
+            return Response(status=412, headers=headers)
+    elif request.if_unmodified_since and last_modified > request.if_unmodified_since:
+        return Response(status=412, headers=headers)
+    if request.if_none_match:
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers=headers)
+    elif request.if_modified_since and last_modified <= request.if_modified_since:
+        return Response(status=304, headers=headers)
+
+    headers["Content-Disposition"] = _content_disposition(download_name)
+    if offload == "x-accel":
+        headers["X-Accel-Redirect"] = quote(offload_path)
+        return Response(status=200, headers=headers, mimetype=mimetype)
+    if offload == "x-sendfile":
+        # Mã hóa %: header chỉ chứa được latin-1 (mod_xsendfile giải mã lại, XSendFileUnescape mặc định bật)
+        headers["X-Sendfile"] = quote(offload_path)
+        return Response(status=200, headers=headers, mimetype=mimetype)
+
+    ranges = None
+    range_header = request.headers.get("Range")
+    if range_header and request.method in ("GET", "HEAD"):
+        if_range = request.if_range
+        weak = request.headers.get("If-Range", "").lstrip().startswith("W/")
+        # If-Range: chỉ trả một phần khi file chưa đổi (ETag khớp mạnh, hoặc đúng Last-Modified)
+        if (not if_range.etag and not if_range.date) or \
+                (if_range.etag and not weak and if_range.etag == etag) or \
+                (if_range.date and if_range.date == last_modified):
+            ranges = parse_ranges(range_header, size)
+
+    if ranges == []:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status=416, headers=headers)
+    if not ranges:
+        f = open(path, "rb")
+        headers["Content-Length"] = str(size)
+        return Response(wrap_file(request.environ, f, chunk_size), status=200, headers=headers,
+                        mimetype=mimetype, direct_passthrough=True)
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        headers["Content-Length"] = str(end - start)
+        return Response(_read(path, ranges, chunk_size), status=206, headers=headers,
+                        mimetype=mimetype, direct_passthrough=True)
+
+    boundary = secrets.token_hex(16)
+    length, body = _multipart(path, ranges, size, mimetype, boundary, chunk_size)
+    headers["Content-Length"] = str(length)
+    headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+    return Response(body, status=206, headers=headers, direct_passthrough=True)
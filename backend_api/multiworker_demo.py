@@ -0,0 +1,123 @@
+"""
+multiworker_demo.py
+-------------------
+Kiểm tra nhanh chế độ nhiều worker của cầu nối Socket.IO trên một máy.
+
+Chạy 2 worker app.py (worker-a, worker-b) dùng chung SOCKETIO_MESSAGE_QUEUE, rồi:
+1. Trang upload nối vào worker-a, gửi 'start' -> worker-a thành worker chủ của upload.
+2. Trang tải lại và nối vào worker-b (vd: cân bằng tải), gửi tiếp các chunk.
+   worker-b không mở kết nối TCP nào: tin nhắn được chuyển sang worker-a qua Redis,
+   phản hồi của server.py về lại trình duyệt (đang ở worker-b) qua message_queue.
+
+Cần: Redis và socket server (socket_server/server.py) đang chạy.
+
+    python multiworker_demo.py --queue redis://localhost:6379/0
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import socketio
+
+WORKERS = {"worker-a": 5101, "worker-b": 5102}
+
+
+def start_worker(name, port, queue):
+    env = dict(os.environ, WORKER_ID=name, SOCKETIO_MESSAGE_QUEUE=queue)
+    code = "import app; app.socketio.run(app.app, port=%d, allow_unsafe_werkzeug=True)" % port
+    return subprocess.Popen([sys.executable, "-u", "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+
+def wait_port(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def open_page(port, replies):
+    """Giả lập trang upload: một client Socket.IO nhận 'tcp_response(s)'."""
+    sio = socketio.Client()
+    sio.on("tcp_response", lambda data: replies.append(data))
+    sio.on("tcp_responses", lambda items: replies.extend(items))
+    sio.on("server_error", lambda data: replies.append({"status": "error", **data}))
+    sio.connect(f"http://127.0.0.1:{port}")
+    return sio
+
+
+def wait_replies(replies, n, timeout=10):
+    deadline = time.time() + timeout
+    while len(replies) < n and time.time() < deadline:
+        time.sleep(0.05)
+    return len(replies) >= n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kiểm tra cầu nối Socket.IO chạy nhiều worker")
+    parser.add_argument("--queue", default=os.environ.get("SOCKETIO_MESSAGE_QUEUE", "redis://localhost:6379/0"))
+    parser.add_argument("--size", type=int, default=256 * 1024, help="Kích thước file thử (bytes)")
+    args = parser.parse_args(argv)
+
+    procs = {name: start_worker(name, port, args.queue) for name, port in WORKERS.items()}
+    try:
+        for name, port in WORKERS.items():
+            if not wait_port(port):
+                print(f"❌ {name} không khởi động được.")
+                return 1
+        print(f"🚀 Đã chạy {', '.join(f'{n} (:{p})' for n, p in WORKERS.items())}")
+
+        upload_id = f"multiworker_{int(time.time())}"
+        data = os.urandom(args.size)
+        chunk_size = 64 * 1024
+        start = {"action": "start", "upload_id": upload_id, "filename": "multiworker.bin",
+                 "filesize": len(data), "chunk_size": chunk_size, "metadata": {"token": "demo"}}
+
+        # 1. Trang mở ở worker-a
+        replies = []
+        page = open_page(WORKERS["worker-a"], replies)
+        page.emit("tcp_message", start)
+        if not wait_replies(replies, 1) or replies[0].get("status") != "ok":
+            print(f"❌ 'start' qua worker-a thất bại: {replies}")
+            return 1
+        print(f"1️⃣  worker-a nhận 'start', offset={replies[0]['offset']}")
+        page.disconnect()
+
+        # 2. Trang tải lại, lần này nối vào worker-b
+        replies = []
+        page = open_page(WORKERS["worker-b"], replies)
+        page.emit("tcp_message", dict(start))
+        offset = 0
+        while offset < len(data):
+            n = min(chunk_size, len(data) - offset)
+            page.emit("tcp_message", {"action": "chunk", "upload_id": upload_id, "offset": offset, "length": n})
+            page.emit("tcp_message", data[offset:offset + n])
+            offset += n
+        expected = 1 + (len(data) + chunk_size - 1) // chunk_size
+        ok = wait_replies(replies, expected) and all(r.get("status") == "ok" for r in replies)
+        page.disconnect()
+        print(f"2️⃣  trang ở worker-b nhận {len(replies)}/{expected} phản hồi, offset cuối={replies[-1].get('offset') if replies else None}")
+    finally:
+        for proc in procs.values():
+            proc.terminate()
+
+    logs = {name: proc.communicate(timeout=10)[0] for name, proc in procs.items()}
+    relays = {name: log.count("Đã mở kết nối TCP dùng chung") for name, log in logs.items()}
+    print(f"🔗 Kết nối TCP tới server.py đã mở: {relays}")
+    if ok and relays["worker-a"] and not relays["worker-b"]:
+        print("✅ Trang ở worker-b, cầu nối chạy ở worker-a.")
+        return 0
+    print("❌ Không đúng như mong đợi.")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+search_index.py
+---------------
+Chỉ mục đảo (inverted index) trong tiến trình cho tìm kiếm tài liệu.
+
+- Tách từ không phân biệt dấu tiếng Việt ("Giải tích" ~ "giai tich", "đề" ~ "de")
+- Posting list theo từ, gộp từ tên file, mô tả, tags và nội dung trích từ file với trọng số khác nhau
+- Xếp hạng: tổng idf * trọng số của các từ khớp; từ cuối của truy vấn khớp theo tiền tố
+- Lọc quyền xem (public hoặc của chính người tìm) ngay trong chỉ mục
+- Cập nhật từng tài liệu (thêm / sửa / xóa) và lưu snapshot xuống đĩa để khởi động nhanh
+"""
+
+import heapq
+import math
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+# Trọng số theo trường: khớp tên file quan trọng hơn tag, tag hơn mô tả / nội dung
+FIELD_WEIGHTS = {"filename": 3, "tags": 2, "description": 1, "content": 1}
+# Số lần lặp tối đa của một từ trong một trường được tính điểm
+MAX_TF = 3
+# Từ truy vấn ngắn hơn mức này chỉ khớp chính xác (tránh quét cả từ điển)
+MIN_PREFIX = 2
+SNAPSHOT_VERSION = 1
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+_MARKS_RE = re.compile(r"[\u0300-\u036f]")
+
+
+def fold(text):
+    """ Chữ thường, bỏ dấu tiếng Việt (đ -> d) """
+    text = text.lower().replace("đ", "d")
+    return _MARKS_RE.sub("", unicodedata.normalize("NFD", text))
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(fold(text)) if text else []
+
+
+class SearchIndex:
+    """ Chỉ mục đảo: từ -> {doc_id: trọng số}; chỉ chứa tài liệu status 'uploaded' """
+
+    def __init__(self):
+        self.postings = {}   # term -> {doc_id: trọng số trong tài liệu}
+        self.docs = {}       # doc_id -> (owner_id, is_public, created_ts, terms)
+        self.saved_at = 0.0  # thời điểm dữ liệu của snapshot (để đồng bộ phần thay đổi sau đó)
+        self._sorted = []    # từ điển đã sắp xếp (khớp tiền tố); None = cần sắp lại
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    # ------------------------------
+    # ✏️ Cập nhật
+    # ------------------------------
+    def add(self, doc_id, owner_id, visibility, created_ts, filename="", description="", tags=(), content=""):
+        """ Thêm hoặc thay thế một tài liệu """
+        weights = {}
+        for field, texts in (("filename", [filename]), ("description", [description]), ("tags", tags),
+                             ("content", [content])):
+            tf = {}
+            for text in texts:
+                for term in tokenize(text):
+                    tf[term] = tf.get(term, 0) + 1
+            w = FIELD_WEIGHTS[field]
+            for term, n in tf.items():
+                weights[term] = weights.get(term, 0) + w * min(n, MAX_TF)
+
+        with self._lock:
+            self._remove(doc_id)
+            for term, w in weights.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = {}
+                    if self._sorted is not None:
+                        insort(self._sorted, term)
+                posting[doc_id] = w
+            self.docs[doc_id] = (owner_id, visibility == "public", created_ts, tuple(weights))
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        meta = self.docs.pop(doc_id, None)
+        if not meta:
+            return
+        for term in meta[3]:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+                if self._sorted is not None:
+                    i = bisect_left(self._sorted, term)
+                    if i < len(self._sorted) and self._sorted[i] == term:
+                        del self._sorted[i]
+
+    def bulk(self):
+        """ Gọi trước khi thêm hàng loạt: bỏ sắp xếp từ điển theo từng từ, sắp một lần khi tìm """
+        with self._lock:
+            self._sorted = None
+
+    # ------------------------------
+    # 🔎 Tìm kiếm
+    # ------------------------------
+    def _expand(self, token, prefix):
+        """ Các từ khớp với token: (term, hệ số); tiền tố được điểm thấp hơn khớp chính xác """
+        if token in self.postings:
+            yield token, 1.0
+        if not prefix or len(token) < MIN_PREFIX:
+            return
+        if self._sorted is None:
+            self._sorted = sorted(self.postings)
+        i = bisect_left(self._sorted, token)
+        while i < len(self._sorted) and self._sorted[i].startswith(token):
+            term = self._sorted[i]
+            if term != token:
+                yield term, 0.5 + 0.5 * len(token) / len(term)
+            i += 1
+
+    def search(self, query, user_id=None, limit=None, offset=0):
+        """
+        Tìm tài liệu chứa mọi từ của truy vấn mà user_id được xem.
+        Trả về (doc_id theo điểm giảm dần, bỏ `offset` kết quả đầu, tổng số kết quả).
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return [], 0
+
+        with self._lock:
+            n_docs = max(len(self.docs), 1)
+            per_token = []
+            for i, token in enumerate(tokens):
+                scores = {}
+                for term, factor in self._expand(token, prefix=(i == len(tokens) - 1)):
+                    posting = self.postings[term]
+                    idf = math.log(1 + n_docs / len(posting)) * factor
+                    for doc_id, w in posting.items():
+                        s = idf * w
+                        if s > scores.get(doc_id, 0):
+                            scores[doc_id] = s
+                if not scores:
+                    return [], 0
+                per_token.append(scores)
+
+            # Bắt đầu từ token hiếm nhất, lọc quyền xem rồi giao với các token còn lại
+            per_token.sort(key=len)
+            docs = self.docs
+            results = {}
+            for doc_id, s in per_token[0].items():
+                owner_id, is_public, created_ts, _ = docs[doc_id]
+                if is_public or (user_id is not None and owner_id == user_id):
+                    results[doc_id] = (s, created_ts)
+            for scores in per_token[1:]:
+                results = {doc_id: (s + scores[doc_id], ts)
+                           for doc_id, (s, ts) in results.items() if doc_id in scores}
+
+        total = len(results)
+        # id làm khóa phụ: thứ tự cố định giữa các trang (offset)
+        key = lambda item: (item[1][0], item[1][1], item[0])
+        if limit is not None and offset + limit < total:
+            ranked = heapq.nlargest(offset + limit, results.items(), key=key)
+        else:
+            ranked = sorted(results.items(), key=key, reverse=True)
+        return [doc_id for doc_id, _ in ranked[offset:]], total
+
+    # ------------------------------
+    # 💾 Snapshot
+    # ------------------------------
+    def save(self, path, saved_at=None):
+        """ Ghi snapshot (ghi file tạm rồi đổi tên để không hỏng file khi đang ghi) """
+        with self._lock:
+            data = {
+                "version": SNAPSHOT_VERSION,
+                "saved_at": saved_at if saved_at is not None else time.time(),
+                "postings": self.postings,
+                "docs": self.docs,
+            }
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except Exception:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            self.saved_at = data["saved_at"]
+
+    @classmethod
+    def load(cls, path):
+        """ Đọc snapshot; None nếu không có file hoặc khác phiên bản """
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != SNAPSHOT_VERSION:
+            return None
+        index = cls()
+        index.postings = data["postings"]
+        index.docs = data["docs"]
+        index.saved_at = data["saved_at"]
+        index._sorted = None
+        return index
@@ -0,0 +1,76 @@
+"""
+tag_index.py
+------------
+Chỉ mục tiền tố cho tên tag (gợi ý tag khi upload / sửa tài liệu), nằm trong bộ nhớ.
+
+- Mảng đã sắp xếp các khóa (tên tag bỏ dấu, và phần đuôi bắt đầu từ mỗi từ của tên):
+  "kinh tế vĩ mô" được gợi ý cho "kinh", "kinh te", "vi m", "mô"...
+- Tìm theo tiền tố bằng bisect; xếp hạng theo số tài liệu public đang dùng tag
+- Tag chưa có tài liệu public nào dùng thì không gợi ý (tránh lộ tag của tài liệu private)
+"""
+
+import bisect
+import heapq
+import threading
+
+from search_index import fold
+
+_MAX_CHAR = "\U0010ffff"
+
+
+def tag_keys(name):
+    """ Các khóa của một tag: tên bỏ dấu và phần đuôi bắt đầu từ mỗi từ """
+    words = fold(name).split()
+    return {" ".join(words[i:]) for i in range(len(words))}
+
+
+class TagIndex:
+    def __init__(self, counts=None):
+        """ counts: {tên tag: số tài liệu public đang dùng} """
+        self._keys = []      # [(khóa, tên)] đã sắp xếp
+        self.counts = {}
+        self._lock = threading.Lock()
+        if counts:
+            self.counts = dict(counts)
+            self._keys = sorted((key, name) for name in self.counts for key in tag_keys(name))
+
+    def __len__(self):
+        return len(self.counts)
+
+    # ------------------------------
+    # ✏️ Cập nhật
+    # ------------------------------
+    def add(self, name, delta=0):
+        """ Thêm tag (nếu chưa có) và cộng số lần dùng """
+        with self._lock:
+            if name not in self.counts:
+                self.counts[name] = 0
+                for key in tag_keys(name):
+                    bisect.insort(self._keys, (key, name))
+            self.counts[name] = max(0, self.counts[name] + delta)
+
+    def update(self, old_names, new_names):
+        """ Tài liệu public đổi tags (hoặc vào / ra khỏi danh sách public): trừ tags cũ, cộng tags mới """
+        old_names, new_names = set(old_names), set(new_names)
+        for name in old_names - new_names:
+            self.add(name, -1)
+        for name in new_names - old_names:
+            self.add(name, 1)
+
+    # ------------------------------
+    # 🔎 Gợi ý
+    # ------------------------------
+    def suggest(self, prefix, limit=10):
+        """ [(tên, số lần dùng)] các tag có khóa bắt đầu bằng prefix, dùng nhiều nhất trước """
+        prefix = " ".join(fold(prefix).split())
+        if not prefix:
+            return []
+        with self._lock:
+            lo = bisect.bisect_left(self._keys, (prefix,))
+            hi = bisect.bisect_left(self._keys, (prefix + _MAX_CHAR,), lo)
+            names = {name for _, name in self._keys[lo:hi] if self.counts.get(name, 0) > 0}
+            ranked = [(self.counts[name], name) for name in names]
+        # Khớp từ đầu tên trước, rồi dùng nhiều nhất, rồi theo tên
+        top = heapq.nsmallest(limit, ranked, key=lambda item: (
+            not fold(item[1]).startswith(prefix), -item[0], item[1]))
+        return [(name, count) for count, name in top]
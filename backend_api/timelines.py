@@ -0,0 +1,225 @@
+"""
+timelines.py
+------------
+Dòng thời gian theo user trên Redis (sorted set, score = thời điểm tính bằng micro giây).
+
+- 'views'     : tài liệu vừa xem (score = last_viewed_at)
+- 'favorites' : tài liệu yêu thích (score = created_at), kiểm tra "đã thích" bằng ZSCORE
+
+MySQL vẫn là nguồn dữ liệu gốc: tập chưa có (hết hạn, Redis mới khởi động...) được dựng lại
+từ DB qua hàm loader; mỗi tập giữ tối đa `max_len` phần tử mới nhất. Hai thành viên đánh dấu
+(score +inf): "_" = tập đã dựng từ DB, "~" = tập đã bị cắt bớt (phần cũ hơn chỉ có trong DB).
+Redis lỗi hoặc không trả lời chắc chắn được thì các hàm trả về None để nơi gọi dùng DB.
+"""
+
+import datetime
+import time
+
+import redis
+
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+BUILT = "_"
+TRUNCATED = "~"
+MARKERS = (BUILT, TRUNCATED)
+
+
+def to_score(dt):
+    """ datetime (UTC, naive) -> số nguyên micro giây (chính xác tuyệt đối khi đổi ngược) """
+    return (dt - EPOCH) // MICROSECOND
+
+
+def from_score(score):
+    return EPOCH + datetime.timedelta(microseconds=int(score))
+
+
+def member(document_id):
+    """ Thành viên của tập: id đệm số 0 để các phần tử cùng score xếp theo id như trong DB """
+    return f"{document_id:012d}"
+
+
+class Timelines:
+    """
+    loaders: {kind: fn(user_id, limit) -> [(document_id, datetime)] mới nhất trước}
+    additive: các kind chỉ thêm (vd: 'views'): dựng lại bằng cách gộp vào tập đang có thay vì
+    thay thế, để không mất phần tử mới ghi vào Redis nhưng DB chưa có (lượt xem đang buffer).
+    """
+
+    def __init__(self, redis_client, loaders, additive=(), max_len=200, ttl=7 * 86400, retry_after=30):
+        self.redis = redis_client
+        self.loaders = loaders
+        self.additive = set(additive)
+        self.max_len = max_len
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._down_until = 0.0
+
+    def _key(self, kind, user_id):
+        return f"timeline:{kind}:{user_id}"
+
+    def _version_key(self, kind, user_id):
+        return f"timeline:{kind}:{user_id}:v"
+
+    def _call(self, fn):
+        """ Gọi Redis; lỗi thì tạm ngừng dùng Redis `retry_after` giây và trả về None """
+        if self.redis is None or time.time() < self._down_until:
+            return None
+        try:
+            return fn()
+        except redis.exceptions.WatchError:
+            return None
+        except (redis.exceptions.RedisError, OSError) as e:
+            if time.time() >= self._down_until:
+                print(f"⚠️ Lỗi Redis (timeline), tạm dùng DB trực tiếp {self.retry_after}s: {e}")
+            self._down_until = time.time() + self.retry_after
+            return None
+
+    # ------------------------------
+    # ✏️ Ghi (sau khi DB đã commit)
+    # ------------------------------
+    def touch(self, kind, user_id, document_id, at):
+        """ Thêm / đẩy lên đầu (không bao giờ lùi thời điểm), cắt bớt phần cũ """
+        key = self._key(kind, user_id)
+
+        def write():
+            pipe = self.redis.pipeline()
+            pipe.incr(self._version_key(kind, user_id))
+            pipe.zadd(key, {member(document_id): to_score(at)}, gt=True)
+            # Giữ max_len phần tử mới nhất + các thành viên đánh dấu (+inf)
+            pipe.zremrangebyrank(key, 0, -(self.max_len + len(MARKERS) + 1))
+            pipe.expire(key, self.ttl)
+            pipe.expire(self._version_key(kind, user_id), self.ttl)
+            removed = pipe.execute()[2]
+            if removed:
+                self.redis.zadd(key, {TRUNCATED: "+inf"})
+        self._call(write)
+
+    def remove(self, kind, user_id, document_id):
+        def write():
+            pipe = self.redis.pipeline()
+            pipe.incr(self._version_key(kind, user_id))
+            pipe.zrem(self._key(kind, user_id), member(document_id))
+            pipe.expire(self._version_key(kind, user_id), self.ttl)
+            pipe.execute()
+        self._call(write)
+
+    def rebuild(self, kind, user_id):
+        """
+        Dựng lại tập từ DB. Nếu tập bị ghi (touch/remove) trong lúc đọc DB thì bỏ qua
+        lần dựng này (WATCH trên khóa phiên bản) để không ghi đè thay đổi mới hơn.
+        Trả về danh sách từ DB [(document_id, datetime)].
+        """
+        key, version_key = self._key(kind, user_id), self._version_key(kind, user_id)
+        rows = None
+
+        def write():
+            nonlocal rows
+            with self.redis.pipeline() as pipe:
+                pipe.watch(version_key)
+                rows = self.loaders[kind](user_id, self.max_len)
+                pipe.multi()
+                members = {member(doc_id): to_score(at) for doc_id, at in rows}
+                if kind in self.additive:
+                    pipe.zrem(key, *MARKERS)
+                    if members:
+                        pipe.zadd(key, members, gt=True)
+                    pipe.zremrangebyrank(key, 0, -(self.max_len + 1))
+                else:
+                    pipe.delete(key)
+                    if members:
+                        pipe.zadd(key, members)
+                pipe.zadd(key, {BUILT: "+inf"})
+                if len(rows) >= self.max_len:
+                    pipe.zadd(key, {TRUNCATED: "+inf"})
+                pipe.expire(key, self.ttl)
+                results = pipe.execute()
+            if kind in self.additive and results[1 + bool(members)]:
+                self.redis.zadd(key, {TRUNCATED: "+inf"})
+        self._call(write)
+        return rows if rows is not None else self.loaders[kind](user_id, self.max_len)
+
+    # ------------------------------
+    # 📥 Đọc
+    # ------------------------------
+    def _state(self, kind, user_id):
+        """ (đã dựng?, đã cắt bớt?) hoặc None nếu Redis lỗi """
+        key = self._key(kind, user_id)
+
+        def read():
+            pipe = self.redis.pipeline()
+            pipe.zscore(key, BUILT)
+            pipe.zscore(key, TRUNCATED)
+            built, truncated = pipe.execute()
+            return built is not None, truncated is not None
+        return self._call(read)
+
+    def page(self, kind, user_id, limit, before=None):
+        """
+        Một trang [(document_id, datetime)] mới nhất trước, sau vị trí `before` = (datetime, id).
+        None nếu không trả lời được từ Redis (Redis lỗi, hoặc trang vượt quá phần đã cắt bớt).
+        """
+        state = self._state(kind, user_id)
+        if state is None:
+            return None
+        built, truncated = state
+        if not built:
+            rows = self.rebuild(kind, user_id)
+            truncated = len(rows) >= self.max_len
+            if before is not None:
+                rows = [(d, at) for d, at in rows if (at, d) < (before[0], before[1])]
+            page = rows[:limit]
+            return page if len(page) == limit or not truncated else None
+
+        key = self._key(kind, user_id)
+
+        def read():
+            if before is None:
+                return self.redis.zrevrange(key, 0, limit + len(MARKERS) - 1, withscores=True)
+            score = to_score(before[0])
+            pipe = self.redis.pipeline()
+            # Cùng thời điểm với cursor: chỉ lấy id nhỏ hơn; trước thời điểm đó: lấy tiếp
+            pipe.zrangebyscore(key, score, score, withscores=True)
+            pipe.zrevrangebyscore(key, f"({score}", "-inf", start=0, num=limit, withscores=True)
+            ties, older = pipe.execute()
+            ties = sorted(((m, s) for m, s in ties if m not in MARKERS and int(m) < before[1]),
+                          key=lambda item: int(item[0]), reverse=True)
+            return ties + older
+        items = self._call(read)
+        if items is None:
+            return None
+        page = [(int(m), from_score(s)) for m, s in items if m not in MARKERS][:limit]
+        if len(page) < limit and truncated:
+            return None  # phần còn lại chỉ có trong DB
+        return page
+
+    def members(self, kind, user_id, document_ids):
+        """
+        Tập con của document_ids có trong timeline (vd: đã thích).
+        None nếu Redis không trả lời chắc chắn được (chưa dựng / đã cắt bớt / lỗi).
+        """
+        document_ids = list(document_ids)
+        if not document_ids:
+            return set()
+        state = self._state(kind, user_id)
+        if state is None:
+            return None
+        built, truncated = state
+        if not built:
+            rows = self.rebuild(kind, user_id)
+            ids = {doc_id for doc_id, _ in rows}
+            found = {doc_id for doc_id in document_ids if doc_id in ids}
+            return found if len(found) == len(document_ids) or len(rows) < self.max_len else None
+
+        key = self._key(kind, user_id)
+
+        def read():
+            pipe = self.redis.pipeline()
+            for doc_id in document_ids:
+                pipe.zscore(key, member(doc_id))
+            return pipe.execute()
+        scores = self._call(read)
+        if scores is None:
+            return None
+        found = {doc_id for doc_id, score in zip(document_ids, scores) if score is not None}
+        # Tập đã cắt bớt: id không thấy có thể nằm ở phần cũ chỉ có trong DB
+        return found if len(found) == len(document_ids) or not truncated else None
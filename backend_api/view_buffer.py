@@ -0,0 +1,102 @@
+"""
+view_buffer.py
+--------------
+Gom lượt xem tài liệu trong bộ nhớ, ghi xuống DB theo lô.
+
+- Lượt xem lặp lại của cùng (user, tài liệu) trước lần ghi gộp thành một (giữ thời điểm mới nhất)
+- Luồng nền ghi mỗi `interval` giây, hoặc sớm hơn khi buffer đạt `max_pending`
+- Ghi lỗi: giữ lại các lượt xem để lần sau ghi tiếp (không mất, không ghi đè thời điểm mới hơn)
+- Đọc xuyên buffer: pending(user_id) trả về các lượt xem chưa ghi của user
+"""
+
+import threading
+
+
+class ViewBuffer:
+    """ Buffer lượt xem; flush_fn(list[(user_id, document_id, viewed_at)]) ghi một lô xuống DB """
+
+    def __init__(self, flush_fn, interval=5, max_pending=5000):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.max_pending = max_pending
+        self._views = {}     # user_id -> {document_id: viewed_at}
+        self._inflight = {}  # lô đang ghi (vẫn đọc được qua pending() cho tới khi ghi xong)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, user_id, document_id, viewed_at):
+        with self._lock:
+            self._put(user_id, document_id, viewed_at)
+            full = self._size >= self.max_pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _put(self, user_id, document_id, viewed_at):
+        """ Gọi khi đang giữ _lock """
+        docs = self._views.setdefault(user_id, {})
+        current = docs.get(document_id)
+        if current is None:
+            self._size += 1
+        if current is None or viewed_at > current:
+            docs[document_id] = viewed_at
+
+    def pending(self, user_id):
+        """ {document_id: viewed_at} các lượt xem chưa ghi của user """
+        with self._lock:
+            result = dict(self._inflight.get(user_id, ()))
+            for document_id, viewed_at in self._views.get(user_id, {}).items():
+                if document_id not in result or viewed_at > result[document_id]:
+                    result[document_id] = viewed_at
+            return result
+
+    def discard_document(self, document_id):
+        """ Bỏ các lượt xem chưa ghi của tài liệu (tài liệu bị xóa vĩnh viễn); trả về các user đã xem """
+        users = set()
+        with self._lock:
+            for user_id, docs in self._views.items():
+                if docs.pop(document_id, None) is not None:
+                    self._size -= 1
+                    users.add(user_id)
+            for user_id, docs in self._inflight.items():
+                if docs.pop(document_id, None) is not None:
+                    users.add(user_id)
+        return users
+
+    # ------------------------------
+    # 💾 Ghi xuống DB
+    # ------------------------------
+    def flush(self):
+        """ Ghi toàn bộ buffer; trả về số lượt xem đã ghi """
+        with self._flush_lock:
+            with self._lock:
+                views, self._views, self._size = self._views, {}, 0
+                self._inflight = views
+                items = [(user_id, document_id, viewed_at)
+                         for user_id, docs in views.items() for document_id, viewed_at in docs.items()]
+            if not items:
+                return 0
+            try:
+                self.flush_fn(items)
+            except Exception as e:
+                print(f"⚠️ Lỗi ghi lượt xem ({len(items)}), sẽ thử lại: {e}")
+                with self._lock:
+                    for user_id, docs in self._inflight.items():
+                        for document_id, viewed_at in docs.items():
+                            self._put(user_id, document_id, viewed_at)
+                    self._inflight = {}
+                return 0
+            with self._lock:
+                self._inflight = {}
+            return len(items)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
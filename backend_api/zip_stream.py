@@ -0,0 +1,78 @@
+"""
+zip_stream.py
+-------------
+Tạo file ZIP dần trong lúc gửi (tải nhiều tài liệu một lần).
+
+- Không file tạm, không giữ cả file trong bộ nhớ: đọc từng khối, nén, gửi ngay
+- zipfile ghi lên luồng không seek được bằng data descriptor (CRC / kích thước ghi sau dữ liệu)
+- Định dạng vốn đã nén (pdf, docx, ảnh, video, zip...) lưu nguyên (STORE), còn lại DEFLATE
+- Tự đổi tên khi trùng ("a.pdf", "a (2).pdf")
+"""
+
+import os
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+# Nén lại các định dạng này gần như không giảm kích thước mà tốn CPU
+STORED_EXTENSIONS = {
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".epub",
+    ".zip", ".rar", ".7z", ".gz", ".bz2", ".xz",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp3", ".mp4", ".m4a", ".webm", ".mkv", ".avi",
+}
+
+
+class _Sink:
+    """ Luồng ghi chỉ-nối-thêm: zipfile ghi vào, generator lấy ra gửi đi """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def unique_names(names):
+    """ Đổi tên trùng trong archive: "a.pdf", "a (2).pdf", ... """
+    used = set()
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        candidate, n = name, 1
+        while candidate.lower() in used:
+            n += 1
+            candidate = f"{stem} ({n}){ext}"
+        used.add(candidate.lower())
+        yield candidate
+
+
+def stream_zip(entries, chunk_size=CHUNK_SIZE):
+    """
+    entries: [(tên trong archive, đường dẫn file)]. Sinh các đoạn byte của file ZIP.
+    File không đọc được (bị xóa giữa chừng...) được bỏ qua, archive vẫn hợp lệ.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for arcname, path in entries:
+            try:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                src = open(path, "rb")
+            except OSError as e:
+                print(f"⚠️ Bỏ qua file khi tạo ZIP ({arcname}): {e}")
+                continue
+            stored = os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            with src, zf.open(info, "w") as dest:
+                for block in iter(lambda: src.read(chunk_size), b""):
+                    dest.write(block)
+                    yield from sink.drain()
+            yield from sink.drain()
+    # Central directory (ghi khi đóng ZipFile)
+    yield from sink.drain()
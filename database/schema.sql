@@ -33,13 +33,51 @@ CREATE TABLE documents (
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     user_id INT NOT NULL,
 
+    --  KẾT QUẢ XỬ LÝ SAU UPLOAD (document_jobs)
+    processing_status VARCHAR(20) NULL,
+    page_count INT NULL,
+    content_hash CHAR(64) NULL,
+    content_text MEDIUMTEXT NULL,
+
+    --  BỘ ĐẾM (số người đã xem / đã thích), đối chiếu định kỳ với bảng gốc
+    view_count INT NOT NULL DEFAULT 0,
+    favorite_count INT NOT NULL DEFAULT 0,
+
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
 
     --  INDEXES
     INDEX idx_user_id (user_id),
     INDEX idx_visibility (visibility),
     INDEX idx_filename (filename),
-    FULLTEXT INDEX ft_description (description)
+    FULLTEXT INDEX ft_description (description),
+
+    --  INDEXES PHÂN TRANG (keyset theo thời gian, id)
+    INDEX idx_status_visibility_created (status, visibility, created_at, id),
+    INDEX idx_user_status_created (user_id, status, created_at, id),
+    INDEX idx_user_status_updated (user_id, status, updated_at, id),
+    INDEX idx_content_hash (content_hash),
+
+    --  INDEXES XẾP HẠNG PHỔ BIẾN
+    INDEX idx_status_visibility_views (status, visibility, view_count, id),
+    INDEX idx_status_visibility_favorites (status, visibility, favorite_count, id)
+);
+
+-- ================= DOCUMENT_JOBS (hàng đợi xử lý sau upload) =================
+CREATE TABLE document_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    document_id INT NOT NULL UNIQUE,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    run_after DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(100) NULL,
+    locked_at DATETIME NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE,
+
+    INDEX idx_job_status_run_after (status, run_after)
 );
 
 -- ================= DOCUMENT_TAGS (N-N) =================
@@ -64,7 +102,8 @@ CREATE TABLE user_favorites (
     FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE,
     
     INDEX idx_user_fav (user_id),
-    INDEX idx_doc_fav (document_id)
+    INDEX idx_doc_fav (document_id),
+    INDEX idx_user_fav_created (user_id, created_at, document_id)
 );
 
 CREATE TABLE user_document_views (
@@ -79,4 +118,26 @@ CREATE TABLE user_document_views (
     FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE,
 
     INDEX idx_user_views (user_id, last_viewed_at DESC)
-);
\ No newline at end of file
+);
+
+-- ================= NÂNG CẤP CSDL ĐÃ CÓ =================
+-- Chạy một lần trên CSDL tạo từ bản schema cũ để thêm các index phân trang:
+-- ALTER TABLE documents
+--     ADD INDEX idx_status_visibility_created (status, visibility, created_at, id),
+--     ADD INDEX idx_user_status_created (user_id, status, created_at, id),
+--     ADD INDEX idx_user_status_updated (user_id, status, updated_at, id);
+-- ALTER TABLE user_favorites
+--     ADD INDEX idx_user_fav_created (user_id, created_at, document_id);
+-- Thêm kết quả xử lý sau upload (và tạo bảng document_jobs ở trên):
+-- ALTER TABLE documents
+--     ADD COLUMN processing_status VARCHAR(20) NULL,
+--     ADD COLUMN page_count INT NULL,
+--     ADD COLUMN content_hash CHAR(64) NULL,
+--     ADD COLUMN content_text MEDIUMTEXT NULL,
+--     ADD INDEX idx_content_hash (content_hash);
+-- Thêm bộ đếm lượt xem / yêu thích (lần chạy đối chiếu đầu tiên sẽ điền giá trị):
+-- ALTER TABLE documents
+--     ADD COLUMN view_count INT NOT NULL DEFAULT 0,
+--     ADD COLUMN favorite_count INT NOT NULL DEFAULT 0,
+--     ADD INDEX idx_status_visibility_views (status, visibility, view_count, id),
+--     ADD INDEX idx_status_visibility_favorites (status, visibility, favorite_count, id);
@@ -129,11 +129,20 @@ async function createDocumentMetadata(filename, file_path, description, visibili
 }
 
 /**
- * getDocuments()
+ * withCursor(endpoint, cursor)
+ * - Danh sách tài liệu trả từng trang { documents, next_cursor }; cursor = next_cursor của trang trước
  */
-async function getDocuments() {
+function withCursor(endpoint, cursor) {
+  if (!cursor) return endpoint;
+  return `${endpoint}${endpoint.includes("?") ? "&" : "?"}cursor=${encodeURIComponent(cursor)}`;
+}
+
+/**
+ * getDocuments(cursor)
+ */
+async function getDocuments(cursor = null) {
   try {
-    const data = await apiRequest("/documents", "GET");
+    const data = await apiRequest(withCursor("/documents", cursor), "GET");
     // backend thường trả { documents: [...] } hoặc list trực tiếp
     return data;
   } catch (err) {
@@ -236,8 +245,8 @@ async function permanentDeleteDocument(doc_id) {
     return apiRequest(`/documents/${doc_id}/permanent`, "DELETE");
 }
 
-async function getTrashDocuments() {
-    return apiRequest("/documents/trash", "GET");
+async function getTrashDocuments(cursor = null) {
+    return apiRequest(withCursor("/documents/trash", cursor), "GET");
 }
 
 /* ========== YÊU THÍCH (FAVORITES) ========== */
@@ -246,8 +255,8 @@ async function toggleFavorite(doc_id) {
     return apiRequest(`/documents/${doc_id}/favorite`, "POST");
 }
 
-async function getFavoriteDocuments() {
-    return apiRequest("/documents/favorites", "GET");
+async function getFavoriteDocuments(cursor = null) {
+    return apiRequest(withCursor("/documents/favorites", cursor), "GET");
 }
 
 /* ========== NỘI DUNG GẦN ĐÂY (RECENT) ========== */
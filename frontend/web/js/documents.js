@@ -16,14 +16,18 @@ document.addEventListener("DOMContentLoaded", () => {
     addModalListeners(token);
 });
 
-async function loadUserFiles(token) { 
+async function loadUserFiles(token, cursor = null) { 
     const container = document.getElementById("file-list-container");
     const loadingText = document.getElementById("loading-text");
 
     try {
         // Nếu có token, yêu cầu tài liệu của user (user=true) để hiển thị cả tài liệu của họ và public
         // Nếu không có token, gọi endpoint chung để nhận các tài liệu public
-        const url = token ? `${API_URL}/api/documents?user=true` : `${API_URL}/api/documents`;
+        // cursor: trang kế tiếp (nút "Xem thêm"), null = trang đầu
+        const params = new URLSearchParams();
+        if (token) params.set('user', 'true');
+        if (cursor) params.set('cursor', cursor);
+        const url = `${API_URL}/api/documents${params.toString() ? '?' + params : ''}`;
         const headers = {};
         if (token) headers['Authorization'] = `Bearer ${token}`;
 
@@ -42,7 +46,8 @@ async function loadUserFiles(token) {
 
         if (response.ok) {
             loadingText.classList.add("hidden"); 
-            renderFiles(data.documents, token);
+            renderFiles(data.documents, token, Boolean(cursor));
+            renderLoadMore(container, data.next_cursor, (next) => loadUserFiles(token, next));
         } else {
             loadingText.textContent = `Lỗi: ${data.message}`;
         }
@@ -52,11 +57,11 @@ async function loadUserFiles(token) {
     }
 }
 
-function renderFiles(files, token) {
+function renderFiles(files, token, append = false) {
     const container = document.getElementById("file-list-container");
-    container.innerHTML = ""; // Xóa sạch container
+    if (!append) container.innerHTML = ""; // Trang đầu: xóa sạch container, trang sau: nối tiếp
 
-    if (!files || files.length === 0) {
+    if (!append && (!files || files.length === 0)) {
         container.innerHTML = "<p>Bạn chưa tải lên tài liệu nào. Hãy thử tải lên một file!</p>";
         return;
     }
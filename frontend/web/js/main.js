@@ -73,64 +73,7 @@ window.addEventListener("DOMContentLoaded", () => {
                 return;
             }
 
-            try {
-                // 3. SỬA URL: Dùng /api/documents/search thay vì /public
-                // 4. SỬA PARAM: Dùng ?q= thay vì ?search=
-                const url = `${API_URL}/api/documents/search?q=${encodeURIComponent(keyword)}`;
-                
-                const response = await fetch(url, { 
-                    method: "GET",
-                    // 5. THÊM HEADERS: Gửi kèm token
-                    headers: {
-                        "Authorization": "Bearer " + token,
-                        "Content-Type": "application/json"
-                    }
-                });
-
-                // Xử lý lỗi 401 (hết hạn token) hoặc 403
-                if (response.status === 401) {
-                    alert("Phiên đăng nhập hết hạn. Vui lòng đăng nhập lại.");
-                    window.location.href = "login.html";
-                    return;
-                }
-
-                const data = await response.json();
-                const container = document.getElementById("public-docs-grid"); // Hoặc vùng hiển thị kết quả bạn muốn
-                container.innerHTML = "";
-
-                // Xử lý hiển thị kết quả
-                if (!response.ok || !data.documents || data.documents.length === 0) {
-                    container.innerHTML = `<p>${data.message || 'Không tìm thấy tài liệu nào phù hợp.'}</p>`;
-                    return;
-                }
-
-                // Render danh sách tài liệu tìm được
-                data.documents.forEach(doc => {
-                    const docCard = document.createElement("div");
-                    docCard.className = "doc-card";
-                    docCard.dataset.id = doc.id;
-                    // Xử lý hiển thị tags
-                    const tagsString = (doc.tags && doc.tags.length > 0) ? doc.tags.join(', ') : '<i>Không có thẻ</i>';
-                    
-                    docCard.innerHTML = `
-                        <h3>${doc.filename}</h3>
-                        <p>${doc.description || '<i>Chưa có mô tả</i>'}</p>
-                        <p>Tags: ${tagsString}</p>
-                        <p><small>Người đăng: ${doc.owner_name}</small></p>
-                        <div class="doc-card-actions">
-                            <button class="btn-action btn-favorite ${doc.is_favorited ? 'favorited' : ''}" data-id="${doc.id}">⭐ Bộ nhớ</button>
-                        </div>
-                    `;
-                    container.appendChild(docCard);
-                });
-                
-                // Gán lại sự kiện click cho các card vừa tạo (để xem chi tiết)
-                // Lưu ý: Cần gọi lại logic gán event click viewDocument nếu cần thiết ở đây
-                
-            } catch (err) {
-                console.error("Lỗi tìm kiếm:", err);
-                alert("Lỗi kết nối server khi tìm kiếm!");
-            }
+            searchDocuments(keyword, token);
         });
     }
 
@@ -317,18 +260,20 @@ async function loadHomepageFeed() {
         }
     }
 }
-async function loadPublicDocuments() {
+async function loadPublicDocuments(cursor = null) {
     const container = document.getElementById("public-docs-grid");
-    container.innerHTML = "<p>Đang tải...</p>";
+    if (!cursor) container.innerHTML = "<p>Đang tải...</p>";
 
     try {
-        const response = await fetch(`${API_URL}/api/documents/public`, { method: 'GET' });
+        const response = await fetch(`${API_URL}/api/documents/public${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`, { method: 'GET' });
         const data = await response.json();
 
         if (response.ok) {
-            container.innerHTML = "";
-            if (!data.documents || data.documents.length === 0) {
+            // Trang đầu thay nội dung, các trang sau ("Xem thêm") nối tiếp
+            if (!cursor) container.innerHTML = "";
+            if (!cursor && (!data.documents || data.documents.length === 0)) {
                 container.innerHTML = "<p>Hiện chưa có tài liệu public nào.</p>";
+                renderLoadMore(container, null);
                 return;
             }
 
@@ -350,7 +295,11 @@ async function loadPublicDocuments() {
 
                 container.appendChild(docCard);
             });
- 
+            renderLoadMore(container, data.next_cursor, loadPublicDocuments);
+
+            // Chỉ gắn listener một lần (hàm được gọi lại cho mỗi trang)
+            if (container._hasDelegatedListener) return;
+            container._hasDelegatedListener = true;
             container.addEventListener('click', async (e) => {
                 const favBtn = e.target.closest('.btn-favorite');
                 if (favBtn) {
@@ -389,3 +338,91 @@ async function loadPublicDocuments() {
     }
 }
 
+
+
+// Nút "Xem thêm" dưới danh sách phân trang: API chỉ trả một trang kèm next_cursor (null khi hết)
+function renderLoadMore(container, nextCursor, loadPage) {
+    let btn = container.nextElementSibling;
+    if (!btn || !btn.classList.contains("btn-load-more")) {
+        btn = document.createElement("button");
+        btn.type = "button";
+        btn.className = "btn-action btn-load-more";
+        btn.textContent = "Xem thêm";
+        container.after(btn);
+    }
+    btn.classList.toggle("hidden", !nextCursor);
+    btn.disabled = false;
+    btn.onclick = async () => {
+        btn.disabled = true;
+        try {
+            await loadPage(nextCursor);
+        } finally {
+            btn.disabled = false;
+        }
+    };
+}
+
+// Tìm kiếm (cần token), kết quả xếp theo độ liên quan và phân trang bằng offset
+async function searchDocuments(keyword, token, offset = 0) {
+    try {
+        // 3. SỬA URL: Dùng /api/documents/search thay vì /public
+        // 4. SỬA PARAM: Dùng ?q= thay vì ?search=
+        // offset: trang kết quả kế tiếp (nút "Xem thêm"), 0 = trang đầu
+        const url = `${API_URL}/api/documents/search?q=${encodeURIComponent(keyword)}&offset=${offset}`;
+        
+        const response = await fetch(url, { 
+            method: "GET",
+            // 5. THÊM HEADERS: Gửi kèm token
+            headers: {
+                "Authorization": "Bearer " + token,
+                "Content-Type": "application/json"
+            }
+        });
+
+        // Xử lý lỗi 401 (hết hạn token) hoặc 403
+        if (response.status === 401) {
+            alert("Phiên đăng nhập hết hạn. Vui lòng đăng nhập lại.");
+            window.location.href = "login.html";
+            return;
+        }
+
+        const data = await response.json();
+        const container = document.getElementById("public-docs-grid"); // Hoặc vùng hiển thị kết quả bạn muốn
+        if (!offset) container.innerHTML = "";
+
+        // Xử lý hiển thị kết quả
+        if (!response.ok || !data.documents || data.documents.length === 0) {
+            if (!offset) container.innerHTML = `<p>${data.message || 'Không tìm thấy tài liệu nào phù hợp.'}</p>`;
+            renderLoadMore(container, null);
+            return;
+        }
+
+        // Render danh sách tài liệu tìm được
+        data.documents.forEach(doc => {
+            const docCard = document.createElement("div");
+            docCard.className = "doc-card";
+            docCard.dataset.id = doc.id;
+            // Xử lý hiển thị tags
+            const tagsString = (doc.tags && doc.tags.length > 0) ? doc.tags.join(', ') : '<i>Không có thẻ</i>';
+            
+            docCard.innerHTML = `
+                <h3>${doc.filename}</h3>
+                <p>${doc.description || '<i>Chưa có mô tả</i>'}</p>
+                <p>Tags: ${tagsString}</p>
+                <p><small>Người đăng: ${doc.owner_name}</small></p>
+                <div class="doc-card-actions">
+                    <button class="btn-action btn-favorite ${doc.is_favorited ? 'favorited' : ''}" data-id="${doc.id}">⭐ Bộ nhớ</button>
+                </div>
+            `;
+            container.appendChild(docCard);
+        });
+        renderLoadMore(container, data.next_offset, (next) => searchDocuments(keyword, token, next));
+        
+        // Gán lại sự kiện click cho các card vừa tạo (để xem chi tiết)
+        // Lưu ý: Cần gọi lại logic gán event click viewDocument nếu cần thiết ở đây
+        
+    } catch (err) {
+        console.error("Lỗi tìm kiếm:", err);
+        alert("Lỗi kết nối server khi tìm kiếm!");
+    }
+}
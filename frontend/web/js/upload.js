@@ -1,7 +1,14 @@
 // =============================================
-// 🚀 UPLOAD LOGIC (Socket.IO TCP Bridge)
+// 🚀 UPLOAD LOGIC (WebSocket trực tiếp, dự phòng: Socket.IO TCP Bridge)
 // =============================================
 
+// WebSocket của socket server (server.py) — trình duyệt gửi chunk thẳng, không qua Flask
+const WS_URL = `ws://${location.hostname || "localhost"}:6001`;
+// Cầu nối Socket.IO (Flask) — dùng khi không mở được WebSocket
+const BRIDGE_URL = "http://localhost:5000";
+// Số chunk được gửi trước khi chờ ACK (pipeline)
+const WINDOW_SIZE = 4;
+
 // ===== DOM Elements =====
 const dropZone = document.getElementById("dropZone");
 const fileInput = document.getElementById("fileInput");
@@ -21,14 +28,19 @@ const descriptionEl = document.getElementById("description");
 
 // ===== State Variables =====
 let selectedFile = null;
-let socket = null; // Đây sẽ là socket.io
+let socket = null; // Đây sẽ là socket.io (cầu nối dự phòng)
+let ws = null;     // WebSocket trực tiếp tới server.py
+let transport = null; // "ws" | "bridge"
 let uploadState = {
     file: null,
     upload_id: null,
-    offset: 0,
+    offset: 0,       // offset đã được server ACK
+    sentOffset: 0,   // offset đã gửi đi (có thể đi trước offset tối đa WINDOW_SIZE chunk)
+    pending: [],     // action đang chờ phản hồi, theo đúng thứ tự gửi
     chunk_size: 65536,
     isPaused: false,
     isStopped: false,
+    isDone: false,
 };
 
 // =============================================
@@ -60,50 +72,88 @@ pauseBtn.addEventListener("click", () => {
 });
 resumeBtn.addEventListener("click", () => {
     uploadState.isPaused = false;
-    // Gửi lệnh resume và kích hoạt lại sendChunk
+    // Gửi lệnh resume, gửi chunk tiếp khi server trả về offset
     sendJsonMessage({ action: "resume", upload_id: uploadState.upload_id });
-    sendChunk(); 
 });
 stopBtn.addEventListener("click", () => {
     uploadState.isStopped = true;
-    if (socket) {
+    if (isConnected()) {
         // Gửi lệnh stop và ngắt kết nối
         sendJsonMessage({ action: "stop", upload_id: uploadState.upload_id });
-        socket.disconnect(); 
+        closeTransport();
     }
     resetUI();
     setStatus("⛔ Đã dừng upload.", "error");
 });
 
 // =============================================
-// SOCKET.IO & UPLOAD LOGIC (SỬA LẠI)
+// WEBSOCKET / SOCKET.IO & UPLOAD LOGIC
 // =============================================
 
 /**
- * 1. Bắt đầu quá trình: Kết nối Socket.IO
+ * 1. Bắt đầu quá trình: thử WebSocket trực tiếp, lỗi thì dùng cầu nối Socket.IO
  */
 async function startUpload() {
     if (!selectedFile) { setStatus("Vui lòng chọn tệp!", "error"); return; }
     if (!isLoggedIn()) { setStatus("Vui lòng đăng nhập để upload!", "error"); return; }
 
-    setStatus("Đang kết nối tới cầu nối...", "info");
+    setStatus("Đang kết nối tới máy chủ upload...", "info");
     startBtn.disabled = true;
 
     // Khởi tạo trạng thái
     uploadState.file = selectedFile;
     uploadState.offset = 0;
+    uploadState.sentOffset = 0;
+    uploadState.pending = [];
     uploadState.isPaused = false;
     uploadState.isStopped = false;
+    uploadState.isDone = false;
 
-    // Kết nối tới Socket.IO server (cổng 5000, cùng với Flask)
-    // URL này đã bao gồm /socket.io/ theo mặc định
-    connectToSocketIO("http://localhost:5000");
+    connectWebSocket(WS_URL);
+}
+
+/**
+ * 2a. Kết nối WebSocket trực tiếp tới server.py
+ */
+function connectWebSocket(url) {
+    let opened = false;
+    try {
+        ws = new WebSocket(url);
+    } catch (err) {
+        connectToSocketIO(BRIDGE_URL);
+        return;
+    }
+    ws.binaryType = "arraybuffer";
+
+    ws.onopen = () => {
+        opened = true;
+        transport = "ws";
+        setStatus("✅ Kết nối thành công. Đang gửi metadata...", "info");
+        sendStartMessage();
+    };
+    ws.onmessage = (event) => handleSocketMessage(JSON.parse(event.data));
+    ws.onerror = () => {
+        if (!opened) {
+            // Không mở được WebSocket (chặn cổng, proxy...) -> dùng cầu nối Socket.IO
+            console.warn("Không mở được WebSocket, chuyển sang cầu nối Socket.IO.");
+            ws = null;
+            connectToSocketIO(BRIDGE_URL);
+        }
+    };
+    ws.onclose = () => {
+        if (opened && !uploadState.isStopped && !uploadState.isDone) {
+            setStatus("Mất kết nối máy chủ.", "error");
+            resetUI();
+        }
+    };
 }
 
 /**
- * 2. Kết nối Socket.IO (thay vì WebSocket)
+ * 2b. Kết nối Socket.IO (cầu nối qua Flask, cổng 5000)
  */
 function connectToSocketIO(url) {
+    transport = "bridge";
+    // URL này đã bao gồm /socket.io/ theo mặc định
     socket = io(url);
 
     socket.on("connect", () => {
@@ -115,6 +165,10 @@ function connectToSocketIO(url) {
     socket.on("tcp_response", (data) => {
         handleSocketMessage(data);
     });
+    // Cầu nối gom nhiều phản hồi trong cùng một lượt đọc thành một mảng
+    socket.on("tcp_responses", (list) => {
+        list.forEach(handleSocketMessage);
+    });
 
     socket.on("connect_error", (err) => {
         console.error("Lỗi Socket.IO:", err);
@@ -123,25 +177,38 @@ function connectToSocketIO(url) {
     });
 
     socket.on("disconnect", () => {
-        if (!uploadState.isStopped) {
+        if (!uploadState.isStopped && !uploadState.isDone) {
             setStatus("Mất kết nối máy chủ.", "error");
             resetUI();
         }
     });
 }
 
-/** Helper: Gửi tin nhắn JSON qua cầu nối */
+/** Helper: Kết nối hiện tại (WebSocket hoặc cầu nối) còn mở không */
+function isConnected() {
+    if (transport === "ws") return ws !== null && ws.readyState === WebSocket.OPEN;
+    return socket !== null && socket.connected;
+}
+
+/** Helper: Đóng kết nối hiện tại */
+function closeTransport() {
+    if (transport === "ws" && ws) ws.close();
+    else if (socket) socket.disconnect();
+}
+
+/** Helper: Gửi tin nhắn JSON; mọi action đều có đúng một phản hồi, theo thứ tự gửi */
 function sendJsonMessage(obj) {
-    if (socket && socket.connected) {
-        socket.emit('tcp_message', obj);
-    }
+    if (!isConnected()) return;
+    uploadState.pending.push(obj.action);
+    if (transport === "ws") ws.send(JSON.stringify(obj));
+    else socket.emit('tcp_message', obj);
 }
 
-/** Helper: Gửi tin nhắn Bytes (chunk) qua cầu nối */
+/** Helper: Gửi tin nhắn Bytes (chunk) — frame binary ngay sau header */
 function sendBytes(chunk) {
-    if (socket && socket.connected) {
-        socket.emit('tcp_message', chunk);
-    }
+    if (!isConnected()) return;
+    if (transport === "ws") ws.send(chunk);
+    else socket.emit('tcp_message', chunk);
 }
 
 /**
@@ -168,50 +235,72 @@ function sendStartMessage() {
 }
 
 /**
- * 4. Xử lý phản hồi từ Server (Đã chuyển tiếp qua Socket.IO)
+ * 4. Xử lý phản hồi từ Server (WebSocket hoặc chuyển tiếp qua Socket.IO)
  */
 function handleSocketMessage(data) {
+    // Server trả lời theo đúng thứ tự nhận -> phản hồi này thuộc action gửi sớm nhất
+    const action = uploadState.pending.shift();
+
     if (data.status !== "ok") {
         setStatus(`Lỗi từ server: ${data.reason}`, "error");
         resetUI();
-        socket.disconnect();
+        uploadState.isStopped = true;
+        closeTransport();
         return;
     }
 
-    // Server phản hồi 'start' OK
-    if (data.offset !== undefined && uploadState.offset === 0) {
-        uploadState.offset = data.offset;
-        uploadState.chunk_size = data.chunk_size || uploadState.chunk_size;
-
-        setStatus("Đang bắt đầu upload...", "info");
-        pauseBtn.disabled = false;
-        stopBtn.disabled = false;
-
-        sendChunk(); 
+    switch (action) {
+        // Server phản hồi 'start' OK: tiếp tục từ offset server đã có
+        case "start":
+            uploadState.offset = uploadState.sentOffset = data.offset;
+            uploadState.chunk_size = data.chunk_size || uploadState.chunk_size;
+
+            setStatus("Đang bắt đầu upload...", "info");
+            pauseBtn.disabled = false;
+            stopBtn.disabled = false;
+            sendChunks();
+            break;
+
+        // Server phản hồi 'chunk' OK (ACK)
+        case "chunk":
+            uploadState.offset = data.offset;
+            updateProgress(data.offset, uploadState.file.size);
+            if (data.offset >= uploadState.file.size) {
+                uploadState.isDone = true;
+                setStatus("✅ Upload hoàn tất! Đang xử lý...", "success");
+                progressBar.style.width = "100%";
+                resetUI();
+                closeTransport();
+                setTimeout(() => window.location.href = "documents.html", 1500); // Sửa: Về document.html
+            } else {
+                sendChunks(); // Bù chỗ trống trong cửa sổ
+            }
+            break;
+
+        // Server phản hồi 'resume': gửi tiếp từ offset server đã ghi
+        case "resume":
+            uploadState.offset = uploadState.sentOffset = data.offset;
+            sendChunks();
+            break;
+
+        case "pause":
+            setStatus("⏸ Đã tạm dừng.", "info");
+            pauseBtn.disabled = true;
+            resumeBtn.disabled = false;
+            break;
     }
+}
 
-    // Server phản hồi 'chunk' OK (ACK)
-    else if (data.offset !== undefined) {
-        updateProgress(data.offset, uploadState.file.size);
-        uploadState.offset = data.offset;
-
-        if (data.offset < uploadState.file.size) {
-            sendChunk(); // Gửi chunk tiếp
-        } else {
-            setStatus("✅ Upload hoàn tất! Đang xử lý...", "success");
-            progressBar.style.width = "100%";
-            resetUI();
-            socket.disconnect();
-            setTimeout(() => window.location.href = "documents.html", 1500); // Sửa: Về document.html
-        }
-    }
+/** Số chunk đã gửi nhưng chưa được ACK */
+function inflightChunks() {
+    return uploadState.pending.filter((a) => a === "chunk").length;
 }
 
 /**
- * 5. Vòng lặp gửi Chunk (phần chính)
+ * 5. Gửi chunk theo cửa sổ: giữ tối đa WINDOW_SIZE chunk chưa ACK trên đường truyền
  */
-async function sendChunk() {
-    if (uploadState.isPaused || uploadState.isStopped || !socket || !socket.connected) {
+function sendChunks() {
+    if (uploadState.isPaused || uploadState.isStopped || !isConnected()) {
         if(uploadState.isPaused) {
             setStatus("⏸ Đã tạm dừng.", "info");
             pauseBtn.disabled = true;
@@ -224,26 +313,21 @@ async function sendChunk() {
     resumeBtn.disabled = true;
     setStatus(`Đang tải... ${((uploadState.offset / uploadState.file.size) * 100).toFixed(0)}%`, "info");
 
-    const start = uploadState.offset;
-    const end = Math.min(start + uploadState.chunk_size, uploadState.file.size);
-    const chunk = uploadState.file.slice(start, end);
-    const chunkLength = chunk.size;
-
-    if (chunkLength === 0) {
-        return;
+    while (inflightChunks() < WINDOW_SIZE && uploadState.sentOffset < uploadState.file.size) {
+        const start = uploadState.sentOffset;
+        const end = Math.min(start + uploadState.chunk_size, uploadState.file.size);
+
+        // 1. Gửi Header (JSON)
+        sendJsonMessage({
+            action: "chunk",
+            upload_id: uploadState.upload_id,
+            offset: start,
+            length: end - start,
+        });
+        // 2. Gửi Data (Binary)
+        sendBytes(uploadState.file.slice(start, end));
+        uploadState.sentOffset = end;
     }
-
-    // 1. Gửi Header (JSON)
-    const header = {
-        action: "chunk",
-        upload_id: uploadState.upload_id,
-        offset: start,
-        length: chunkLength,
-    };
-    sendJsonMessage(header);
-
-    // 2. Gửi Data (Binary)
-    sendBytes(chunk);
 }
 
 // =Cập nhật UI
@@ -0,0 +1,412 @@
+"""
+async_client.py
+---------------
+Thư viện upload dùng asyncio cho các dịch vụ ingest.
+
+- AsyncUploadClient: start / pause / resume / stop đều là coroutine, hủy được bằng cancel()
+- Tiến độ qua callback (hàm thường hoặc coroutine) hoặc `async for` trên progress_events(),
+  được giới hạn tần suất bởi progress_interval
+- AsyncMuxConnection: nhiều upload xen kẽ trên một kết nối TCP (cùng giao thức với MuxConnection),
+  nên một event loop chạy được hàng nghìn upload mà không cần hàng nghìn socket/luồng
+- Dùng chung ChunkSizer, upload_id ổn định và StateStore với client.py
+
+    async def main():
+        async with await AsyncMuxConnection.open() as conn:
+            up = AsyncUploadClient("report.pdf", token, conn=conn)
+            await up.start()
+            async for event in up.progress_events():
+                print(event["percent"])
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import client
+from client import ChunkSizer, make_upload_id, load_state, save_state, clear_state
+
+PROGRESS_INTERVAL = 0.5  # giây giữa hai sự kiện tiến độ
+TERMINAL_STATES = ("completed", "stopped", "failed")
+
+
+# ==============================
+# 🔌 KẾT NỐI DÙNG CHUNG
+# ==============================
+class AsyncMuxConnection:
+    """Một kết nối TCP cho nhiều upload; phản hồi được phân phối theo upload_id."""
+
+    def __init__(self, reader, writer, timeout=60):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.write_lock = asyncio.Lock()
+        self.closed = False
+        self._queues = {}
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def open(cls, host=None, port=None, timeout=60):
+        reader, writer = await asyncio.open_connection(host or client.SERVER_HOST, port or client.SERVER_PORT)
+        return cls(reader, writer, timeout)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    continue
+                q = self._queues.get(msg.get("upload_id"))
+                if q:
+                    q.put_nowait(msg)
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            self.closed = True
+            for q in self._queues.values():
+                q.put_nowait(None)
+
+    def register(self, upload_id):
+        """Nhận phản hồi cho upload_id; ValueError nếu id đó đang chạy trên kết nối này"""
+        if upload_id in self._queues:
+            raise ValueError(f"upload_id {upload_id} đang chạy trên kết nối dùng chung")
+        self._queues[upload_id] = asyncio.Queue()
+
+    def unregister(self, upload_id):
+        self._queues.pop(upload_id, None)
+
+    async def wait(self, upload_id):
+        """Chờ phản hồi kế tiếp của upload_id (None nếu kết nối hỏng / quá thời gian)"""
+        q = self._queues.get(upload_id)
+        if q is None or self.closed and q.empty():
+            return None
+        try:
+            return await asyncio.wait_for(q.get(), self.timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def request(self, upload_id, obj):
+        async with self.write_lock:
+            self.writer.write((json.dumps(obj) + "\n").encode("utf-8"))
+            await self.writer.drain()
+        return await self.wait(upload_id)
+
+    async def send_chunk(self, header, file_path, offset, length):
+        """
+        Gửi header + dữ liệu chunk liền nhau; dữ liệu đi bằng loop.sendfile (zero-copy nếu được).
+        File được mở / đóng ngay trong coroutine này: nơi gọi dùng shield() nên có thể đã bị
+        cancel trong khi sendfile vẫn đang đọc file.
+        Gửi thiếu (file bị cắt ngắn) thì khung đã hỏng: đóng kết nối, không gửi tiếp trên đó.
+        """
+        async with self.write_lock:
+            with open(file_path, "rb") as f:
+                self.writer.write((json.dumps(header) + "\n").encode("utf-8"))
+                await self.writer.drain()
+                loop = asyncio.get_running_loop()
+                try:
+                    sent = await loop.sendfile(self.writer.transport, f, offset, length)
+                except BaseException:
+                    self.writer.transport.abort()
+                    raise
+            if sent != length:
+                self.writer.transport.abort()
+        return sent == length
+
+    async def close(self):
+        self._reader_task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+
+# ==============================
+# ⬆️ UPLOAD CLIENT (ASYNC)
+# ==============================
+class AsyncUploadClient:
+    def __init__(self, file_path, token, description="", visibility="private", tags=None,
+                 upload_id=None, conn=None, adaptive=True, on_progress=None,
+                 progress_interval=PROGRESS_INTERVAL, keep_completed=False):
+        self.file_path = file_path
+        self.token = token
+        self.description = description
+        self.visibility = visibility
+        self.tags = tags or []
+        self.filename = os.path.basename(file_path)
+        self.filesize = os.path.getsize(file_path)
+        self.upload_id = upload_id  # None -> tính từ nội dung file khi start()
+        self.conn = conn  # AsyncMuxConnection dùng chung (None = tự mở kết nối riêng)
+        self.adaptive = adaptive
+        self.on_progress = on_progress  # callback(event), có thể là coroutine
+        self.progress_interval = progress_interval
+        self.keep_completed = keep_completed
+
+        self.state = "idle"
+        self.offset = 0
+        self.sizer = None
+        self._task = None
+        self._running = asyncio.Event()
+        self._stopping = False
+        self._subscribers = []
+        self._last_event_at = 0.0
+        self._started_at = None
+        self._start_offset = 0
+        self._saved_offset = 0
+        self._saved_at = 0.0
+
+    # ------------------------------
+    # Điều khiển
+    # ------------------------------
+    async def start(self):
+        """Bắt đầu (hoặc resume) upload trong một task nền"""
+        if self._task and not self._task.done():
+            return self
+        if not self.upload_id:
+            self.upload_id = await asyncio.to_thread(make_upload_id, self.file_path, self.token)
+        self._stopping = False
+        self._running.set()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def pause(self):
+        self._running.clear()
+
+    async def resume(self):
+        self._running.set()
+
+    async def stop(self):
+        """Dừng hẳn (server giữ offset để resume sau), chờ task kết thúc"""
+        self._stopping = True
+        self._running.set()
+        return await self.wait()
+
+    async def cancel(self):
+        """Hủy task ngay lập tức (offset đã ACK vẫn được checkpoint)"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.state not in TERMINAL_STATES:
+            self.state = "stopped"  # bị hủy trước khi task kịp chạy
+
+    async def wait(self):
+        """Chờ upload kết thúc. Trả về True nếu hoàn tất 100%."""
+        if not self._task:
+            return False
+        try:
+            return await self._task
+        except asyncio.CancelledError:
+            return False
+
+    # ------------------------------
+    # Tiến độ
+    # ------------------------------
+    def _event(self):
+        elapsed = max(time.monotonic() - (self._started_at or time.monotonic()), 1e-6)
+        return {
+            "upload_id": self.upload_id,
+            "state": self.state,
+            "offset": self.offset,
+            "filesize": self.filesize,
+            "percent": (self.offset / self.filesize * 100) if self.filesize else 100.0,
+            "speed": (self.offset - self._start_offset) / elapsed,  # bytes/s trong phiên này
+        }
+
+    async def _publish(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_event_at < self.progress_interval:
+            return
+        self._last_event_at = now
+        event = self._event()
+        for q in self._subscribers:
+            q.put_nowait(event)
+        if self.on_progress:
+            result = self.on_progress(event)
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def progress_events(self):
+        """Async iterator các sự kiện tiến độ, kết thúc khi upload xong / dừng / lỗi"""
+        q = asyncio.Queue()
+        self._subscribers.append(q)
+        try:
+            if self.state in TERMINAL_STATES:
+                yield self._event()
+                return
+            while True:
+                event = await q.get()
+                yield event
+                if event["state"] in TERMINAL_STATES:
+                    return
+        finally:
+            self._subscribers.remove(q)
+
+    async def _set_state(self, state):
+        self.state = state
+        await self._publish(force=True)
+
+    async def _checkpoint(self, offset, force=False):
+        now = time.monotonic()
+        if (force or offset - self._saved_offset >= client.CHECKPOINT_BYTES
+                or now - self._saved_at >= client.CHECKPOINT_SECONDS):
+            # Ghi file trạng thái (makedirs, write, os.replace) trong luồng phụ, không chặn event loop
+            self._saved_offset, self._saved_at = offset, now
+            await asyncio.to_thread(save_state, self.upload_id, offset)
+
+    # ------------------------------
+    # Vòng upload
+    # ------------------------------
+    async def _run(self):
+        uid = self.upload_id
+        saved = await asyncio.to_thread(load_state, uid)
+        if self.filesize > 0 and saved >= self.filesize:
+            self.offset = self.filesize
+            await self._set_state("completed")
+            return True
+
+        own_conn = self.conn is None
+        conn = self.conn or await AsyncMuxConnection.open()
+        try:
+            conn.register(uid)
+        except ValueError as e:
+            # Không gỡ hàng đợi của upload kia (finally bên dưới chỉ dành cho id đã đăng ký)
+            print("⚠️ Lỗi upload:", e)
+            if own_conn:
+                await conn.close()
+            await self._set_state("failed")
+            return False
+        try:
+            resp = await conn.request(uid, {
+                "action": "start",
+                "upload_id": uid,
+                "filename": self.filename,
+                "filesize": self.filesize,
+                "chunk_size": client.CHUNK_SIZE,
+                "metadata": {
+                    "token": self.token,
+                    "description": self.description,
+                    "visibility": self.visibility,
+                    "tags": self.tags
+                }
+            })
+            if not resp or resp.get("status") != "ok":
+                await self._set_state("failed")
+                return False
+
+            offset = self.offset = self._start_offset = resp.get("offset", 0)
+            await self._checkpoint(offset, force=True)
+            chunk_size = resp.get("chunk_size") or client.CHUNK_SIZE
+            if self.adaptive and "max_chunk_size" in resp and self.sizer is None:
+                self.sizer = ChunkSizer(chunk_size, resp["min_chunk_size"], resp["max_chunk_size"])
+            self._started_at = time.monotonic()
+            await self._set_state("running")
+
+            while offset < self.filesize:
+                if self._stopping:
+                    await conn.request(uid, {"action": "stop", "upload_id": uid})
+                    await self._checkpoint(offset, force=True)
+                    await self._set_state("stopped")
+                    return False
+
+                if not self._running.is_set():
+                    await conn.request(uid, {"action": "pause", "upload_id": uid})
+                    await self._checkpoint(offset, force=True)
+                    await self._set_state("paused")
+                    await self._running.wait()
+                    if self._stopping:
+                        continue
+                    resp = await conn.request(uid, {"action": "resume", "upload_id": uid})
+                    if not resp or resp.get("status") != "ok":
+                        await self._set_state("failed")
+                        return False
+                    await self._set_state("running")
+
+                length = min(self.sizer.size if self.sizer else chunk_size, self.filesize - offset)
+                sent_at = time.perf_counter()
+                header = {"action": "chunk", "upload_id": uid, "offset": offset, "length": length}
+                # shield: bị cancel giữa chừng cũng không để lại khung cụt trên kết nối dùng chung
+                if not await asyncio.shield(conn.send_chunk(header, self.file_path, offset, length)):
+                    await self._set_state("failed")
+                    return False
+
+                ack = await conn.wait(uid)
+                if not ack or ack.get("status") != "ok":
+                    await self._checkpoint(offset, force=True)
+                    if self.sizer:
+                        self.sizer.on_failure()
+                    await self._set_state("failed")
+                    return False
+
+                if self.sizer:
+                    self.sizer.observe(length, time.perf_counter() - sent_at)
+                offset = self.offset = ack.get("offset", offset)
+                await self._checkpoint(offset)
+                await self._publish()
+
+            if self.keep_completed:
+                await asyncio.to_thread(save_state, uid, self.filesize)
+            else:
+                await asyncio.to_thread(clear_state, uid)
+            await self._set_state("completed")
+            return True
+
+        except asyncio.CancelledError:
+            # shield: lần hủy tiếp theo cũng không bỏ dở việc ghi checkpoint
+            await asyncio.shield(asyncio.to_thread(save_state, uid, self.offset))
+            self.state = "stopped"
+            for q in self._subscribers:
+                q.put_nowait(self._event())
+            raise
+        except Exception as e:
+            print("⚠️ Lỗi upload:", e)
+            if self.sizer:
+                self.sizer.on_failure()
+            await self._set_state("failed")
+            return False
+        finally:
+            conn.unregister(uid)
+            if own_conn:
+                await conn.close()
+
+
+# ==============================
+# 📦 UPLOAD HÀNG LOẠT
+# ==============================
+async def upload_files(paths, token, concurrency=256, on_progress=None, **kwargs):
+    """
+    Upload nhiều file trên một kết nối dùng chung, tối đa `concurrency` upload đang chạy cùng lúc.
+    Trả về dict {đường dẫn: True/False}.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    async with await AsyncMuxConnection.open() as conn:
+        async def one(path):
+            async with sem:
+                up = AsyncUploadClient(path, token, conn=conn, on_progress=on_progress, **kwargs)
+                await up.start()
+                return path, await up.wait()
+
+        return dict(await asyncio.gather(*(one(p) for p in paths)))
+
+
+if __name__ == "__main__":
+    token = os.environ.get("UPLOAD_TOKEN") or input("Nhập token (JWT): ").strip()
+    results = asyncio.run(upload_files(sys.argv[1:], token))
+    done = sum(results.values())
+    print(f"✅ {done}/{len(results)} file hoàn tất.")
+    sys.exit(0 if done == len(results) else 1)
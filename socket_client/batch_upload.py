@@ -0,0 +1,209 @@
+"""
+batch_upload.py
+---------------
+Upload nhiều file / cả thư mục song song qua socket server.
+
+- Nhận danh sách đường dẫn, thư mục hoặc glob (vd: "docs/**/*.pdf")
+- Chia file cho một pool kết nối có giới hạn (mỗi worker = 1 kết nối TCP),
+  hoặc với --multiplex: mọi upload chạy xen kẽ trên một kết nối TCP dùng chung
+- Sắp xếp công việc: file nhỏ trước, hoặc theo nhóm kích thước
+- Báo cáo tiến độ tổng và tốc độ (MB/s)
+- Dùng chung StateStore của client: batch bị kill thì chạy lại sẽ tiếp tục đúng chỗ cũ
+"""
+
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from client import UploadClient, MuxConnection, make_upload_id, clear_state
+
+DEFAULT_WORKERS = 4
+REPORT_INTERVAL = 1.0  # giây
+
+
+def expand_paths(inputs):
+    """Mở rộng thư mục (đệ quy) và glob thành danh sách file, bỏ trùng, giữ thứ tự."""
+    files, seen = [], set()
+
+    def add(path):
+        path = os.path.abspath(path)
+        if path not in seen and os.path.isfile(path):
+            seen.add(path)
+            files.append(path)
+
+    for item in inputs:
+        matches = glob.glob(item, recursive=True) if glob.has_magic(item) else [item]
+        for m in matches:
+            if os.path.isdir(m):
+                for root, _, names in os.walk(m):
+                    for name in sorted(names):
+                        add(os.path.join(root, name))
+            else:
+                add(m)
+    return files
+
+
+def _size_bin(size):
+    """Nhóm kích thước theo lũy thừa 4 (1KB, 4KB, 16KB, ...)."""
+    b = 0
+    while size >= 1024 * (4 ** b):
+        b += 1
+    return b
+
+
+def order_files(files, order="small"):
+    """
+    Sắp xếp công việc:
+    - "small": file nhỏ trước (nhiều file xong sớm, tiến độ thấy ngay)
+    - "bins": nhóm file lớn nhất chạy trước để không bị kéo đuôi, trong nhóm theo tên
+    """
+    sizes = {f: os.path.getsize(f) for f in files}
+    if order == "bins":
+        return sorted(files, key=lambda f: (-_size_bin(sizes[f]), f))
+    return sorted(files, key=lambda f: (sizes[f], f))
+
+
+class BatchUploader:
+    """Upload nhiều file với tối đa `workers` kết nối đồng thời."""
+
+    def __init__(self, files, token, workers=DEFAULT_WORKERS, order="small",
+                 description="", visibility="private", tags=None, multiplex=False):
+        self.files = order_files(files, order)
+        self.token = token
+        self.workers = max(1, workers)
+        self.description = description
+        self.visibility = visibility
+        self.tags = tags or []
+        self.multiplex = multiplex
+        self.mux = None
+
+        self.total_bytes = sum(os.path.getsize(f) for f in self.files)
+        self._lock = threading.Lock()
+        self._done_bytes = {}   # upload_id -> offset đã được ACK
+        self._start_bytes = {}  # upload_id -> offset lúc bắt đầu phiên này (để tính tốc độ)
+        self.completed = 0
+        self.failed = []
+        self._finished = threading.Event()
+        self._started_at = None
+
+    # ------------------------------
+    def _progress_cb(self, upload_id):
+        def cb(offset):
+            with self._lock:
+                self._start_bytes.setdefault(upload_id, offset)
+                self._done_bytes[upload_id] = offset
+        return cb
+
+    def _snapshot(self):
+        with self._lock:
+            done = sum(self._done_bytes.values())
+            sent = done - sum(self._start_bytes.values())
+        elapsed = max(time.time() - self._started_at, 1e-6)
+        return done, sent, elapsed
+
+    def _report(self, final=False):
+        done, sent, elapsed = self._snapshot()
+        percent = (done / self.total_bytes * 100) if self.total_bytes else 100.0
+        speed = sent / elapsed / (1024 * 1024)
+        end = "\n" if final else "\r"
+        print(f"📦 {self.completed}/{len(self.files)} file | "
+              f"{done / (1024 * 1024):.1f}/{self.total_bytes / (1024 * 1024):.1f} MB "
+              f"({percent:.1f}%) | {speed:.2f} MB/s", end=end, flush=True)
+
+    def _reporter(self):
+        while not self._finished.wait(REPORT_INTERVAL):
+            self._report()
+
+    # ------------------------------
+    def _upload_one(self, path):
+        upload_id = make_upload_id(path, self.token)
+        client = UploadClient(
+            file_path=path,
+            token=self.token,
+            description=self.description,
+            visibility=self.visibility,
+            tags=self.tags,
+            upload_id=upload_id,
+            on_progress=self._progress_cb(upload_id),
+            verbose=False,
+            keep_completed=True,
+            mux=self.mux,
+        )
+        ok = client.upload()
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed.append(path)
+        return upload_id, ok
+
+    def run(self):
+        """Chạy batch, trả về True nếu mọi file đều hoàn tất."""
+        self._started_at = time.time()
+        reporter = threading.Thread(target=self._reporter, daemon=True)
+        reporter.start()
+
+        if self.multiplex:
+            self.mux = MuxConnection()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(self._upload_one, self.files))
+        finally:
+            if self.mux:
+                self.mux.close()
+
+        self._finished.set()
+        reporter.join()
+        self._report(final=True)
+
+        # Cả batch xong thì xóa các dấu "đã hoàn tất" khỏi file state
+        if not self.failed:
+            for upload_id, _ in results:
+                clear_state(upload_id)
+        else:
+            print(f"⚠️ {len(self.failed)} file lỗi, chạy lại lệnh để tiếp tục:")
+            for path in self.failed:
+                print(f"   - {path}")
+        return not self.failed
+
+
+# ===========================
+# 💡 GIAO DIỆN DÒNG LỆNH
+# ===========================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upload nhiều file / thư mục qua socket server")
+    parser.add_argument("paths", nargs="+", help="File, thư mục hoặc glob (vd: 'docs/**/*.pdf')")
+    parser.add_argument("--token", default=os.environ.get("UPLOAD_TOKEN"), help="JWT (mặc định: $UPLOAD_TOKEN)")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help="Số upload đồng thời")
+    parser.add_argument("--multiplex", action="store_true", help="Chạy mọi upload trên một kết nối TCP dùng chung")
+    parser.add_argument("--order", choices=["small", "bins"], default="small", help="Thứ tự upload")
+    parser.add_argument("--description", default="")
+    parser.add_argument("--visibility", choices=["public", "private"], default="private")
+    parser.add_argument("--tags", default="", help="Danh sách tag, cách nhau bởi dấu phẩy")
+    args = parser.parse_args(argv)
+
+    token = args.token or input("Nhập token (JWT): ").strip()
+    files = expand_paths(args.paths)
+    if not files:
+        print("❌ Không tìm thấy file nào.")
+        return 1
+
+    tags = [t.strip() for t in args.tags.split(",") if t.strip()]
+    batch = BatchUploader(files, token, workers=args.workers, order=args.order,
+                          description=args.description, visibility=args.visibility, tags=tags,
+                          multiplex=args.multiplex)
+    if args.multiplex:
+        print(f"🚀 Upload {len(files)} file ({batch.workers} upload đồng thời trên 1 kết nối)...")
+    else:
+        print(f"🚀 Upload {len(files)} file với {batch.workers} kết nối...")
+    return 0 if batch.run() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
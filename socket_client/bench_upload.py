@@ -0,0 +1,220 @@
+"""
+bench_upload.py
+---------------
+Đo hiệu năng phía client khi upload file lớn.
+
+Chạy một "sink server" tối giản (tiến trình riêng, nói cùng giao thức với server.py
+nhưng bỏ dữ liệu thay vì ghi đĩa) rồi upload một file tạm qua UploadClient với
+từng chế độ gửi chunk, in ra thời gian, tốc độ và CPU của client trên mỗi GB.
+Với --network, sink giả lập độ trễ / băng thông / rớt kết nối để so sánh
+chunk cố định 64KB với chunk adaptive (ChunkSizer).
+
+    python bench_upload.py --size-gb 2
+    python bench_upload.py --network lan,wan,mobile
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from multiprocessing import Process, Event, Value
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import client
+from client import UploadClient
+
+GB = 1024 ** 3
+
+
+# Hồ sơ mạng giả lập cho chế độ --network:
+# rtt (giây), bandwidth (bytes/s, 0 = không giới hạn),
+# drop_per_mb (xác suất rớt kết nối trên mỗi MB gửi), size_mb (kích thước file thử)
+NETWORK_PROFILES = {
+    "lan":    {"rtt": 0.0005, "bandwidth": 0,      "drop_per_mb": 0.0,  "size_mb": 512},
+    "wan":    {"rtt": 0.040,  "bandwidth": 12.5e6, "drop_per_mb": 0.0,  "size_mb": 32},
+    "mobile": {"rtt": 0.120,  "bandwidth": 1.0e6,  "drop_per_mb": 0.05, "size_mb": 12},
+}
+SINK_MIN_CHUNK = 16 * 1024
+SINK_MAX_CHUNK = 8 * 1024 * 1024
+
+
+# ==============================
+# 🕳️ SINK SERVER
+# ==============================
+def _sink_serve(port, ready, profile=None):
+    """
+    Nhận chunk và ACK, không ghi đĩa — để chỉ đo chi phí của client.
+    Nếu có `profile` thì giả lập độ trễ, băng thông và rớt kết nối.
+    """
+    profile = profile or {}
+    rtt = profile.get("rtt", 0)
+    bandwidth = profile.get("bandwidth", 0)
+    drop_per_mb = profile.get("drop_per_mb", 0)
+    rng = random.Random(42)
+    offsets = {}  # upload_id -> offset đã nhận (để client resume sau khi rớt)
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(("127.0.0.1", 0))
+        s.listen(4)
+        port.value = s.getsockname()[1]
+        ready.set()
+        buf = bytearray(1024 * 1024)
+        while True:
+            conn, _ = s.accept()
+            with conn, conn.makefile("rb") as rf:
+                while True:
+                    line = rf.readline()
+                    if not line:
+                        break
+                    header = json.loads(line)
+                    action, upload_id = header.get("action"), header.get("upload_id")
+                    if action == "start":
+                        reply = {"status": "ok", "offset": offsets.get(upload_id, 0),
+                                 "chunk_size": header.get("chunk_size"),
+                                 "min_chunk_size": SINK_MIN_CHUNK, "max_chunk_size": SINK_MAX_CHUNK}
+                    elif action == "chunk":
+                        length = header["length"]
+                        drop = drop_per_mb and rng.random() < 1 - (1 - drop_per_mb) ** (length / (1024 * 1024))
+                        remaining = length // 2 if drop else length
+                        started = time.perf_counter()
+                        while remaining > 0:
+                            n = rf.readinto(memoryview(buf)[:min(remaining, len(buf))])
+                            if not n:
+                                break
+                            remaining -= n
+                        if bandwidth:
+                            time.sleep(max(0.0, length / bandwidth - (time.perf_counter() - started)))
+                        if drop or remaining:
+                            break  # rớt kết nối giữa chunk
+                        offsets[upload_id] = header["offset"] + length
+                        reply = {"status": "ok", "offset": offsets[upload_id]}
+                    else:
+                        reply = {"status": "ok"}
+                    if rtt:
+                        time.sleep(rtt)
+                    conn.sendall((json.dumps(reply) + "\n").encode("utf-8"))
+
+
+def start_sink(profile=None):
+    port, ready = Value("i", 0), Event()
+    proc = Process(target=_sink_serve, args=(port, ready, profile), daemon=True)
+    proc.start()
+    ready.wait(10)
+    return proc, port.value
+
+
+# ==============================
+# 📏 CÁC CHẾ ĐỘ GỬI
+# ==============================
+class CopyUploadClient(UploadClient):
+    """Cách gửi cũ: seek + read ra bytes mới + sendall (để so sánh)."""
+
+    def _send_chunk(self, f, offset, length):
+        f.seek(offset)
+        chunk = f.read(length)
+        if len(chunk) != length:
+            self._abort_connection()
+            raise ConnectionError(f"File nguồn bị thay đổi: chỉ đọc được {len(chunk)}/{length} bytes")
+        self.sock.sendall(chunk)
+
+
+def run_mode(mode, path, size):
+    client.USE_SENDFILE = (mode == "sendfile")
+    cls = CopyUploadClient if mode == "copy" else UploadClient
+    # Chunk cố định CHUNK_SIZE: chỉ so sánh cách gửi (adaptive sẽ tăng chunk lên tới 8MB)
+    up = cls(path, token="bench", upload_id=f"bench_{mode}_{time.time()}", verbose=False, adaptive=False)
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    ok = up.upload()
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+    gb = size / GB
+    print(f"{mode:<10}{'ok' if ok else 'FAIL':<6}{wall:>9.2f}{size / wall / 1024 ** 2:>11.1f}{cpu / gb:>12.2f}")
+
+
+def run_network(name, path, size, adaptive):
+    """Upload tới khi xong (tự reconnect + resume khi bị rớt), trả về thời gian chạy."""
+    up = UploadClient(path, token="bench", upload_id=f"bench_{name}_{adaptive}_{time.time()}",
+                      verbose=False, adaptive=adaptive)
+    drops = 0
+    wall0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not up.upload():
+            drops += 1
+    wall = time.perf_counter() - wall0
+    final = f"{up.sizer.size // 1024} KB" if up.sizer else f"{client.CHUNK_SIZE // 1024} KB"
+    label = "adaptive" if adaptive else "fixed"
+    print(f"{name:<8}{label:<10}{wall:>9.2f}{size / wall / 1024 ** 2:>9.2f}{drops:>7}{final:>12}")
+    return wall
+
+
+def bench_network(profiles):
+    print(f"{'profile':<8}{'chunk':<10}{'wall(s)':>9}{'MB/s':>9}{'drops':>7}{'last chunk':>12}")
+    for name in profiles:
+        profile = NETWORK_PROFILES[name]
+        size = int(profile["size_mb"] * 1024 * 1024)
+        path = make_file(size)
+        proc, port = start_sink(profile)
+        client.SERVER_HOST, client.SERVER_PORT = "127.0.0.1", port
+        try:
+            fixed = run_network(name, path, size, adaptive=False)
+            adaptive = run_network(name, path, size, adaptive=True)
+            print(f"{'':<8}{'speedup':<10}{fixed / adaptive:>9.2f}x")
+        finally:
+            proc.terminate()
+            os.remove(path)
+
+
+def make_file(size):
+    fd, path = tempfile.mkstemp(prefix="bench_upload_", suffix=".bin")
+    block = os.urandom(1024 * 1024)
+    with os.fdopen(fd, "wb") as f:
+        written = 0
+        while written < size:
+            n = min(len(block), size - written)
+            f.write(block[:n])
+            written += n
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark CPU/GB của UploadClient")
+    parser.add_argument("--size-gb", type=float, default=2.0)
+    parser.add_argument("--modes", default="copy,readinto,sendfile")
+    parser.add_argument("--network", metavar="PROFILES",
+                        help=f"So sánh chunk cố định và adaptive trên các hồ sơ mạng ({','.join(NETWORK_PROFILES)})")
+    args = parser.parse_args(argv)
+
+    state_dir = tempfile.mkdtemp(prefix="bench_state_")
+    client.store = client.StateStore(state_dir)
+    if args.network:
+        bench_network(args.network.split(","))
+        return
+
+    size = int(args.size_gb * GB)
+    path = make_file(size)
+    proc, port = start_sink()
+    client.SERVER_HOST, client.SERVER_PORT = "127.0.0.1", port
+
+    try:
+        print(f"File {args.size_gb:.2f} GB, chunk {client.CHUNK_SIZE // 1024} KB")
+        print(f"{'mode':<10}{'':<6}{'wall(s)':>9}{'MB/s':>11}{'CPU s/GB':>12}")
+        for mode in args.modes.split(","):
+            if mode == "sendfile" and not hasattr(os, "sendfile"):
+                print(f"{mode:<10}bỏ qua (nền tảng không có sendfile)")
+                continue
+            run_mode(mode, path, size)
+    finally:
+        proc.terminate()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,26 @@ import json
 import os
 import time
 import threading
+import queue
+import contextlib
 import sys
+import hashlib
+import base64
+import uuid
+import urllib.request
+from urllib.parse import urlparse
 
 SERVER_HOST = '127.0.0.1'
 SERVER_PORT = 6000
+API_BASE = 'http://127.0.0.1:5000/api'
 CHUNK_SIZE = 65536  # 64KB
-STATE_FILE = 'client_upload_state.json'
-
-lock = threading.Lock()
+RECV_BUFFER_SIZE = 1024 * 1024  # 1MB cho download
+USE_SENDFILE = hasattr(os, "sendfile")  # zero-copy khi gửi chunk (Linux/macOS)
+STATE_DIR = 'client_upload_state'  # mỗi upload một file record trong thư mục này
+CHECKPOINT_BYTES = 8 * 1024 * 1024  # lưu checkpoint sau mỗi 8MB ...
+CHECKPOINT_SECONDS = 2.0            # ... hoặc mỗi 2 giây, tùy cái nào tới trước
+FINGERPRINT_SAMPLES = 8             # số block lấy mẫu khi tạo upload_id
+FINGERPRINT_BLOCK = 64 * 1024
 
 
 def send_json(sock, obj):
@@ -30,35 +42,220 @@ def read_json(sock):
     return json.loads(data.decode("utf-8").strip())
 
 
+class StateStore:
+    """
+    Lưu offset để resume, mỗi upload một file record nhỏ trong thư mục STATE_DIR.
+
+    - Ghi một record chỉ đụng tới file của chính nó (không đọc/ghi lại toàn bộ trạng thái)
+    - Ghi kiểu atomic (file tạm + os.replace) nên an toàn khi nhiều tiến trình/luồng cùng chạy
+      và khi bị kill giữa chừng
+    - Offset ở đây chỉ là checkpoint (có thể cũ hơn thực tế); offset thật do server trả về khi start
+    """
+
+    def __init__(self, path=None):
+        self.path = path or STATE_DIR
+
+    def _record_path(self, upload_id):
+        name = hashlib.sha1(upload_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f"{name}.json")
+
+    def get(self, upload_id):
+        """Trả về record ({"upload_id", "offset", "updated_at"}) hoặc dict rỗng"""
+        try:
+            with open(self._record_path(upload_id), "r", encoding="utf-8") as f:
+                record = json.load(f)
+                return record if isinstance(record, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def put(self, upload_id, offset):
+        os.makedirs(self.path, exist_ok=True)
+        path = self._record_path(upload_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"upload_id": upload_id, "offset": offset, "updated_at": time.time()}, f)
+        os.replace(tmp_path, path)
+
+    def delete(self, upload_id):
+        try:
+            os.remove(self._record_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+
+store = StateStore()
+
+
 def save_state(upload_id, offset):
     """Lưu offset hiện tại để resume"""
-    with lock:
-        state = {}
-        if os.path.exists(STATE_FILE):
-            with open(STATE_FILE, "r", encoding="utf-8") as f:
-                try:
-                    state = json.load(f)
-                except Exception:
-                    state = {}
-        state[upload_id] = offset
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump(state, f, indent=2)
+    store.put(upload_id, offset)
+
+
+def clear_state(upload_id):
+    """Xóa offset đã lưu (khi upload hoàn tất)"""
+    store.delete(upload_id)
 
 
 def load_state(upload_id):
     """Lấy offset đã lưu"""
-    if not os.path.exists(STATE_FILE):
-        return 0
+    return store.get(upload_id).get("offset", 0)
+
+
+def file_fingerprint(file_path):
+    """
+    Dấu vân tay nhanh của file: kích thước + mtime + FINGERPRINT_SAMPLES block rải đều
+    (luôn gồm block đầu và cuối). Chỉ đọc tối đa vài trăm KB dù file nhiều GB.
+    """
+    st = os.stat(file_path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{st.st_size}|{int(st.st_mtime)}".encode("utf-8"))
+    with open(file_path, "rb") as f:
+        if st.st_size <= FINGERPRINT_SAMPLES * FINGERPRINT_BLOCK:
+            h.update(f.read())
+        else:
+            step = (st.st_size - FINGERPRINT_BLOCK) // (FINGERPRINT_SAMPLES - 1)
+            for i in range(FINGERPRINT_SAMPLES):
+                f.seek(i * step)
+                h.update(f.read(FINGERPRINT_BLOCK))
+    return h.hexdigest()
+
+
+def token_user(token):
+    """Lấy user_id trong payload JWT (không verify — chỉ dùng để tạo upload_id, server mới xác thực)"""
     try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            state = json.load(f)
-            return state.get(upload_id, 0)
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return str(json.loads(base64.urlsafe_b64decode(payload))["user_id"])
     except Exception:
-        return 0
+        return hashlib.sha1((token or "").encode("utf-8")).hexdigest()
+
+
+def make_upload_id(file_path, token=None):
+    """
+    Tạo upload_id ổn định từ người dùng + đường dẫn tuyệt đối + dấu vân tay nội dung.
+    Chạy lại client (kể cả sau khi tắt máy) sẽ ra cùng id -> server tự resume phiên cũ.
+    Đường dẫn nằm trong khóa: hai file giống hệt nhau cùng tên ở hai thư mục (a/report.pdf,
+    b/report.pdf) là hai upload riêng; đổi chỗ file thì bắt đầu lại từ đầu.
+    """
+    filename = os.path.basename(file_path)
+    path = os.path.normcase(os.path.abspath(file_path))  # cùng cách bỏ trùng của batch_upload.expand_paths
+    key = f"{token_user(token) if token else ''}|{path}|{file_fingerprint(file_path)}"
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest()
+    return f"{digest}_{filename}"
+
+
+class ChunkSizer:
+    """
+    Tự điều chỉnh kích thước chunk trong khoảng [min_size, max_size] do server đưa ra.
+    Mỗi chunk đo thời gian từ lúc gửi tới lúc nhận ACK -> ước lượng thông lượng (EWMA),
+    rồi chọn chunk sao cho mỗi lần gửi mất khoảng TARGET_SECONDS: mạng LAN nhanh thì chunk
+    lớn (ít round-trip), mạng chập chờn thì chunk nhỏ (mất kết nối chỉ phải gửi lại ít).
+    """
+    TARGET_SECONDS = 0.5
+    ALIGN = 4096
+
+    def __init__(self, initial, min_size, max_size):
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.size = self._clamp(initial)
+        self.throughput = None  # bytes/s (EWMA)
+        self.rtt = None         # giây từ lúc gửi chunk tới lúc có ACK (EWMA)
+
+    def _clamp(self, n):
+        n = int(n) // self.ALIGN * self.ALIGN
+        return max(self.min_size, min(self.max_size, n))
+
+    def observe(self, length, elapsed):
+        """Cập nhật sau mỗi chunk được ACK"""
+        elapsed = max(elapsed, 1e-6)
+        sample = length / elapsed
+        self.rtt = elapsed if self.rtt is None else 0.8 * self.rtt + 0.2 * elapsed
+        self.throughput = sample if self.throughput is None else 0.7 * self.throughput + 0.3 * sample
+        # Tăng tối đa gấp đôi mỗi bước, giảm thì theo ngay
+        self.size = self._clamp(min(self.throughput * self.TARGET_SECONDS, self.size * 2))
+
+    def on_failure(self):
+        """Mất kết nối / lỗi giữa chừng -> giảm một nửa"""
+        self.size = self._clamp(self.size // 2)
+
+
+class MuxConnection:
+    """
+    Một kết nối TCP dùng chung cho nhiều upload đồng thời.
+
+    - Ghi: mỗi yêu cầu (header + dữ liệu chunk) được gửi trọn vẹn dưới write_lock,
+      nên chunk của các upload khác nhau xen kẽ nhau mà không lẫn khung
+    - Đọc: một luồng đọc duy nhất, phân phối phản hồi về hàng đợi của từng upload theo upload_id
+    """
+
+    def __init__(self, host=None, port=None, timeout=60):
+        self.sock = socket.create_connection((host or SERVER_HOST, port or SERVER_PORT))
+        self.timeout = timeout
+        self.write_lock = threading.Lock()
+        self._queues = {}
+        self._lock = threading.Lock()
+        self.closed = False
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        try:
+            with self.sock.makefile("rb") as rf:
+                for line in rf:
+                    try:
+                        msg = json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        continue
+                    with self._lock:
+                        q = self._queues.get(msg.get("upload_id"))
+                    if q:
+                        q.put(msg)
+                    else:
+                        print("⚠️ Phản hồi không thuộc upload nào:", msg)
+        except OSError:
+            pass
+        finally:
+            # Kết nối hỏng: đánh thức mọi upload đang chờ
+            self.closed = True
+            with self._lock:
+                for q in self._queues.values():
+                    q.put(None)
+
+    def register(self, upload_id):
+        """Nhận phản hồi cho upload_id; ValueError nếu id đó đang chạy trên kết nối này"""
+        with self._lock:
+            if upload_id in self._queues:
+                # Ghi đè hàng đợi sẽ trao phản hồi của upload này cho upload kia
+                raise ValueError(f"upload_id {upload_id} đang chạy trên kết nối dùng chung")
+            self._queues[upload_id] = queue.Queue()
+
+    def unregister(self, upload_id):
+        with self._lock:
+            self._queues.pop(upload_id, None)
+
+    def wait(self, upload_id):
+        """Chờ phản hồi kế tiếp của upload_id (None nếu kết nối hỏng / quá thời gian)"""
+        with self._lock:
+            q = self._queues.get(upload_id)
+        if q is None or self.closed and q.empty():
+            return None
+        try:
+            return q.get(timeout=self.timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
 
 
 class UploadClient:
-    def __init__(self, file_path, token, description="", visibility="private", tags=None):
+    def __init__(self, file_path, token, description="", visibility="private", tags=None,
+                 upload_id=None, on_progress=None, verbose=True, keep_completed=False, adaptive=True,
+                 mux=None):
         self.file_path = file_path
         self.token = token
         self.description = description
@@ -66,26 +263,108 @@ class UploadClient:
         self.tags = tags or []
         self.filename = os.path.basename(file_path)
         self.filesize = os.path.getsize(file_path)
-        self.upload_id = f"{int(time.time())}_{self.filename}"
-
+        self.upload_id = upload_id or make_upload_id(file_path, token)
+        self.on_progress = on_progress  # callback(offset) sau mỗi chunk được ACK
+        self.verbose = verbose
+        self.keep_completed = keep_completed  # giữ offset=filesize trong state để batch bỏ qua file đã xong
+        self.adaptive = adaptive  # tự điều chỉnh kích thước chunk theo thông lượng/độ trễ
+        self.sizer = None  # ChunkSizer, giữ lại qua các lần reconnect
+
+        self.mux = mux  # MuxConnection dùng chung (None = tự mở kết nối riêng)
+        self._registered = False  # đã đăng ký upload_id với mux (chỉ khi đó mới được gỡ)
         self.sock = None
         self.stop_flag = False
         self.pause_flag = False
         self.thread = None
+        self._buffer = None  # buffer dùng lại cho nhánh readinto (khi không có sendfile)
+        self._saved_offset = 0  # offset của checkpoint gần nhất
+        self._saved_at = 0.0
 
     def connect(self):
-        """Kết nối tới socket server"""
+        """Kết nối tới socket server (hoặc gắn vào kết nối dùng chung)"""
+        if self.mux:
+            self.mux.register(self.upload_id)
+            self._registered = True
+            self.sock = self.mux.sock
+            return
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.connect((SERVER_HOST, SERVER_PORT))
 
     def close(self):
         """Đóng kết nối"""
+        if self.mux:
+            if self._registered:
+                self.mux.unregister(self.upload_id)
+                self._registered = False
+            self.sock = None
+            return
         try:
             if self.sock:
                 self.sock.close()
         except Exception:
             pass
 
+    def _write_lock(self):
+        return self.mux.write_lock if self.mux else contextlib.nullcontext()
+
+    def _read_reply(self):
+        return self.mux.wait(self.upload_id) if self.mux else read_json(self.sock)
+
+    def _request(self, obj):
+        """Gửi một lệnh JSON và chờ phản hồi của chính upload này"""
+        with self._write_lock():
+            send_json(self.sock, obj)
+        return self._read_reply()
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
+    def _checkpoint(self, offset, force=False):
+        """Lưu offset khi đã gửi thêm CHECKPOINT_BYTES hoặc qua CHECKPOINT_SECONDS (hoặc khi force)"""
+        now = time.monotonic()
+        if (force or offset - self._saved_offset >= CHECKPOINT_BYTES
+                or now - self._saved_at >= CHECKPOINT_SECONDS):
+            save_state(self.upload_id, offset)
+            self._saved_offset, self._saved_at = offset, now
+
+    def _send_chunk(self, f, offset, length):
+        """
+        Gửi `length` bytes của file bắt đầu từ `offset` mà không copy qua Python:
+        dùng sendfile (kernel copy thẳng file -> socket); nếu nền tảng không có
+        sendfile thì đọc vào một buffer dùng lại (readinto) rồi gửi memoryview.
+
+        Header đã báo `length` bytes: nếu file nguồn ngắn đi giữa chừng thì không thể gửi đủ,
+        kết nối mất đồng bộ khung -> đóng kết nối (cả kết nối dùng chung) và raise ConnectionError.
+        """
+        if USE_SENDFILE:
+            sent = self.sock.sendfile(f, offset, length)
+            if sent != length:
+                self._abort_connection()
+                raise ConnectionError(f"File nguồn bị thay đổi: chỉ gửi được {sent}/{length} bytes")
+            return
+
+        if self._buffer is None or len(self._buffer) < length:
+            self._buffer = bytearray(max(length, CHUNK_SIZE))  # chunk lớn hơn (adaptive) thì cấp lại một lần
+        view = memoryview(self._buffer)[:length]
+        f.seek(offset)
+        n = f.readinto(view)
+        if n != length:
+            # Không gửi phần thiếu: server đang chờ đủ `length` bytes
+            self._abort_connection()
+            raise ConnectionError(f"File nguồn bị thay đổi: chỉ đọc được {n}/{length} bytes")
+        self.sock.sendall(view)
+
+    def _abort_connection(self):
+        """Đóng kết nối sau khi đã gửi header chunk mà không gửi đủ dữ liệu"""
+        if self.mux:
+            self.mux.close()
+            return
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
     def start_upload(self):
         """Bắt đầu hoặc resume upload"""
         self.stop_flag = False
@@ -95,13 +374,23 @@ class UploadClient:
         self.thread.start()
 
     def _upload_loop(self):
+        self.upload()
+
+    def upload(self):
+        """Upload đồng bộ (chạy trên luồng hiện tại). Trả về True nếu file đã lên đủ 100%."""
+        saved = load_state(self.upload_id)
+        if self.filesize > 0 and saved >= self.filesize:
+            self.log(f"✅ {self.filename} đã upload xong trước đó, bỏ qua.")
+            if self.on_progress:
+                self.on_progress(self.filesize)
+            return True
+
         try:
             self.connect()
-            offset = load_state(self.upload_id)
 
-            # Gửi lệnh start hoặc resume
-            send_json(self.sock, {
-                "action": "start" if offset == 0 else "resume",
+            # Luôn gửi 'start': server tự resume nếu đã có phiên với upload_id này
+            resp = self._request({
+                "action": "start",
                 "upload_id": self.upload_id,
                 "filename": self.filename,
                 "filesize": self.filesize,
@@ -113,72 +402,89 @@ class UploadClient:
                     "tags": self.tags
                 }
             })
-
-            resp = read_json(self.sock)
             if not resp or resp.get("status") != "ok":
                 print("❌ Lỗi khởi tạo:", resp)
-                return
+                return False
 
+            # Đối chiếu checkpoint cục bộ với server: offset server trả về luôn là nguồn đúng,
+            # checkpoint thưa chỉ có thể cũ hơn nên không bao giờ làm mất dữ liệu
             offset = resp.get("offset", 0)
-            print(f"🚀 Bắt đầu upload {self.filename} từ byte {offset}/{self.filesize}")
+            if offset < saved:
+                self.log(f"⚠️ Server chỉ có {offset}/{saved} bytes đã checkpoint, gửi lại từ {offset}.")
+            self._checkpoint(offset, force=True)
+            chunk_size = resp.get("chunk_size") or CHUNK_SIZE
+            if self.adaptive and "max_chunk_size" in resp:
+                if self.sizer is None:
+                    self.sizer = ChunkSizer(chunk_size, resp["min_chunk_size"], resp["max_chunk_size"])
+            else:
+                self.sizer = None
+            self.log(f"🚀 Bắt đầu upload {self.filename} từ byte {offset}/{self.filesize}")
+            if self.on_progress:
+                self.on_progress(offset)
 
             with open(self.file_path, "rb") as f:
                 while offset < self.filesize:
                     if self.stop_flag:
-                        print("⛔ Dừng upload theo yêu cầu.")
-                        send_json(self.sock, {"action": "stop", "upload_id": self.upload_id})
-                        save_state(self.upload_id, offset)
+                        self.log("⛔ Dừng upload theo yêu cầu.")
+                        self._request({"action": "stop", "upload_id": self.upload_id})
+                        self._checkpoint(offset, force=True)
                         break
 
                     if self.pause_flag:
-                        print("⏸ Upload tạm dừng.")
-                        send_json(self.sock, {"action": "pause", "upload_id": self.upload_id})
-                        save_state(self.upload_id, offset)
+                        self.log("⏸ Upload tạm dừng.")
+                        self._request({"action": "pause", "upload_id": self.upload_id})
+                        self._checkpoint(offset, force=True)
                         while self.pause_flag and not self.stop_flag:
                             time.sleep(0.3)
                         if self.stop_flag:
                             break
-                        print("▶️ Tiếp tục upload.")
-                        send_json(self.sock, {"action": "resume", "upload_id": self.upload_id})
-
-                    f.seek(offset)
-                    chunk = f.read(CHUNK_SIZE)
-                    if not chunk:
-                        break
-
-                    send_json(self.sock, {
-                        "action": "chunk",
-                        "upload_id": self.upload_id,
-                        "offset": offset,
-                        "length": len(chunk)
-                    })
-                    self.sock.sendall(chunk)
+                        self.log("▶️ Tiếp tục upload.")
+                        resp = self._request({"action": "resume", "upload_id": self.upload_id})
+                        if not resp or resp.get("status") != "ok":
+                            print("⚠️ Lỗi khi tiếp tục:", resp)
+                            break
 
-                    ack = read_json(self.sock)
+                    length = min(self.sizer.size if self.sizer else chunk_size, self.filesize - offset)
+                    sent_at = time.perf_counter()
+                    with self._write_lock():
+                        send_json(self.sock, {
+                            "action": "chunk",
+                            "upload_id": self.upload_id,
+                            "offset": offset,
+                            "length": length
+                        })
+                        self._send_chunk(f, offset, length)
+
+                    ack = self._read_reply()
                     if not ack or ack.get("status") != "ok":
                         print("⚠️ Lỗi khi gửi chunk:", ack)
-                        save_state(self.upload_id, offset)
+                        self._checkpoint(offset, force=True)
+                        if self.sizer:
+                            self.sizer.on_failure()
                         break
 
+                    if self.sizer:
+                        self.sizer.observe(length, time.perf_counter() - sent_at)
                     offset = ack.get("offset", offset)
-                    save_state(self.upload_id, offset)
+                    self._checkpoint(offset)
+                    if self.on_progress:
+                        self.on_progress(offset)
                     progress = (offset / self.filesize) * 100
-                    print(f"⬆️  Tiến độ: {progress:.2f}%")
+                    self.log(f"⬆️  Tiến độ: {progress:.2f}%")
 
                 if offset >= self.filesize:
-                    print("✅ Upload hoàn tất 100%.")
-                    if os.path.exists(STATE_FILE):
-                        with open(STATE_FILE, "r+", encoding="utf-8") as f:
-                            try:
-                                data = json.load(f)
-                                data.pop(self.upload_id, None)
-                                f.seek(0)
-                                f.truncate()
-                                json.dump(data, f, indent=2)
-                            except Exception:
-                                pass
+                    self.log("✅ Upload hoàn tất 100%.")
+                    if self.keep_completed:
+                        save_state(self.upload_id, self.filesize)
+                    else:
+                        clear_state(self.upload_id)
+                    return True
+                return False
         except Exception as e:
             print("⚠️ Lỗi upload:", e)
+            if self.sizer:
+                self.sizer.on_failure()
+            return False
         finally:
             self.close()
 
@@ -196,10 +502,258 @@ class UploadClient:
         self.pause_flag = False
 
 
+class StreamUploadClient:
+    """
+    Upload từ stream không biết trước độ dài (stdin, generator, HTTP response...)
+    mà không cần lưu tạm ra đĩa. Server mở phiên 'streaming' và chốt kích thước
+    khi nhận action 'finish'.
+
+    Stream không tua lại được nên chỉ chunk chưa được ACK được giữ trong bộ nhớ:
+    mất kết nối thì kết nối lại, lấy offset từ server và gửi lại đúng chunk đó.
+    """
+
+    def __init__(self, stream, filename, token, description="", visibility="private", tags=None,
+                 upload_id=None, retries=3, verbose=True):
+        self.filename = os.path.basename(filename)
+        self.token = token
+        self.description = description
+        self.visibility = visibility
+        self.tags = tags or []
+        self.upload_id = upload_id or f"stream_{uuid.uuid4().hex[:16]}_{self.filename}"
+        self.retries = retries
+        self.verbose = verbose
+
+        # Nguồn có .read(n) (file-like) hoặc là iterable các bytes (generator, iter_content...)
+        self._reader = stream.read if hasattr(stream, "read") else None
+        self._iter = None if self._reader else iter(stream)
+        self._leftover = b""
+        self.sock = None
+        self.sizer = None
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
+    def _read(self, n):
+        """Đọc tối đa n bytes từ stream (ít hơn n nghĩa là stream đã hết)"""
+        buf = bytearray(self._leftover)
+        self._leftover = b""
+        while len(buf) < n:
+            if self._reader:
+                piece = self._reader(n - len(buf))
+                if not piece:
+                    break
+            else:
+                piece = next(self._iter, None)  # generator có thể yield b"" giữa chừng
+                if piece is None:
+                    break
+            buf += piece
+        if len(buf) > n:
+            self._leftover = bytes(buf[n:])
+            del buf[n:]
+        return bytes(buf)
+
+    def _connect(self):
+        self.sock = socket.create_connection((SERVER_HOST, SERVER_PORT))
+
+    def _open(self):
+        """Kết nối và mở (hoặc mở lại) phiên streaming, trả về offset server đang có (None nếu server từ chối)"""
+        self._connect()
+        send_json(self.sock, {
+            "action": "start",
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "streaming": True,
+            "chunk_size": CHUNK_SIZE,
+            "metadata": {
+                "token": self.token,
+                "description": self.description,
+                "visibility": self.visibility,
+                "tags": self.tags
+            }
+        })
+        resp = read_json(self.sock)
+        if not resp:
+            raise ConnectionError("Mất kết nối khi khởi tạo")
+        if resp.get("status") != "ok":
+            print("❌ Lỗi khởi tạo:", resp)
+            return None
+        if self.sizer is None and "max_chunk_size" in resp:
+            self.sizer = ChunkSizer(resp.get("chunk_size") or CHUNK_SIZE,
+                                    resp["min_chunk_size"], resp["max_chunk_size"])
+        return resp.get("offset", 0)
+
+    def _close(self):
+        try:
+            if self.sock:
+                self.sock.close()
+        except Exception:
+            pass
+        self.sock = None
+
+    def upload(self):
+        """Upload tới khi stream hết rồi gửi 'finish'. Trả về True nếu server xác nhận hoàn tất."""
+        offset, pending = 0, b""  # pending: chunk đã đọc từ stream nhưng chưa được ACK
+        failures = 0
+        finishing = False  # stream đã hết và mọi chunk đã được ACK: chỉ còn chốt bằng 'finish'
+        while True:
+            try:
+                if finishing:
+                    # Mất phản hồi 'finish': server có thể đã hoàn tất và xóa phiên, 'start' lại sẽ mở
+                    # một phiên rỗng mới -> gửi lại đúng 'finish' (server trả 'completed' nếu đã xong)
+                    self._connect()
+                else:
+                    server_offset = self._open()
+                    if server_offset is None:
+                        return False
+                    if server_offset == offset + len(pending):
+                        offset, pending = server_offset, b""  # chunk đã tới server, chỉ mất ACK
+                    elif server_offset != offset:
+                        print(f"❌ Không thể resume stream: server ở byte {server_offset}, client giữ {offset}-{offset + len(pending)}.")
+                        return False
+
+                while not finishing:
+                    if not pending:
+                        pending = self._read(self.sizer.size if self.sizer else CHUNK_SIZE)
+                        if not pending:
+                            finishing = True
+                            break
+                    sent_at = time.perf_counter()
+                    send_json(self.sock, {
+                        "action": "chunk",
+                        "upload_id": self.upload_id,
+                        "offset": offset,
+                        "length": len(pending)
+                    })
+                    self.sock.sendall(pending)
+                    ack = read_json(self.sock)
+                    if not ack or ack.get("status") != "ok":
+                        raise ConnectionError(f"Lỗi khi gửi chunk: {ack}")
+                    if self.sizer:
+                        self.sizer.observe(len(pending), time.perf_counter() - sent_at)
+                    offset, pending = ack.get("offset", offset + len(pending)), b""
+                    self.log(f"⬆️  Đã gửi {offset} bytes")
+
+                send_json(self.sock, {"action": "finish", "upload_id": self.upload_id, "filesize": offset})
+                resp = read_json(self.sock)
+                if not resp:
+                    raise ConnectionError("Mất kết nối khi chốt upload")
+                if resp.get("status") != "ok":
+                    print("❌ Lỗi khi chốt upload:", resp)
+                    return False
+                self.log(f"✅ Upload stream hoàn tất ({offset} bytes).")
+                return True
+
+            except (OSError, ConnectionError, ValueError) as e:
+                failures += 1
+                print(f"⚠️ Lỗi upload stream ({failures}/{self.retries}):", e)
+                if self.sizer:
+                    self.sizer.on_failure()
+                if failures > self.retries:
+                    return False
+                time.sleep(min(2 ** failures, 10))
+            finally:
+                self._close()
+
+
+def request_download_ticket(doc_id, token, api_base=API_BASE):
+    """Xin vé tải xuống ngắn hạn từ Flask API"""
+    req = urllib.request.Request(
+        f"{api_base}/documents/{doc_id}/download-ticket",
+        method="POST",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+class DownloadClient:
+    """Tải file trực tiếp từ socket server (server gửi bằng sendfile), hỗ trợ tải tiếp"""
+
+    def __init__(self, doc_id, token, dest_dir=".", api_base=API_BASE):
+        self.doc_id = doc_id
+        self.token = token
+        self.dest_dir = dest_dir
+        self.api_base = api_base
+        self.sock = None
+
+    def _connect(self, socket_url):
+        parsed = urlparse(socket_url or "")
+        host = parsed.hostname or SERVER_HOST
+        port = parsed.port or SERVER_PORT
+        self.sock = socket.create_connection((host, port))
+
+    def close(self):
+        try:
+            if self.sock:
+                self.sock.close()
+        except Exception:
+            pass
+
+    def download(self, offset=None, length=None):
+        """
+        Tải file về dest_dir. Mặc định tải tiếp từ file .part đang có;
+        truyền offset/length để chỉ tải một khoảng byte.
+        Trả về đường dẫn file đã tải (hoặc None nếu lỗi).
+        """
+        info = request_download_ticket(self.doc_id, self.token, self.api_base)
+        final_path = os.path.join(self.dest_dir, os.path.basename(info["filename"]))
+        part_path = final_path + ".part"
+        ranged = offset is not None or length is not None
+        if offset is None:
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+        try:
+            self._connect(info.get("socket_url"))
+            send_json(self.sock, {
+                "action": "download",
+                "ticket": info["ticket"],
+                "offset": offset,
+                "length": length or 0
+            })
+            resp = read_json(self.sock)
+            if not resp or resp.get("status") != "ok":
+                print("❌ Lỗi tải xuống:", resp)
+                return None
+
+            filesize, remaining = resp["filesize"], resp["length"]
+            print(f"⬇️  Tải {info['filename']} từ byte {offset}/{filesize}")
+
+            buf = bytearray(RECV_BUFFER_SIZE)
+            view = memoryview(buf)
+            out_path = part_path if not ranged else f"{final_path}.{offset}-{offset + remaining}"
+            with open(out_path, "ab" if not ranged else "wb") as f:
+                while remaining > 0:
+                    n = self.sock.recv_into(view, min(remaining, RECV_BUFFER_SIZE))
+                    if n == 0:
+                        print("⚠️ Mất kết nối, có thể tải tiếp sau.")
+                        return None
+                    f.write(view[:n])
+                    remaining -= n
+
+            if ranged:
+                return out_path
+            os.replace(part_path, final_path)
+            print("✅ Tải xuống hoàn tất 100%.")
+            return final_path
+        finally:
+            self.close()
+
+
 # ===========================
 # 💡 TEST GIAO DIỆN DÒNG LỆNH
 # ===========================
 if __name__ == "__main__":
+    # Upload từ stdin: `tar cz thu_muc | python client.py - ten_file.tar.gz` (token lấy từ $UPLOAD_TOKEN)
+    if len(sys.argv) == 3 and sys.argv[1] == "-":
+        stream_client = StreamUploadClient(
+            stream=sys.stdin.buffer,
+            filename=sys.argv[2],
+            token=os.environ.get("UPLOAD_TOKEN", ""),
+            visibility="private"
+        )
+        sys.exit(0 if stream_client.upload() else 1)
+
     token = input("Nhập token (JWT): ").strip()
     file_path = input("Nhập đường dẫn file cần upload: ").strip()
 
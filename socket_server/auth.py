@@ -0,0 +1,86 @@
+"""
+auth.py
+-------
+Module xác thực cho socket server.
+
+Chức năng:
+- Đọc SECRET_KEY dùng chung với Flask API (backend_api/.env)
+- Giải mã và kiểm tra vé (ticket) ngắn hạn do Flask cấp
+- Kiểm tra token đăng nhập (JWT) của người dùng
+"""
+
+import os
+from typing import Optional, Dict, Any
+
+try:
+    import jwt
+except ImportError:
+    raise ImportError("⚠️ Thiếu thư viện 'PyJWT'. Cài đặt bằng: pip install PyJWT")
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(os.path.dirname(__file__), "..", "backend_api", ".env"))
+except ImportError:
+    pass
+
+# ==============================================
+# ⚙️ Cấu hình
+# ==============================================
+SECRET_KEY = os.environ.get("SECRET_KEY", "secretkey")
+
+
+# ==============================================
+# 🎫 Kiểm tra vé
+# ==============================================
+def _decode(token: str, label: str) -> Optional[Dict[str, Any]]:
+    """Giải mã JWT (HS256, SECRET_KEY chung), None nếu sai chữ ký / hết hạn."""
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        print(f"[Auth] ⏱️ {label} đã hết hạn.")
+    except jwt.InvalidTokenError:
+        print(f"[Auth] 🚫 {label} không hợp lệ.")
+    return None
+
+
+def verify_ticket(ticket: str, scope: str) -> Optional[Dict[str, Any]]:
+    """
+    Giải mã vé JWT do Flask cấp và kiểm tra phạm vi (scope).
+
+    Args:
+        ticket (str): Chuỗi JWT.
+        scope (str): Phạm vi yêu cầu (vd: "download").
+    Returns:
+        dict | None: Claims nếu hợp lệ, None nếu sai chữ ký / hết hạn / sai scope.
+    """
+    if not ticket:
+        return None
+    claims = _decode(ticket, "Vé")
+    if not claims:
+        return None
+
+    if claims.get("scope") != scope:
+        print(f"[Auth] 🚫 Vé sai phạm vi (cần '{scope}').")
+        return None
+    return claims
+
+
+# ==============================================
+# 👤 Kiểm tra token đăng nhập
+# ==============================================
+def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Kiểm tra token đăng nhập do Flask cấp (/api/login), giống token_required bên API.
+
+    Args:
+        token (str): Chuỗi JWT của người dùng.
+    Returns:
+        dict | None: Claims (có user_id) nếu hợp lệ, None nếu không.
+    """
+    if not token:
+        return None
+    claims = _decode(token, "Token")
+    if not claims or "user_id" not in claims or claims.get("scope"):
+        # Vé ngắn hạn (có scope) không được dùng thay token đăng nhập
+        return None
+    return claims
@@ -24,7 +24,7 @@ TMP_DIR = os.path.join(BASE_DIR, "tmp")
 os.makedirs(TMP_DIR, exist_ok=True)
 
 STATE_FILE = os.path.join(TMP_DIR, "uploads_state.json")
-_LOCK = threading.Lock()  # Khóa để tránh ghi/đọc đồng thời
+_LOCK = threading.RLock()  # Khóa để tránh ghi/đọc đồng thời (re-entrant để update/delete giữ khóa suốt load+save)
 
 
 # ==============================================
@@ -99,9 +99,10 @@ class Persistence:
             upload_id (str): ID của phiên upload.
             info (dict): Dữ liệu cần cập nhật (vd: {"offset": 2048, "status": "paused"}).
         """
-        data = self.load()
-        data[upload_id] = info
-        self.save(data)
+        with _LOCK:  # Giữ khóa suốt load+save để nhiều luồng upload song song không ghi đè lẫn nhau
+            data = self.load()
+            data[upload_id] = info
+            self.save(data)
         print(f"[Persistence] 💾 Đã cập nhật trạng thái upload {upload_id}.")
 
     # ------------------------------
@@ -117,8 +118,10 @@ class Persistence:
         """
         Xóa thông tin upload cụ thể (vd: khi upload hoàn tất).
         """
-        data = self.load()
-        if upload_id in data:
+        with _LOCK:
+            data = self.load()
+            if upload_id not in data:
+                return
             del data[upload_id]
             self.save(data)
-            print(f"[Persistence] 🗑️ Đã xóa trạng thái upload {upload_id}.")
+        print(f"[Persistence] 🗑️ Đã xóa trạng thái upload {upload_id}.")
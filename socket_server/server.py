@@ -8,6 +8,7 @@ import os
 import time
 import traceback
 import sys
+from collections import OrderedDict
 from typing import Optional
 
 # Đảm bảo Python tìm thấy các module trong cùng thư mục
@@ -20,6 +21,8 @@ try:
     from persistence import Persistence
     from chunk_handler import write_chunk
     from backend_client import BackendClient
+    from auth import verify_ticket, verify_token
+    from ws_protocol import WebSocket, WebSocketError, OP_TEXT, OP_BINARY
 except Exception as e:
     print("❌ LỖI: không thể nhập các module phụ:", e)
     traceback.print_exc()
@@ -29,14 +32,26 @@ except Exception as e:
 # ⚙️ CẤU HÌNH SERVER
 # ==============================
 HOST = "0.0.0.0"
-PORT = 6000
+PORT = int(os.environ.get("TCP_PORT", 6000))  # cổng TCP (client Python, cầu nối Flask, tải xuống)
+WS_PORT = int(os.environ.get("WS_PORT", 6001))  # cổng WebSocket cho trình duyệt
 BASE_DIR = os.path.join(os.path.dirname(__file__), "..")
 STORAGE_DIR = os.path.join(BASE_DIR, "storage", "uploads")
 os.makedirs(STORAGE_DIR, exist_ok=True)
 
+# Giới hạn kích thước chunk mà server chấp nhận (client tự điều chỉnh trong khoảng này)
+MIN_CHUNK_SIZE = int(os.environ.get("MIN_CHUNK_SIZE", 16 * 1024))          # 16KB
+MAX_CHUNK_SIZE = int(os.environ.get("MAX_CHUNK_SIZE", 8 * 1024 * 1024))    # 8MB
+
 state = Persistence()
 backend = BackendClient()
 
+# Upload streaming vừa 'finish' (upload_id -> kích thước đã chốt): trạng thái phiên bị xóa ngay
+# khi hoàn tất, client gửi lại 'finish' (mất phản hồi, kết nối lại) vẫn nhận được 'completed'.
+# 'start' không xóa mục này; chỉ 'finish' của một phiên mới cùng id (kích thước khác) ghi đè.
+RECENT_FINISHED_MAX = 1024
+recent_finished = OrderedDict()
+finish_lock = threading.Lock()
+
 # ==============================
 # 🔧 HÀM TIỆN ÍCH
 # ==============================
@@ -99,11 +114,282 @@ def recv_exact(conn: socket.socket, n: int) -> Optional[bytes]:
         remaining -= len(chunk)
     return b"".join(parts)
 
+def new_upload_dir(upload_id: str) -> str:
+    """
+    Chọn thư mục lưu cho phiên upload mới. upload_id của client ổn định theo nội dung file,
+    nên upload lại cùng file sau khi đã hoàn tất sẽ trùng id: dùng thư mục mới để không ghi
+    đè file mà tài liệu cũ đang trỏ tới.
+    """
+    name, n = upload_id, 1
+    while os.path.exists(os.path.join(STORAGE_DIR, name)):
+        name = f"{upload_id}_{n}"
+        n += 1
+    return name
+
+def upload_file_path(upload_id: str, info: dict) -> str:
+    """Đường dẫn file đích của một phiên upload (tạo thư mục nếu chưa có)."""
+    save_dir = os.path.join(STORAGE_DIR, info.get("dir", upload_id))
+    os.makedirs(save_dir, exist_ok=True)
+    return os.path.join(save_dir, info.get("filename"))
+
+def complete_upload(upload_id: str, info: dict, file_path: str):
+    """Upload đủ dữ liệu: báo Flask tạo metadata và xóa trạng thái phiên."""
+    filename = info.get("filename")
+    print(f"✅ Hoàn thành upload {upload_id}: {filename}")
+    full_metadata = info.get("metadata", {})
+    if "filename" not in full_metadata:
+        full_metadata["filename"] = filename
+    backend.notify_completion(upload_id, file_path, full_metadata)
+    state.delete(upload_id)
+
+def resolve_storage_path(rel_path: str) -> Optional[str]:
+    """Chuyển đường dẫn tương đối (trong vé) thành đường dẫn tuyệt đối, chặn '..' thoát khỏi STORAGE_DIR."""
+    if not rel_path:
+        return None
+    root = os.path.realpath(STORAGE_DIR)
+    full = os.path.realpath(os.path.join(root, rel_path))
+    if os.path.commonpath([root, full]) != root:
+        return None
+    return full
+
+def handle_download(conn: socket.socket, header: dict, peer: str) -> bool:
+    """
+    Xử lý action 'download': kiểm tra vé do Flask cấp rồi gửi file bằng sendfile (zero-copy).
+    Hỗ trợ offset/length để tải theo khoảng và tải tiếp (resume) giống upload.
+    Trả về False nếu kết nối hỏng giữa chừng.
+    """
+    claims = verify_ticket(header.get("ticket"), scope="download")
+    if not claims:
+        send_json(conn, {"status": "error", "reason": "invalid_ticket"})
+        return True
+
+    file_path = resolve_storage_path(claims.get("file_path"))
+    if not file_path or not os.path.isfile(file_path):
+        send_json(conn, {"status": "error", "reason": "file_not_found"})
+        return True
+
+    filesize = os.path.getsize(file_path)
+    try:
+        offset = int(header.get("offset", 0))
+        length = int(header.get("length") or 0)
+    except (TypeError, ValueError):
+        offset, length = -1, -1
+    if offset < 0 or offset > filesize or length < 0:
+        send_json(conn, {"status": "error", "reason": "invalid_range"})
+        return True
+
+    remaining = filesize - offset
+    length = min(length, remaining) if length else remaining
+
+    send_json(conn, {
+        "status": "ok",
+        "doc_id": claims.get("doc_id"),
+        "filename": os.path.basename(file_path),
+        "filesize": filesize,
+        "offset": offset,
+        "length": length
+    })
+    if length == 0:
+        return True
+
+    try:
+        with open(file_path, "rb") as f:
+            sent = conn.sendfile(f, offset, length)
+    except OSError as e:
+        print(f"⚠️ Mất kết nối khi gửi file cho {peer}: {e}")
+        return False
+
+    print(f"⬇️ Đã gửi {sent} bytes (offset {offset}) của doc {claims.get('doc_id')} cho {peer}")
+    return sent == length
+
+def handle_upload_action(header: dict, read_data, reply, peer: str, user_id=None) -> bool:
+    """
+    Xử lý một action của phiên upload, dùng chung cho TCP và WebSocket.
+
+    Args:
+        header (dict): Header JSON của client.
+        read_data: Hàm read_data(n) -> bytes | None, đọc phần dữ liệu của chunk.
+        reply: Hàm reply(dict) gửi phản hồi về client.
+        peer (str): Địa chỉ client (để log).
+        user_id: Người dùng đã xác thực (WebSocket), None với kết nối TCP.
+    Returns:
+        bool: False nếu kết nối phải đóng (mất đồng bộ khung / mất kết nối).
+    """
+    # Mọi phản hồi theo phiên đều kèm upload_id để client có thể chạy nhiều upload
+    # xen kẽ trên cùng một kết nối và phân phối phản hồi về đúng upload
+    action = header.get("action")
+    upload_id = header.get("upload_id")
+    if not upload_id:
+        reply({"status": "error", "reason": "missing_upload_id"})
+        return True
+
+    try:
+        if action == "start":
+            filename = header.get("filename")
+            # streaming: upload từ stream chưa biết độ dài, kích thước chốt bằng action 'finish'
+            streaming = bool(header.get("streaming"))
+            filesize = int(header.get("filesize") or 0)
+            chunk_size = int(header.get("chunk_size", 65536))
+            chunk_size = max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, chunk_size))
+            metadata = header.get("metadata", {})
+            if not filename or (filesize <= 0 and not streaming):
+                reply({"status": "error", "upload_id": upload_id, "reason": "invalid_start_params"})
+                return True
+
+            info = state.get(upload_id)
+            if user_id is not None and info and info.get("user_id") not in (None, user_id):
+                # upload_id này thuộc người dùng khác
+                reply({"status": "error", "upload_id": upload_id, "reason": "forbidden"})
+                return True
+            if not info:
+                info = {
+                    "user_id": user_id,
+                    "filename": filename,
+                    "filesize": None if streaming else filesize,
+                    "streaming": streaming,
+                    "offset": 0,
+                    "status": "started",
+                    "peer": peer,
+                    "metadata": metadata,
+                    "created_at": time.time(),
+                    "dir": new_upload_dir(upload_id)
+                }
+            else:
+                info["peer"] = peer
+                info["status"] = "resumed"
+
+            state.update(upload_id, info)
+            offset = info.get("offset", 0)
+            reply({
+                "status": "ok", "upload_id": upload_id, "offset": offset,
+                "chunk_size": chunk_size,
+                "min_chunk_size": MIN_CHUNK_SIZE,
+                "max_chunk_size": MAX_CHUNK_SIZE
+            })
+
+        elif action == "chunk":
+            length = int(header.get("length", 0))
+            offset = int(header.get("offset", 0))
+            if length <= 0:
+                reply({"status": "error", "upload_id": upload_id, "reason": "invalid_length"})
+                return True
+            if length > MAX_CHUNK_SIZE:
+                # Không đọc phần dữ liệu quá lớn -> mất đồng bộ khung, đóng kết nối
+                reply({"status": "error", "upload_id": upload_id, "reason": "chunk_too_large", "max_chunk_size": MAX_CHUNK_SIZE})
+                return False
+
+            data = read_data(length)
+            if data is None:
+                print(f"⚠️ Mất kết nối giữa chừng từ {peer} khi đọc chunk (expected={length}).")
+                return False
+
+            info = state.get(upload_id)
+            if not info:
+                reply({"status": "error", "upload_id": upload_id, "reason": "unknown_upload"})
+                return True
+
+            file_path = upload_file_path(upload_id, info)
+            if not write_chunk(file_path, data, offset):
+                reply({"status": "error", "upload_id": upload_id, "reason": "write_failed"})
+                return True
+
+            new_offset = offset + length
+            info["offset"] = new_offset
+            info["status"] = "uploading"
+            state.update(upload_id, info)
+
+            reply({"status": "ok", "upload_id": upload_id, "offset": new_offset})
+
+            filesize = info.get("filesize")
+            if filesize is not None and new_offset >= filesize:
+                complete_upload(upload_id, info, file_path)
+
+        elif action == "finish":
+            # Chốt upload streaming: client báo tổng kích thước sau khi stream hết
+            filesize = int(header.get("filesize", -1))
+            with finish_lock:
+                info = state.get(upload_id)
+                done = recent_finished.get(upload_id) == filesize
+                if done and (not info or info.get("status") == "finishing"):
+                    # 'finish' lặp lại với cùng kích thước (phiên đã / đang hoàn tất): trả lại đúng phản hồi cũ
+                    reply({"status": "ok", "upload_id": upload_id, "offset": filesize, "state": "completed"})
+                    return True
+                if not info:
+                    reply({"status": "error", "upload_id": upload_id, "reason": "unknown_upload"})
+                    return True
+                if not info.get("streaming"):
+                    # Upload biết trước kích thước tự hoàn tất ở chunk cuối
+                    reply({"status": "error", "upload_id": upload_id, "reason": "not_streaming"})
+                    return True
+                offset = info.get("offset", 0)
+                if filesize != offset:
+                    # Thiếu/thừa dữ liệu: trả offset thật để client gửi tiếp từ đó
+                    reply({"status": "error", "upload_id": upload_id, "reason": "size_mismatch", "offset": offset})
+                    return True
+                # Đánh dấu trước khi nhả khóa: 'finish' thứ hai tới trong lúc đang hoàn tất không chạy lại
+                info["status"] = "finishing"
+                state.update(upload_id, info)
+                recent_finished[upload_id] = filesize
+                recent_finished.move_to_end(upload_id)
+                while len(recent_finished) > RECENT_FINISHED_MAX:
+                    recent_finished.popitem(last=False)
+
+            file_path = upload_file_path(upload_id, info)
+            try:
+                # Cắt phần thừa (nếu file cũ dài hơn) / tạo file rỗng cho stream 0 byte
+                with open(file_path, "r+b" if os.path.exists(file_path) else "wb") as f:
+                    f.truncate(filesize)
+            except OSError:
+                with finish_lock:
+                    recent_finished.pop(upload_id, None)
+                    info["status"] = "uploading"
+                    state.update(upload_id, info)
+                raise
+            info["filesize"] = filesize
+            reply({"status": "ok", "upload_id": upload_id, "offset": filesize, "state": "completed"})
+            complete_upload(upload_id, info, file_path)
+
+        elif action == "pause":
+            info = state.get(upload_id); info["status"] = "paused"; state.update(upload_id, info)
+            reply({"status": "ok", "upload_id": upload_id, "state": "paused"})
+            print(f"⏸ Upload {upload_id} đã tạm dừng.")
+
+        elif action == "resume":
+            info = state.get(upload_id)
+            info["status"] = "resumed"; info["peer"] = peer
+            state.update(upload_id, info)
+            offset = info.get("offset", 0)
+            reply({"status": "ok", "upload_id": upload_id, "offset": offset})
+            print(f"▶️ Upload {upload_id} đã tiếp tục từ offset {offset}.")
+
+        elif action == "stop":
+            info = state.get(upload_id); info["status"] = "stopped"; state.update(upload_id, info)
+            reply({"status": "ok", "upload_id": upload_id, "state": "stopped"})
+            print(f"⛔ Upload {upload_id} đã dừng.")
+
+        elif action == "query_resume":
+            offset = state.get(upload_id).get("offset", 0)
+            reply({"status": "ok", "upload_id": upload_id, "offset": offset})
+
+        else:
+            reply({"status": "error", "upload_id": upload_id, "reason": "unknown_action"})
+
+    except Exception as inner:
+        print(f"❌ Lỗi khi xử lý {peer}: {inner}")
+        traceback.print_exc()
+        try:
+            reply({"status": "error", "upload_id": upload_id, "reason": "internal_server_error"})
+        except Exception:
+            pass
+    return True
+
 def handle_client(conn: socket.socket, addr):
     peer = f"{addr[0]}:{addr[1]}"
     print(f"🔌 Client mới: {peer}")
     # timeout: nếu client im lặng quá lâu sẽ văng ra None từ recv_line/recv_exact
     conn.settimeout(60)  # điều chỉnh hợp lý: 30-120s tùy usecase
+    reply = lambda obj: send_json(conn, obj)
+    read_data = lambda n: recv_exact(conn, n)
 
     try:
         while True:
@@ -119,141 +405,127 @@ def handle_client(conn: socket.socket, addr):
                 continue
 
             action = header.get("action")
-            upload_id = header.get("upload_id")
-            if not upload_id:
-                send_json(conn, {"status": "error", "reason": "missing_upload_id"})
+            if action == "download":
+                # Download không gắn với upload_id, được xác thực bằng vé
+                if not handle_download(conn, header, peer):
+                    break
                 continue
 
-            try:
-                if action == "start":
-                    filename = header.get("filename")
-                    filesize = int(header.get("filesize", 0))
-                    chunk_size = int(header.get("chunk_size", 65536))
-                    metadata = header.get("metadata", {})
-                    if not filename or filesize <= 0:
-                        send_json(conn, {"status": "error", "reason": "invalid_start_params"})
-                        continue
-
-                    info = state.get(upload_id)
-                    if not info:
-                        info = {
-                            "filename": filename,
-                            "filesize": filesize,
-                            "offset": 0,
-                            "status": "started",
-                            "peer": peer,
-                            "metadata": metadata,
-                            "created_at": time.time()
-                        }
-                    else:
-                        info["peer"] = peer
-                        info["status"] = "resumed"
-
-                    state.update(upload_id, info)
-                    offset = info.get("offset", 0)
-                    send_json(conn, {"status": "ok", "upload_id": upload_id, "offset": offset, "chunk_size": chunk_size})
-
-                elif action == "chunk":
-                    length = int(header.get("length", 0))
-                    offset = int(header.get("offset", 0))
-                    if length <= 0:
-                        send_json(conn, {"status": "error", "reason": "invalid_length"})
-                        continue
-
-                    data = recv_exact(conn, length)
-                    if data is None:
-                        print(f"⚠️ Mất kết nối giữa chừng từ {peer} khi đọc chunk (expected={length}).")
-                        break
-
-                    info = state.get(upload_id)
-                    if not info:
-                        send_json(conn, {"status": "error", "reason": "unknown_upload"})
-                        continue
-
-                    filename = info.get("filename")
-                    save_dir = os.path.join(STORAGE_DIR, upload_id)
-                    os.makedirs(save_dir, exist_ok=True)
-                    file_path = os.path.join(save_dir, filename)
-
-                    if not write_chunk(file_path, data, offset):
-                        send_json(conn, {"status": "error", "reason": "write_failed"})
-                        continue
-
-                    new_offset = offset + length
-                    info["offset"] = new_offset
-                    info["status"] = "uploading"
-                    state.update(upload_id, info)
-
-                    send_json(conn, {"status": "ok", "offset": new_offset})
-
-                    if new_offset >= info.get("filesize", 0):
-                        print(f"✅ Hoàn thành upload {upload_id}: {filename}")
-                        full_metadata = info.get("metadata", {})
-                        if "filename" not in full_metadata:
-                            full_metadata["filename"] = filename
-                        backend.notify_completion(upload_id, file_path, full_metadata)
-                        state.delete(upload_id)
-
-                elif action == "pause":
-                    info = state.get(upload_id); info["status"] = "paused"; state.update(upload_id, info)
-                    send_json(conn, {"status": "ok", "upload_id": upload_id, "state": "paused"})
-                    print(f"⏸ Upload {upload_id} đã tạm dừng.")
+            if not handle_upload_action(header, read_data, reply, peer):
+                break
 
-                elif action == "resume":
-                    info = state.get(upload_id)
-                    info["status"] = "resumed"; info["peer"] = peer
-                    state.update(upload_id, info)
-                    offset = info.get("offset", 0)
-                    send_json(conn, {"status": "ok", "upload_id": upload_id, "offset": offset})
-                    print(f"▶️ Upload {upload_id} đã tiếp tục từ offset {offset}.")
+    except ConnectionResetError as cre:
+        print(f"🔥 ConnectionResetError từ {peer}: {cre}")
+    except Exception as ex:
+        print(f"🔥 Lỗi client {peer}: {ex}")
+        traceback.print_exc()
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        print(f"🧹 Dọn dẹp kết nối cho {peer}")
 
-                elif action == "stop":
-                    info = state.get(upload_id); info["status"] = "stopped"; state.update(upload_id, info)
-                    send_json(conn, {"status": "ok", "upload_id": upload_id, "state": "stopped"})
-                    print(f"⛔ Upload {upload_id} đã dừng.")
+def handle_ws_client(conn: socket.socket, addr):
+    """
+    Phiên upload qua WebSocket (trình duyệt kết nối thẳng, không qua cầu nối Flask).
+    Frame text = header JSON (cùng các action như TCP), chunk gửi header rồi một frame binary.
+    'start' phải kèm token đăng nhập hợp lệ trong metadata; các action khác chỉ được
+    dùng cho upload đã 'start' trên kết nối này.
+    """
+    peer = f"{addr[0]}:{addr[1]}"
+    conn.settimeout(60)
+    ws = WebSocket(conn, max_message=MAX_CHUNK_SIZE)
+    owned = {}  # upload_id -> user_id đã xác thực trên kết nối này
 
-                elif action == "query_resume":
-                    offset = state.get(upload_id).get("offset", 0)
-                    send_json(conn, {"status": "ok", "upload_id": upload_id, "offset": offset})
+    def read_data(n):
+        """Đọc frame binary đi sau header 'chunk'; None (đóng kết nối) nếu sai khung."""
+        try:
+            message = ws.recv()
+            if message is None:
+                return None
+            opcode, payload = message
+            if opcode != OP_BINARY or len(payload) != n:
+                raise WebSocketError("chunk_frame_mismatch")
+        except WebSocketError as e:
+            print(f"⚠️ WebSocket {peer} sai giao thức: {e}")
+            ws.close(e.code)
+            return None
+        return payload
 
-                else:
-                    send_json(conn, {"status": "error", "reason": "unknown_action"})
+    try:
+        if not ws.handshake():
+            print(f"⚠️ {peer} không bắt tay WebSocket hợp lệ.")
+            return
+        print(f"🌐 Client WebSocket mới: {peer}")
 
-            except Exception as inner:
-                print(f"❌ Lỗi khi xử lý {peer}: {inner}")
-                traceback.print_exc()
-                try:
-                    send_json(conn, {"status": "error", "reason": "internal_server_error"})
-                except Exception:
-                    pass
+        while True:
+            message = ws.recv()
+            if message is None:
+                print(f"❎ {peer} đã đóng WebSocket.")
+                break
+            opcode, payload = message
+            if opcode != OP_TEXT:
+                ws.send_json({"status": "error", "reason": "unexpected_binary"})
+                continue
+            try:
+                header = json.loads(payload.decode("utf-8"))
+            except Exception:
+                ws.send_json({"status": "error", "reason": "invalid_header"})
+                continue
 
-    except ConnectionResetError as cre:
-        print(f"🔥 ConnectionResetError từ {peer}: {cre}")
+            action, upload_id = header.get("action"), header.get("upload_id")
+            if action == "start":
+                claims = verify_token((header.get("metadata") or {}).get("token"))
+                if not claims:
+                    ws.send_json({"status": "error", "upload_id": upload_id, "reason": "unauthorized"})
+                    continue
+                user_id = claims["user_id"]
+            else:
+                user_id = owned.get(upload_id)
+                if user_id is None:
+                    if action == "chunk" and read_data(int(header.get("length", 0))) is None:
+                        break  # bỏ phần dữ liệu đi kèm
+                    ws.send_json({"status": "error", "upload_id": upload_id, "reason": "unauthorized"})
+                    continue
+
+            if not handle_upload_action(header, read_data, ws.send_json, peer, user_id=user_id):
+                break
+            if action == "start":
+                info = state.get(upload_id)
+                if info and info.get("user_id") == user_id:
+                    owned[upload_id] = user_id
+
+    except WebSocketError as e:
+        print(f"⚠️ WebSocket {peer} sai giao thức: {e}")
+        ws.close(e.code)
+    except (ConnectionResetError, socket.timeout) as e:
+        print(f"🔥 WebSocket {peer} mất kết nối: {e}")
     except Exception as ex:
-        print(f"🔥 Lỗi client {peer}: {ex}")
+        print(f"🔥 Lỗi client WebSocket {peer}: {ex}")
         traceback.print_exc()
     finally:
         try:
             conn.close()
         except Exception:
             pass
-        print(f"🧹 Dọn dẹp kết nối cho {peer}")
+        print(f"🧹 Dọn dẹp kết nối WebSocket cho {peer}")
 
 # ==============================
 # 🖥️ MAIN SERVER LOOP
 # ==============================
-def accept_loop():
+def accept_loop(port=PORT, handler=handle_client, label="TCP"):
     """Lắng nghe kết nối mới và tạo thread xử lý."""
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((HOST, PORT))
+        s.bind((HOST, port))
         s.listen(16)
-        print(f"🚀 Socket server (TCP) đang chạy tại {HOST}:{PORT}")
+        print(f"🚀 Socket server ({label}) đang chạy tại {HOST}:{port}")
 
         while True:
             try:
                 conn, addr = s.accept()
-                threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
+                threading.Thread(target=handler, args=(conn, addr), daemon=True).start()
             except KeyboardInterrupt:
                 print("🛑 Đang tắt server...")
                 break
@@ -264,6 +536,7 @@ def accept_loop():
 
 if __name__ == "__main__":
     try:
+        threading.Thread(target=accept_loop, args=(WS_PORT, handle_ws_client, "WebSocket"), daemon=True).start()
         accept_loop()
     except KeyboardInterrupt:
         print("🛑 Đang tắt server...")
\ No newline at end of file
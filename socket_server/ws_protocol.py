@@ -0,0 +1,192 @@
+"""
+ws_protocol.py
+--------------
+WebSocket (RFC 6455) tối giản cho socket server.
+
+Chức năng:
+- Bắt tay HTTP Upgrade (Sec-WebSocket-Accept)
+- Đọc frame từ trình duyệt (có mask, ghép frame phân mảnh, tự trả lời ping/close)
+- Gửi frame text (JSON) / binary từ server (không mask)
+"""
+
+import base64
+import hashlib
+import json
+import socket
+import struct
+from typing import Optional, Tuple
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_HANDSHAKE_BYTES = 16 * 1024
+
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# Mã đóng kết nối
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_TOO_BIG = 1009
+
+
+class WebSocketError(Exception):
+    """Frame sai giao thức hoặc vượt giới hạn: kết nối cần được đóng."""
+
+    def __init__(self, reason: str, code: int = CLOSE_PROTOCOL_ERROR):
+        super().__init__(reason)
+        self.code = code
+
+
+def accept_key(key: str) -> str:
+    """Giá trị Sec-WebSocket-Accept cho Sec-WebSocket-Key của client."""
+    digest = hashlib.sha1((key + WS_GUID).encode("ascii")).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def _unmask(payload: bytes, mask: bytes) -> bytes:
+    """XOR payload với mask 4 byte (làm trên số nguyên lớn để không lặp từng byte)."""
+    n = len(payload)
+    if not n:
+        return payload
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(n, "big")
+
+
+class WebSocket:
+    """Một kết nối WebSocket phía server, đọc qua buffer lớn của socket."""
+
+    def __init__(self, conn: socket.socket, max_message: int, recv_buffer: int = 256 * 1024):
+        self.conn = conn
+        self.rf = conn.makefile("rb", buffering=recv_buffer)
+        self.max_message = max_message
+        self.path = None
+        self.closed = False
+
+    # ------------------------------
+    # 🤝 Bắt tay
+    # ------------------------------
+    def handshake(self) -> bool:
+        """Đọc request HTTP Upgrade và trả 101. Trả về False nếu không phải WebSocket."""
+        request_line = self.rf.readline(MAX_HANDSHAKE_BYTES)
+        headers, total = {}, len(request_line)
+        while True:
+            line = self.rf.readline(MAX_HANDSHAKE_BYTES)
+            total += len(line)
+            if not line or total > MAX_HANDSHAKE_BYTES:
+                return False
+            if line in (b"\r\n", b"\n"):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        parts = request_line.decode("latin-1").split()
+        key = headers.get("sec-websocket-key")
+        if (len(parts) < 2 or parts[0] != "GET" or not key
+                or "websocket" not in headers.get("upgrade", "").lower()
+                or headers.get("sec-websocket-version") != "13"):
+            self.conn.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            return False
+
+        self.path = parts[1]
+        self.conn.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept_key(key)}\r\n\r\n"
+        ).encode("ascii"))
+        return True
+
+    # ------------------------------
+    # 📥 Đọc
+    # ------------------------------
+    def _read_exact(self, n: int) -> bytes:
+        data = self.rf.read(n)
+        if data is None or len(data) < n:
+            raise ConnectionResetError("WebSocket bị đóng giữa frame")
+        return data
+
+    def _read_frame(self) -> Tuple[bool, int, bytes]:
+        b1, b2 = self._read_exact(2)
+        fin, opcode = bool(b1 & 0x80), b1 & 0x0F
+        if b1 & 0x70:
+            raise WebSocketError("rsv_bits_set")
+        if not b2 & 0x80:
+            raise WebSocketError("unmasked_client_frame")
+        length = b2 & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._read_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._read_exact(8))[0]
+        if opcode >= OP_CLOSE and (length > 125 or not fin):
+            raise WebSocketError("invalid_control_frame")
+        if length > self.max_message:
+            raise WebSocketError("message_too_big", CLOSE_TOO_BIG)
+        mask = self._read_exact(4)
+        return fin, opcode, _unmask(self._read_exact(length), mask)
+
+    def recv(self) -> Optional[Tuple[int, bytes]]:
+        """
+        Đọc một message hoàn chỉnh.
+        Trả về (OP_TEXT | OP_BINARY, payload), hoặc None khi client đóng kết nối.
+        """
+        opcode, parts, size = None, [], 0
+        while True:
+            fin, op, payload = self._read_frame()
+            if op == OP_PING:
+                self._send_frame(OP_PONG, payload)
+                continue
+            if op == OP_PONG:
+                continue
+            if op == OP_CLOSE:
+                self.close(CLOSE_NORMAL)
+                return None
+
+            if op == OP_CONT:
+                if opcode is None:
+                    raise WebSocketError("unexpected_continuation")
+            elif opcode is not None:
+                raise WebSocketError("interleaved_message")
+            else:
+                opcode = op
+            if opcode not in (OP_TEXT, OP_BINARY):
+                raise WebSocketError("unknown_opcode")
+
+            parts.append(payload)
+            size += len(payload)
+            if size > self.max_message:
+                raise WebSocketError("message_too_big", CLOSE_TOO_BIG)
+            if fin:
+                return opcode, payload if len(parts) == 1 else b"".join(parts)
+
+    # ------------------------------
+    # 📤 Gửi
+    # ------------------------------
+    def _send_frame(self, opcode: int, payload: bytes):
+        n = len(payload)
+        if n < 126:
+            header = struct.pack("!BB", 0x80 | opcode, n)
+        elif n < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+        self.conn.sendall(header + payload)
+
+    def send_json(self, obj: dict) -> bool:
+        """Gửi dict dưới dạng frame text. Trả về False nếu kết nối hỏng."""
+        try:
+            self._send_frame(OP_TEXT, json.dumps(obj).encode("utf-8"))
+            return True
+        except OSError:
+            return False
+
+    def close(self, code: int = CLOSE_NORMAL):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._send_frame(OP_CLOSE, struct.pack("!H", code))
+        except OSError:
+            pass
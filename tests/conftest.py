@@ -0,0 +1,44 @@
+"""
+conftest.py
+-----------
+Cho test import trực tiếp các module của backend_api, socket_server, socket_client
+(các thư mục này không phải package, mỗi thành phần tự thêm thư mục của mình vào sys.path).
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for folder in ("backend_api", "socket_server", "socket_client"):
+    sys.path.insert(0, os.path.join(ROOT, folder))
+
+
+@pytest.fixture(scope="session")
+def api_module(tmp_path_factory):
+    """
+    Import backend_api/app.py một lần với SQLite tạm: không MySQL, không Redis
+    (cổng 1 -> kết nối bị từ chối, app tự chạy không cache), không worker nền.
+    """
+    data_dir = tmp_path_factory.mktemp("api")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{data_dir / 'app.db'}",
+        "REDIS_HOST": "127.0.0.1",
+        "REDIS_PORT": "1",
+        "SEARCH_INDEX": "0",
+        "JOB_WORKERS": "0",
+        "FEED_CACHE_TTL": "0",
+        "AUTH_CACHE_TTL": "0",
+    })
+    import app
+    return app
+
+
+@pytest.fixture
+def api(api_module):
+    """ app.py với các bảng trống cho mỗi test """
+    with api_module.app.app_context():
+        api_module.db.drop_all()
+        api_module.db.create_all()
+    return api_module
@@ -0,0 +1,61 @@
+"""
+test_auth.py
+------------
+Tách phạm vi giữa token đăng nhập và vé tải xuống: vé (có scope) không dùng thay token
+được và ngược lại; vé do Flask cấp trỏ tới cổng TCP của socket server.
+"""
+
+import datetime
+
+import jwt
+
+import auth
+
+
+def mint(claims, seconds=60, key=None):
+    claims = dict(claims, exp=datetime.datetime.utcnow() + datetime.timedelta(seconds=seconds))
+    return jwt.encode(claims, key or auth.SECRET_KEY, algorithm="HS256")
+
+
+def test_verify_token_accepts_login_token_only():
+    assert auth.verify_token(mint({"user_id": 7}))["user_id"] == 7
+    # Vé tải xuống có user_id nhưng không được dùng làm token đăng nhập
+    assert auth.verify_token(mint({"user_id": 7, "scope": "download", "doc_id": 1})) is None
+    assert auth.verify_token(mint({"doc_id": 1})) is None
+    assert auth.verify_token("") is None
+
+
+def test_verify_ticket_checks_scope():
+    ticket = mint({"user_id": 7, "scope": "download", "doc_id": 1, "file_path": "a.pdf"})
+    assert auth.verify_ticket(ticket, "download")["doc_id"] == 1
+    assert auth.verify_ticket(ticket, "upload") is None
+    # Token đăng nhập không có scope -> không phải vé
+    assert auth.verify_ticket(mint({"user_id": 7}), "download") is None
+
+
+def test_expired_or_forged_are_rejected():
+    assert auth.verify_token(mint({"user_id": 7}, seconds=-10)) is None
+    assert auth.verify_ticket(mint({"scope": "download"}, seconds=-10), "download") is None
+    assert auth.verify_token(mint({"user_id": 7}, key="khac-" + auth.SECRET_KEY)) is None
+
+
+def test_download_ticket_points_to_tcp_port(api):
+    with api.app.app_context():
+        user = api.User(name="a", email="a@example.com", password_hash="x")
+        api.db.session.add(user)
+        api.db.session.commit()
+        doc = api.Document(filename="a.pdf", file_path="storage/a.pdf", user_id=user.id)
+        api.db.session.add(doc)
+        api.db.session.commit()
+        user_id, doc_id = user.id, doc.id
+
+    token = jwt.encode({"user_id": user_id, "exp": datetime.datetime.utcnow() + datetime.timedelta(minutes=5)},
+                       api.app.config["SECRET_KEY"], algorithm="HS256")
+    resp = api.app.test_client().post(f"/api/documents/{doc_id}/download-ticket",
+                                      headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body["socket_url"] == f"tcp://{api.TCP_SERVER_HOST}:{api.TCP_SERVER_PORT}"
+    claims = auth.verify_ticket(body["ticket"], "download")
+    assert claims["doc_id"] == doc_id and claims["user_id"] == user_id
+    assert auth.verify_token(body["ticket"]) is None
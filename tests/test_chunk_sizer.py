@@ -0,0 +1,49 @@
+"""
+test_chunk_sizer.py
+-------------------
+ChunkSizer của client: tăng tối đa gấp đôi mỗi bước, giảm ngay khi mạng chậm,
+giảm một nửa khi lỗi, luôn căn theo ALIGN và nằm trong [min_size, max_size].
+"""
+
+from client import ChunkSizer
+
+KB = 1024
+MB = 1024 * 1024
+
+
+def test_initial_size_is_clamped_and_aligned():
+    assert ChunkSizer(64 * KB + 123, 16 * KB, 8 * MB).size == 64 * KB
+    assert ChunkSizer(1 * KB, 16 * KB, 8 * MB).size == 16 * KB
+    assert ChunkSizer(64 * MB, 16 * KB, 8 * MB).size == 8 * MB
+    # max nhỏ hơn min -> dùng min
+    assert ChunkSizer(64 * KB, 16 * KB, 4 * KB).size == 16 * KB
+
+
+def test_grow_is_capped_at_double():
+    sizer = ChunkSizer(64 * KB, 16 * KB, 8 * MB)
+    # Mạng rất nhanh: throughput * TARGET_SECONDS vượt xa, nhưng chỉ gấp đôi mỗi bước
+    sizer.observe(64 * KB, 0.0001)
+    assert sizer.size == 128 * KB
+    sizer.observe(128 * KB, 0.0001)
+    assert sizer.size == 256 * KB
+    for _ in range(20):
+        sizer.observe(sizer.size, 0.0001)
+    assert sizer.size == 8 * MB
+
+
+def test_shrink_follows_slow_network_immediately():
+    sizer = ChunkSizer(1 * MB, 16 * KB, 8 * MB)
+    # 1 MB mất 10 giây -> ~100 KB/s -> chunk ~50 KB cho TARGET_SECONDS = 0.5
+    sizer.observe(1 * MB, 10)
+    assert sizer.size == 48 * KB
+    assert sizer.size % ChunkSizer.ALIGN == 0
+    assert sizer.rtt == 10
+
+
+def test_on_failure_halves_down_to_min():
+    sizer = ChunkSizer(256 * KB, 64 * KB, 8 * MB)
+    sizer.on_failure()
+    assert sizer.size == 128 * KB
+    sizer.on_failure()
+    sizer.on_failure()
+    assert sizer.size == 64 * KB
@@ -0,0 +1,111 @@
+"""
+test_counters.py
+----------------
+Bộ đếm của tài liệu: CounterBuffer cộng dồn / ghi lại khi lỗi, và job đối chiếu
+reconcile_counters chỉ sửa tài liệu bị lệch, không ghi đè lô cộng chen vào giữa chừng.
+"""
+
+import datetime
+
+from sqlalchemy import event
+
+from counters import CounterBuffer
+
+
+# ==============================
+# ➕ CounterBuffer
+# ==============================
+def test_deltas_merge_and_cancel():
+    batches = []
+    buf = CounterBuffer(batches.append, interval=3600)
+    buf.add(1, "favorite_count")
+    buf.add(1, "favorite_count")
+    buf.add(1, "view_count", 3)
+    buf.add(2, "favorite_count")
+    buf.add(2, "favorite_count", -1)  # thích rồi bỏ thích -> không còn gì để ghi
+    assert buf.flush() == 2
+    assert batches == [{(1, "favorite_count"): 2, (1, "view_count"): 3}]
+    assert buf.flush() == 0
+
+
+def test_failed_flush_merges_back():
+    def failing(deltas):
+        buf.add(1, "favorite_count", -1)  # thay đổi mới tới trong lúc đang ghi
+        raise RuntimeError("db down")
+
+    buf = CounterBuffer(failing, interval=3600)
+    buf.add(1, "favorite_count", 3)
+    buf.add(2, "view_count")
+    assert buf.flush() == 0
+
+    written = []
+    buf.flush_fn = written.append
+    buf.discard_document(2)
+    assert buf.flush() == 1
+    assert written == [{(1, "favorite_count"): 2}]
+
+
+# ==============================
+# 🔁 reconcile_counters
+# ==============================
+def seed(api):
+    """ 3 tài liệu: #1 đúng, #2 lệch lượt xem, #3 lệch lượt thích; trả về id """
+    old = datetime.datetime(2024, 1, 1)
+    users = [api.User(name=f"u{n}", email=f"u{n}@example.com", password_hash="x") for n in range(3)]
+    api.db.session.add_all(users)
+    api.db.session.commit()
+    docs = [api.Document(filename=f"{n}.pdf", file_path=f"{n}.pdf", user_id=users[0].id, updated_at=old,
+                         view_count=views, favorite_count=favorites)
+            for n, (views, favorites) in enumerate([(2, 1), (9, 0), (0, 5)])]
+    api.db.session.add_all(docs)
+    api.db.session.commit()
+    for user in users[:2]:
+        api.db.session.add(api.UserDocumentView(user_id=user.id, document_id=docs[0].id))
+        api.db.session.add(api.UserDocumentView(user_id=user.id, document_id=docs[1].id))
+    api.db.session.add(api.UserFavorite(user_id=users[0].id, document_id=docs[0].id))
+    api.db.session.add(api.UserFavorite(user_id=users[1].id, document_id=docs[2].id))
+    api.db.session.commit()
+    return [doc.id for doc in docs]
+
+
+def counts(api, doc_id):
+    doc = api.db.session.get(api.Document, doc_id)
+    api.db.session.refresh(doc)
+    return doc.view_count, doc.favorite_count, doc.updated_at
+
+
+def test_reconcile_fixes_only_drifted_documents(api):
+    with api.app.app_context():
+        ids = seed(api)
+        assert api.reconcile_counters(batch=2) == 2
+        assert [counts(api, doc_id)[:2] for doc_id in ids] == [(2, 1), (2, 0), (0, 1)]
+        # Đối chiếu không tính là sửa tài liệu
+        assert {counts(api, doc_id)[2] for doc_id in ids} == {datetime.datetime(2024, 1, 1)}
+        assert api.reconcile_counters() == 0
+
+
+def test_reconcile_skips_rows_changed_after_read(api):
+    with api.app.app_context():
+        ids = seed(api)
+        engine = api.db.engine
+        bumped = []
+
+        def bump_before_fix(conn, cursor, statement, parameters, context, executemany):
+            # Một lô cộng bộ đếm chen vào giữa lúc đọc và lúc sửa
+            if statement.lstrip().upper().startswith("UPDATE DOCUMENTS") and executemany and not bumped:
+                bumped.append(ids[1])
+                cursor.execute("UPDATE documents SET view_count = view_count + 1 WHERE id = ?", (ids[1],))
+
+        event.listen(engine, "before_cursor_execute", bump_before_fix)
+        try:
+            assert api.reconcile_counters() == 2
+        finally:
+            event.remove(engine, "before_cursor_execute", bump_before_fix)
+
+        assert bumped
+        # #2 đổi sau khi đọc -> CAS không khớp, giữ nguyên giá trị đã cộng; #3 vẫn được sửa
+        assert counts(api, ids[1])[:2] == (10, 0)
+        assert counts(api, ids[2])[:2] == (0, 1)
+        # Lần đối chiếu sau sửa nốt
+        assert api.reconcile_counters() == 1
+        assert counts(api, ids[1])[:2] == (2, 0)
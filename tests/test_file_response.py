@@ -0,0 +1,128 @@
+"""
+test_file_response.py
+---------------------
+Trả file qua Flask (send_file_response): phân tích Range, GET có điều kiện (ETag / ngày sửa),
+206 một khoảng và multipart/byteranges, nhường việc gửi file cho nginx / Apache (offload).
+"""
+
+import datetime
+import os
+
+import pytest
+from werkzeug.http import http_date
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from file_response import file_etag, parse_ranges, send_file_response
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 100)]),
+    ("bytes=900-", [(900, 1000)]),
+    ("bytes=-50", [(950, 1000)]),
+    ("bytes=-5000", [(0, 1000)]),
+    ("bytes=990-2000", [(990, 1000)]),
+    ("BYTES = 1-2", [(1, 3)]),
+    ("bytes=0-10,5-20,21-30,500-509", [(0, 31), (500, 510)]),
+    ("bytes=500-509,0-9", [(0, 10), (500, 510)]),
+    ("bytes=0-9,,", [(0, 10)]),
+    ("bytes=1000-", []),
+    ("bytes=2000-3000,5000-", []),
+    ("bytes=5-1", None),
+    ("bytes=abc", None),
+    ("bytes=-", None),
+    ("bytes=,", None),
+    ("bytes=", None),
+    ("items=0-1", None),
+    ("bytes=" + ",".join(f"{i}-{i}" for i in range(33)), None),
+])
+def test_parse_ranges(header, expected):
+    assert parse_ranges(header, 1000) == expected
+
+
+CONTENT = bytes(range(256)) * 40  # 10240 byte
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "tài liệu.pdf"
+    path.write_bytes(CONTENT)
+    return str(path)
+
+
+def get(path, headers=None, method="GET"):
+    request = Request(EnvironBuilder(method=method, headers=headers or {}).get_environ())
+    response = send_file_response(request, path, file_etag(path), os.path.basename(path), chunk_size=1000)
+    body = b"".join(response.response) if response.response else b""
+    response.close()
+    return response, body
+
+
+def test_send_file_full_body_and_headers(data_file):
+    response, body = get(data_file)
+    assert response.status_code == 200 and body == CONTENT
+    assert response.headers["ETag"] == f'"{file_etag(data_file)}"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["Content-Length"] == str(len(CONTENT))
+    assert "filename*=UTF-8''t%C3%A0i%20li%E1%BB%87u.pdf" in response.headers["Content-Disposition"]
+
+
+def test_send_file_conditional_get(data_file):
+    etag = file_etag(data_file)
+    mtime = datetime.datetime.fromtimestamp(int(os.stat(data_file).st_mtime), tz=datetime.timezone.utc)
+    later, earlier = http_date(mtime + datetime.timedelta(hours=1)), http_date(mtime - datetime.timedelta(hours=1))
+
+    assert get(data_file, {"If-None-Match": f'"{etag}"'})[0].status_code == 304
+    assert get(data_file, {"If-None-Match": f'W/"{etag}"'})[0].status_code == 304
+    assert get(data_file, {"If-None-Match": '"other"'})[0].status_code == 200
+    assert get(data_file, {"If-Modified-Since": later})[0].status_code == 304
+    assert get(data_file, {"If-Modified-Since": earlier})[0].status_code == 200
+    # If-None-Match có mặt thì bỏ qua If-Modified-Since
+    assert get(data_file, {"If-None-Match": '"other"', "If-Modified-Since": later})[0].status_code == 200
+
+    assert get(data_file, {"If-Match": '"other"'})[0].status_code == 412
+    assert get(data_file, {"If-Match": f'"{etag}"'})[0].status_code == 200
+    assert get(data_file, {"If-Unmodified-Since": earlier})[0].status_code == 412
+    assert get(data_file, {"If-Unmodified-Since": later})[0].status_code == 200
+
+
+def test_send_file_single_range_and_if_range(data_file):
+    etag = file_etag(data_file)
+    response, body = get(data_file, {"Range": "bytes=100-2599"})
+    assert response.status_code == 206 and body == CONTENT[100:2600]
+    assert response.headers["Content-Range"] == f"bytes 100-2599/{len(CONTENT)}"
+    assert response.headers["Content-Length"] == "2500"
+
+    # If-Range khớp (ETag mạnh) -> một phần; không khớp hoặc ETag yếu -> cả file
+    assert get(data_file, {"Range": "bytes=0-9", "If-Range": f'"{etag}"'})[0].status_code == 206
+    assert get(data_file, {"Range": "bytes=0-9", "If-Range": '"old"'})[0].status_code == 200
+    assert get(data_file, {"Range": "bytes=0-9", "If-Range": f'W/"{etag}"'})[0].status_code == 200
+
+    # Range sai cú pháp bị bỏ qua, Range ngoài file -> 416
+    assert get(data_file, {"Range": "bytes=9-1"})[1] == CONTENT
+    response, body = get(data_file, {"Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416 and body == b""
+    assert response.headers["Content-Range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_send_file_multipart_ranges(data_file):
+    response, body = get(data_file, {"Range": "bytes=0-9,-10"})
+    assert response.status_code == 206
+    content_type = response.headers["Content-Type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1]
+    assert int(response.headers["Content-Length"]) == len(body)
+    assert body.endswith(f"\r\n--{boundary}--\r\n".encode())
+    size = len(CONTENT)
+    assert f"Content-Range: bytes 0-9/{size}\r\n\r\n".encode() + CONTENT[:10] in body
+    assert f"Content-Range: bytes {size - 10}-{size - 1}/{size}\r\n\r\n".encode() + CONTENT[-10:] in body
+
+
+def test_send_file_offload_headers(data_file):
+    request = Request(EnvironBuilder(headers={"Range": "bytes=0-9"}).get_environ())
+    response = send_file_response(request, data_file, file_etag(data_file), "a b.pdf",
+                                  offload="x-accel", offload_path="/protected/a b.pdf")
+    assert response.status_code == 200 and response.headers["X-Accel-Redirect"] == "/protected/a%20b.pdf"
+    response = send_file_response(request, data_file, file_etag(data_file), "a b.pdf",
+                                  offload="x-sendfile", offload_path="/srv/tài liệu.pdf")
+    assert response.headers["X-Sendfile"] == "/srv/t%C3%A0i%20li%E1%BB%87u.pdf"
@@ -0,0 +1,52 @@
+"""
+test_keyset_pagination.py
+-------------------------
+Phân trang keyset của API danh sách tài liệu: cursor mã hóa / giải mã (created_at, id),
+cursor hỏng trả 400, đi hết các trang không sót / không lặp kể cả khi trùng created_at.
+"""
+
+import datetime
+
+import pytest
+
+
+def test_cursor_round_trip(api_module):
+    ts = datetime.datetime(2024, 5, 1, 12, 30, 15, 123456)
+    cursor = api_module.encode_cursor(ts, 42)
+    assert "=" not in cursor
+    assert api_module.decode_cursor(cursor) == (ts, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "abc", "!!!", "W10", "WyJ4IiwgMV0"])
+def test_decode_cursor_rejects_garbage(api_module, cursor):
+    # "W10" = [], "WyJ4IiwgMV0" = ["x", 1]
+    with pytest.raises(ValueError, match="invalid cursor"):
+        api_module.decode_cursor(cursor)
+
+
+def test_public_pages_cover_every_document_once(api):
+    same_time = datetime.datetime(2024, 1, 1)
+    with api.app.app_context():
+        user = api.User(name="a", email="a@example.com", password_hash="x")
+        api.db.session.add(user)
+        api.db.session.commit()
+        for n in range(7):
+            api.db.session.add(api.Document(filename=f"{n}.pdf", file_path=f"{n}.pdf", user_id=user.id,
+                                            visibility="public", created_at=same_time))
+        api.db.session.add(api.Document(filename="rieng.pdf", file_path="rieng.pdf", user_id=user.id,
+                                        visibility="private", created_at=same_time))
+        api.db.session.commit()
+
+    http = api.app.test_client()
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, "cursor": cursor} if cursor else {"limit": 3}
+        body = http.get("/api/documents/public", query_string=params).get_json()
+        seen += [doc["id"] for doc in body["documents"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == 7 and len(set(seen)) == 7
+    assert seen == sorted(seen, reverse=True)
+
+    assert http.get("/api/documents/public", query_string={"cursor": "abc"}).status_code == 400
@@ -0,0 +1,78 @@
+"""
+test_mux.py
+-----------
+Kết nối dùng chung (MuxConnection / AsyncMuxConnection): mỗi upload_id chỉ được đăng ký một lần,
+upload trùng id bị từ chối mà không lấy mất phản hồi của upload đang chạy.
+"""
+
+import asyncio
+import json
+import socket
+
+import pytest
+
+import async_client
+import client
+
+
+@pytest.fixture
+def idle_server():
+    """ Server chỉ nhận kết nối, không trả lời gì """
+    listener = socket.create_server(("127.0.0.1", 0))
+    yield listener
+    listener.close()
+
+
+def test_register_rejects_duplicate_upload_id(idle_server):
+    mux = client.MuxConnection("127.0.0.1", idle_server.getsockname()[1], timeout=1)
+    peer, _ = idle_server.accept()
+    try:
+        mux.register("u1")
+        with pytest.raises(ValueError):
+            mux.register("u1")
+        mux.unregister("u1")
+        mux.register("u1")  # gỡ rồi thì đăng ký lại được
+
+        # Phản hồi vẫn tới đúng hàng đợi đã đăng ký đầu tiên
+        peer.sendall((json.dumps({"upload_id": "u1", "status": "ok"}) + "\n").encode())
+        assert mux.wait("u1") == {"upload_id": "u1", "status": "ok"}
+    finally:
+        mux.close()
+        peer.close()
+
+
+def test_upload_with_duplicate_id_fails_without_stealing_queue(idle_server, tmp_path):
+    mux = client.MuxConnection("127.0.0.1", idle_server.getsockname()[1], timeout=1)
+    peer, _ = idle_server.accept()
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"abc")
+    try:
+        mux.register("dup")
+        up = client.UploadClient(str(path), token="t", upload_id="dup", mux=mux, verbose=False)
+        assert up.upload() is False
+        assert "dup" in mux._queues
+        peer.sendall((json.dumps({"upload_id": "dup", "status": "ok"}) + "\n").encode())
+        assert mux.wait("dup")["status"] == "ok"
+    finally:
+        mux.close()
+        peer.close()
+
+
+def test_async_register_rejects_duplicate_upload_id(idle_server, tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"abc")
+
+    async def scenario():
+        conn = await async_client.AsyncMuxConnection.open("127.0.0.1", idle_server.getsockname()[1])
+        try:
+            conn.register("dup")
+            with pytest.raises(ValueError):
+                conn.register("dup")
+            up = async_client.AsyncUploadClient(str(path), token="t", upload_id="dup", conn=conn)
+            assert await up._run() is False
+            assert up.state == "failed"
+            assert "dup" in conn._queues
+        finally:
+            await conn.close()
+
+    asyncio.run(scenario())
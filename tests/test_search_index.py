@@ -0,0 +1,72 @@
+"""
+test_search_index.py
+--------------------
+Chỉ mục tìm kiếm trong bộ nhớ (SearchIndex): bỏ dấu tiếng Việt, khớp tiền tố từ cuối,
+lọc quyền xem ngay trong chỉ mục, xếp hạng tên file trên mô tả, phân trang, snapshot.
+"""
+
+from search_index import SearchIndex, fold, tokenize
+
+
+def test_fold_and_tokenize_drop_vietnamese_marks():
+    assert fold("Giải Tích ĐỀ Cương") == "giai tich de cuong"
+    assert tokenize("Đề thi: Giải-tích_2024!") == ["de", "thi", "giai", "tich", "2024"]
+    assert tokenize("") == []
+
+
+def make_index():
+    index = SearchIndex()
+    index.add(1, 10, "public", 100.0, filename="Giải tích 1.pdf", tags=["toán"])
+    index.add(2, 10, "private", 200.0, filename="Giải tích 2.pdf")
+    index.add(3, 20, "public", 300.0, filename="Vật lý.pdf", description="bài tập giải tích")
+    return index
+
+
+def test_search_matches_without_diacritics_and_by_prefix():
+    index = make_index()
+    assert index.search("giai tich", user_id=10)[0][:2] in ([1, 2], [2, 1])
+    assert set(index.search("GIẢI", user_id=10)[0]) == {1, 2, 3}
+    # Từ cuối khớp theo tiền tố, các từ trước phải khớp nguyên từ
+    assert set(index.search("giai ti", user_id=10)[0]) == {1, 2, 3}
+    assert index.search("gia tich", user_id=10) == ([], 0)
+    assert index.search("khong co", user_id=10) == ([], 0)
+
+
+def test_search_filters_visibility_inside_index():
+    index = make_index()
+    assert set(index.search("giai", user_id=10)[0]) == {1, 2, 3}
+    assert set(index.search("giai", user_id=20)[0]) == {1, 3}
+    assert set(index.search("giai", user_id=None)[0]) == {1, 3}
+
+
+def test_search_ranks_filename_above_description():
+    ids, total = make_index().search("giai tich", user_id=20)
+    assert total == 2
+    assert ids == [1, 3]
+
+
+def test_search_offset_pages_cover_all_results_once():
+    index = SearchIndex()
+    for doc_id in range(1, 8):
+        index.add(doc_id, 1, "public", 100.0, filename=f"de thi {doc_id}")
+    everything, total = index.search("de", user_id=2)
+    pages = [index.search("de", user_id=2, limit=3, offset=offset) for offset in (0, 3, 6)]
+    assert total == 7 and all(page_total == 7 for _, page_total in pages)
+    assert sum((ids for ids, _ in pages), []) == everything
+    assert index.search("de", user_id=2, limit=3, offset=9) == ([], 7)
+
+
+def test_search_index_update_remove_and_snapshot(tmp_path):
+    index = make_index()
+    index.add(1, 10, "private", 100.0, filename="Đại số.pdf")
+    assert 1 not in index.search("giai", user_id=20)[0]
+    assert index.search("dai so", user_id=20) == ([], 0)
+    index.remove(3)
+    assert index.search("vat ly", user_id=20) == ([], 0)
+
+    path = str(tmp_path / "index.pkl")
+    index.save(path, saved_at=123.0)
+    loaded = SearchIndex.load(path)
+    assert loaded.saved_at == 123.0 and len(loaded) == len(index)
+    assert loaded.search("dai", user_id=10) == index.search("dai", user_id=10)
+    assert SearchIndex.load(str(tmp_path / "missing.pkl")) is None
@@ -0,0 +1,67 @@
+"""
+test_state_store.py
+-------------------
+StateStore của client: mỗi upload một file record, ghi atomic (không để lại file tạm),
+record hỏng / không có coi như chưa lưu, nhiều luồng ghi cùng lúc không mất record nào.
+"""
+
+import os
+import threading
+
+import client
+from client import StateStore
+
+
+def test_put_get_delete_one_file_per_upload(tmp_path):
+    store = StateStore(str(tmp_path / "state"))
+    assert store.get("a") == {}
+    store.put("a", 100)
+    store.put("b", 200)
+    store.put("a", 300)
+    assert store.get("a")["offset"] == 300 and store.get("a")["upload_id"] == "a"
+    assert store.get("b")["offset"] == 200
+    # Mỗi upload một file, không còn file tạm
+    assert sorted(os.listdir(tmp_path / "state")) == sorted(
+        os.path.basename(store._record_path(uid)) for uid in ("a", "b"))
+
+    store.delete("a")
+    store.delete("a")  # xóa lần hai không lỗi
+    assert store.get("a") == {}
+    assert store.get("b")["offset"] == 200
+
+
+def test_corrupt_record_is_ignored(tmp_path):
+    store = StateStore(str(tmp_path))
+    with open(store._record_path("a"), "w", encoding="utf-8") as f:
+        f.write('{"upload_id": "a", "off')
+    assert store.get("a") == {}
+    with open(store._record_path("b"), "w", encoding="utf-8") as f:
+        f.write("[1, 2]")
+    assert store.get("b") == {}
+    store.put("a", 5)
+    assert store.get("a")["offset"] == 5
+
+
+def test_concurrent_puts_keep_every_record(tmp_path):
+    store = StateStore(str(tmp_path))
+
+    def worker(n):
+        for offset in range(20):
+            store.put(f"upload-{n}", offset)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [store.get(f"upload-{n}")["offset"] for n in range(8)] == [19] * 8
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_module_helpers_use_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(client, "store", StateStore(str(tmp_path)))
+    assert client.load_state("x") == 0
+    client.save_state("x", 4096)
+    assert client.load_state("x") == 4096
+    client.clear_state("x")
+    assert client.load_state("x") == 0
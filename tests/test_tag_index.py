@@ -0,0 +1,31 @@
+"""
+test_tag_index.py
+-----------------
+Gợi ý tag (TagIndex): khớp đầu từ bất kỳ, không phân biệt dấu, xếp hạng theo vị trí khớp
+rồi số tài liệu, ẩn tag không còn tài liệu nào.
+"""
+
+from tag_index import TagIndex
+
+
+def test_tag_suggest_matches_start_of_any_word_without_diacritics():
+    tags = TagIndex({"kinh tế vĩ mô": 3, "kinh tế vi mô": 5, "toán cao cấp": 1})
+    assert [name for name, _ in tags.suggest("kinh te")] == ["kinh tế vi mô", "kinh tế vĩ mô"]
+    assert [name for name, _ in tags.suggest("vĩ m")] == ["kinh tế vi mô", "kinh tế vĩ mô"]
+    assert tags.suggest("cao") == [("toán cao cấp", 1)]
+    assert tags.suggest("ao") == []
+    assert tags.suggest("   ") == []
+
+
+def test_tag_suggest_ranks_name_start_then_count_and_hides_unused():
+    tags = TagIndex({"toán rời rạc": 1, "đề thi toán": 9, "toán cao cấp": 4, "toán mới": 0})
+    assert tags.suggest("toan") == [("toán cao cấp", 4), ("toán rời rạc", 1), ("đề thi toán", 9)]
+    assert tags.suggest("toan", limit=1) == [("toán cao cấp", 4)]
+
+    tags.update(["toán cao cấp"], ["toán mới"])
+    assert ("toán mới", 1) in tags.suggest("toan")
+    assert "toán cao cấp" in [name for name, _ in tags.suggest("toan")]
+    tags.add("toán cao cấp", -10)
+    assert "toán cao cấp" not in [name for name, _ in tags.suggest("toan")]
+    tags.add("xác suất", 2)
+    assert tags.suggest("xac") == [("xác suất", 2)]
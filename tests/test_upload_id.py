@@ -0,0 +1,61 @@
+"""
+test_upload_id.py
+-----------------
+upload_id của client: ổn định giữa các lần chạy, khác nhau giữa người dùng / nội dung / đường dẫn.
+"""
+
+import base64
+import json
+import os
+
+from client import make_upload_id
+
+
+def jwt_like(user_id):
+    """ Token chỉ cần phần payload đọc được (make_upload_id không verify chữ ký) """
+    payload = base64.urlsafe_b64encode(json.dumps({"user_id": user_id}).encode()).decode().rstrip("=")
+    return f"header.{payload}.signature"
+
+
+def test_upload_id_is_stable(tmp_path, monkeypatch):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"noi dung" * 1000)
+    first = make_upload_id(str(path), jwt_like(1))
+    assert first.endswith("_report.pdf")
+    assert make_upload_id(str(path), jwt_like(1)) == first
+    # Đường dẫn tương đối tới cùng file cho cùng id
+    monkeypatch.chdir(tmp_path)
+    assert make_upload_id("report.pdf", jwt_like(1)) == first
+
+
+def test_upload_id_differs_by_user_and_content(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"a" * 5000)
+    base = make_upload_id(str(path), jwt_like(1))
+    assert make_upload_id(str(path), jwt_like(2)) != base
+    path.write_bytes(b"b" * 5000)
+    os.utime(path, (1, 1))
+    assert make_upload_id(str(path), jwt_like(1)) != base
+
+
+def test_same_file_name_in_different_folders_do_not_collide(tmp_path):
+    paths = []
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+        path = tmp_path / folder / "report.pdf"
+        path.write_bytes(b"giong het nhau")
+        os.utime(path, (1000, 1000))
+        paths.append(str(path))
+    ids = {make_upload_id(path, jwt_like(1)) for path in paths}
+    assert len(ids) == 2
+
+
+def test_large_file_fingerprint_is_sampled(tmp_path):
+    path = tmp_path / "big.bin"
+    path.write_bytes(bytes(1024 * 1024))
+    base = make_upload_id(str(path))
+    # Đổi một byte trong block đầu (luôn được lấy mẫu) -> id đổi
+    with open(path, "r+b") as f:
+        f.write(b"\x01")
+    os.utime(path, (os.stat(path).st_atime, os.stat(path).st_mtime))
+    assert make_upload_id(str(path)) != base
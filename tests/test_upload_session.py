@@ -0,0 +1,160 @@
+"""
+test_upload_session.py
+----------------------
+Phiên upload trên socket server (handle_upload_action) và upload streaming của client:
+chốt bằng 'finish', size_mismatch, 'finish' lặp lại, resume khi mất phản hồi.
+"""
+
+import io
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+import client
+import server
+from persistence import Persistence
+
+
+@pytest.fixture
+def upload_server(tmp_path, monkeypatch):
+    """ server.py với thư mục lưu / trạng thái riêng cho mỗi test; ghi lại các lần báo hoàn tất """
+    completed = []
+    monkeypatch.setattr(server, "STORAGE_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(server, "state", Persistence(str(tmp_path / "uploads_state.json")))
+    monkeypatch.setattr(server, "recent_finished", OrderedDict())
+    monkeypatch.setattr(server.backend, "notify_completion",
+                        lambda upload_id, path, metadata: completed.append((upload_id, path)))
+    return completed
+
+
+def call(header, data=None):
+    """ Gọi một action, trả về phản hồi của server """
+    replies = []
+    assert server.handle_upload_action(header, lambda n: data, replies.append, "test")
+    assert len(replies) == 1
+    return replies[0]
+
+
+def start_stream(upload_id="u1"):
+    return call({"action": "start", "upload_id": upload_id, "filename": "a.bin", "streaming": True})
+
+
+def test_finish_size_mismatch_returns_real_offset(upload_server):
+    start_stream()
+    assert call({"action": "chunk", "upload_id": "u1", "offset": 0, "length": 5}, b"hello")["offset"] == 5
+    reply = call({"action": "finish", "upload_id": "u1", "filesize": 8})
+    assert reply == {"status": "error", "upload_id": "u1", "reason": "size_mismatch", "offset": 5}
+    assert not upload_server
+    # Gửi tiếp từ offset thật rồi chốt lại
+    call({"action": "chunk", "upload_id": "u1", "offset": 5, "length": 3}, b"abc")
+    assert call({"action": "finish", "upload_id": "u1", "filesize": 8})["state"] == "completed"
+    with open(upload_server[0][1], "rb") as f:
+        assert f.read() == b"helloabc"
+
+
+def test_finish_is_idempotent(upload_server):
+    start_stream()
+    call({"action": "chunk", "upload_id": "u1", "offset": 0, "length": 4}, b"data")
+    first = call({"action": "finish", "upload_id": "u1", "filesize": 4})
+    assert first["status"] == "ok" and first["state"] == "completed"
+    assert not server.state.get("u1")
+
+    # Mất phản hồi, client gửi lại: cùng kích thước -> cùng phản hồi, không báo hoàn tất lần hai
+    assert call({"action": "finish", "upload_id": "u1", "filesize": 4}) == first
+    assert len(upload_server) == 1
+    assert call({"action": "finish", "upload_id": "u1", "filesize": 5})["reason"] == "unknown_upload"
+
+
+def test_finish_requires_streaming_upload(upload_server):
+    call({"action": "start", "upload_id": "u2", "filename": "b.bin", "filesize": 10})
+    assert call({"action": "finish", "upload_id": "u2", "filesize": 0})["reason"] == "not_streaming"
+    assert call({"action": "finish", "upload_id": "nope", "filesize": 0})["reason"] == "unknown_upload"
+
+
+def test_start_after_finish_keeps_completed_marker(upload_server):
+    start_stream()
+    call({"action": "finish", "upload_id": "u1", "filesize": 0})
+    # Phiên mới cùng id không xóa dấu hoàn tất của phiên cũ...
+    start_stream()
+    call({"action": "chunk", "upload_id": "u1", "offset": 0, "length": 2}, b"ab")
+    # ...và 'finish' của phiên mới vẫn được xử lý thật
+    assert call({"action": "finish", "upload_id": "u1", "filesize": 2})["offset"] == 2
+    assert len(upload_server) == 2
+
+
+# ==============================
+# 🌊 StreamUploadClient
+# ==============================
+@pytest.fixture
+def tcp_server(upload_server, monkeypatch):
+    """ Chạy handle_client của server.py trên một cổng ngẫu nhiên """
+    listener = socket.create_server(("127.0.0.1", 0))
+    monkeypatch.setattr(client, "SERVER_PORT", listener.getsockname()[1])
+    monkeypatch.setattr(client.time, "sleep", lambda seconds: None)
+
+    def serve():
+        while True:
+            try:
+                conn, addr = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=server.handle_client, args=(conn, addr), daemon=True).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield upload_server
+    listener.close()
+
+
+def wait_completed(completed, count=1, timeout=5):
+    """ Server trả 'completed' trước rồi mới báo Flask (trên luồng của kết nối): chờ luồng đó """
+    deadline = time.monotonic() + timeout
+    while len(completed) < count and time.monotonic() < deadline:
+        threading.Event().wait(0.01)
+    return completed
+
+
+def test_stream_upload_resends_finish_when_reply_is_lost(tcp_server, monkeypatch):
+    send_json = server.send_json
+    dropped = []
+
+    def drop_first_completed(conn, obj):
+        if obj.get("state") == "completed" and not dropped:
+            # Server đã hoàn tất nhưng phản hồi không tới client
+            dropped.append(obj)
+            conn.shutdown(socket.SHUT_RDWR)
+            return False
+        return send_json(conn, obj)
+
+    monkeypatch.setattr(server, "send_json", drop_first_completed)
+    payload = b"x" * 200000
+    up = client.StreamUploadClient(io.BytesIO(payload), "stream.bin", token="t", verbose=False)
+    assert up.upload()
+    assert dropped
+    # Hoàn tất đúng một lần, không để lại phiên rỗng mới
+    assert len(wait_completed(tcp_server)) == 1
+    assert server.state.load() == {}
+    with open(tcp_server[0][1], "rb") as f:
+        assert f.read() == payload
+
+
+def test_stream_upload_resumes_unacked_chunk(tcp_server, monkeypatch):
+    send_json = server.send_json
+    dropped = []
+
+    def drop_first_chunk_ack(conn, obj):
+        if obj.get("offset") and "state" not in obj and not dropped:
+            dropped.append(obj)
+            conn.shutdown(socket.SHUT_RDWR)
+            return False
+        return send_json(conn, obj)
+
+    monkeypatch.setattr(server, "send_json", drop_first_chunk_ack)
+    payload = bytes(range(256)) * 1000
+    up = client.StreamUploadClient(iter([payload[:100000], payload[100000:]]), "s.bin", token="t", verbose=False)
+    assert up.upload()
+    assert dropped and len(wait_completed(tcp_server)) == 1
+    with open(tcp_server[0][1], "rb") as f:
+        assert f.read() == payload
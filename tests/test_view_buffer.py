@@ -0,0 +1,71 @@
+"""
+test_view_buffer.py
+-------------------
+ViewBuffer: gộp lượt xem lặp lại, đọc xuyên buffer (kể cả lô đang ghi), ghi lỗi thì giữ lại
+mà không ghi đè lượt xem mới hơn, đầy buffer thì ghi sớm.
+"""
+
+import threading
+
+from view_buffer import ViewBuffer
+
+
+def test_repeated_views_merge_keeping_latest():
+    batches = []
+    buf = ViewBuffer(batches.append, interval=3600)
+    buf.add(1, 10, 100.0)
+    buf.add(1, 10, 300.0)
+    buf.add(1, 10, 200.0)
+    buf.add(2, 10, 50.0)
+    assert buf.pending(1) == {10: 300.0}
+    assert buf.flush() == 2
+    assert sorted(batches[0]) == [(1, 10, 300.0), (2, 10, 50.0)]
+    assert buf.pending(1) == {} and buf.flush() == 0
+
+
+def test_pending_sees_inflight_batch():
+    seen = []
+    buf = ViewBuffer(lambda items: seen.append(buf.pending(1)), interval=3600)
+    buf.add(1, 10, 100.0)
+    buf.flush()
+    # Trong lúc flush_fn chạy, lượt xem vẫn đọc được
+    assert seen == [{10: 100.0}]
+
+
+def test_failed_flush_keeps_views_without_overwriting_newer():
+    calls = []
+
+    def failing(items):
+        calls.append(items)
+        # Lượt xem mới hơn tới trong lúc đang ghi
+        buf.add(1, 10, 500.0)
+        raise RuntimeError("db down")
+
+    buf = ViewBuffer(failing, interval=3600)
+    buf.add(1, 10, 100.0)
+    buf.add(1, 11, 100.0)
+    assert buf.flush() == 0
+    assert buf.pending(1) == {10: 500.0, 11: 100.0}
+
+    written = []
+    buf.flush_fn = written.extend
+    assert buf.flush() == 2
+    assert sorted(written) == [(1, 10, 500.0), (1, 11, 100.0)]
+
+
+def test_discard_document_returns_viewers():
+    buf = ViewBuffer(lambda items: None, interval=3600)
+    buf.add(1, 10, 1.0)
+    buf.add(2, 10, 1.0)
+    buf.add(2, 11, 1.0)
+    assert buf.discard_document(10) == {1, 2}
+    assert buf.pending(2) == {11: 1.0}
+    assert buf.flush() == 1
+
+
+def test_full_buffer_flushes_early():
+    done = threading.Event()
+    buf = ViewBuffer(lambda items: done.set(), interval=3600, max_pending=3)
+    for doc_id in range(3):
+        buf.add(1, doc_id, 1.0)
+    assert done.wait(5)
@@ -0,0 +1,136 @@
+"""
+test_ws_protocol.py
+-------------------
+Framing WebSocket phía server (ws_protocol): bắt tay, bỏ mask frame của trình duyệt,
+ghép fragment, trả lời ping / close, từ chối frame sai giao thức hoặc message quá lớn.
+"""
+
+import os
+import socket
+import struct
+
+import pytest
+
+from ws_protocol import (CLOSE_TOO_BIG, OP_BINARY, OP_CLOSE, OP_CONT, OP_PING, OP_PONG, OP_TEXT,
+                         WebSocket, WebSocketError, accept_key)
+
+
+def client_frame(opcode, payload, fin=True, mask=b"\x01\x02\x03\x04"):
+    """ Frame từ phía trình duyệt (bắt buộc có mask) """
+    n = len(payload)
+    head = bytes([(0x80 if fin else 0) | opcode])
+    if n < 126:
+        head += bytes([0x80 | n])
+    elif n < 1 << 16:
+        head += bytes([0x80 | 126]) + struct.pack("!H", n)
+    else:
+        head += bytes([0x80 | 127]) + struct.pack("!Q", n)
+    masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return head + mask + masked
+
+
+def read_server_frame(sock):
+    """ (opcode, payload) của một frame server gửi (không mask) """
+    rf = sock.makefile("rb")
+    b1, b2 = rf.read(2)
+    assert b1 & 0x80 and not b2 & 0x80
+    n = b2 & 0x7F
+    if n == 126:
+        n = struct.unpack("!H", rf.read(2))[0]
+    elif n == 127:
+        n = struct.unpack("!Q", rf.read(8))[0]
+    return b1 & 0x0F, rf.read(n)
+
+
+@pytest.fixture
+def ws_pair():
+    server, client = socket.socketpair()
+    server.settimeout(5)
+    client.settimeout(5)
+    yield WebSocket(server, max_message=1 << 20), client
+    server.close()
+    client.close()
+
+
+def test_accept_key_rfc_example():
+    assert accept_key("dGhlIHNhbXBsZSBub25jZQ==") == "s3pPLMBiTxaQ9kYGzzhZRbK+xOo="
+
+
+def test_handshake(ws_pair):
+    ws, client = ws_pair
+    client.sendall(b"GET /upload HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                   b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n")
+    assert ws.handshake() and ws.path == "/upload"
+    reply = client.recv(4096)
+    assert reply.startswith(b"HTTP/1.1 101")
+    assert b"Sec-WebSocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=\r\n" in reply
+
+
+def test_handshake_rejects_plain_http(ws_pair):
+    ws, client = ws_pair
+    client.sendall(b"GET / HTTP/1.1\r\nHost: x\r\n\r\n")
+    assert not ws.handshake()
+    assert client.recv(4096).startswith(b"HTTP/1.1 400")
+
+
+@pytest.mark.parametrize("size", [0, 125, 126, 65535, 65536])
+def test_recv_unmasks_all_length_encodings(ws_pair, size):
+    ws, client = ws_pair
+    payload = os.urandom(size)
+    client.sendall(client_frame(OP_BINARY, payload))
+    assert ws.recv() == (OP_BINARY, payload)
+
+
+def test_recv_joins_fragments_and_answers_ping(ws_pair):
+    ws, client = ws_pair
+    client.sendall(client_frame(OP_TEXT, b'{"action":', fin=False)
+                   + client_frame(OP_PING, b"hi")
+                   + client_frame(OP_CONT, b'"start"}'))
+    assert ws.recv() == (OP_TEXT, b'{"action":"start"}')
+    assert read_server_frame(client) == (OP_PONG, b"hi")
+
+
+def test_recv_close_returns_none_and_replies_close(ws_pair):
+    ws, client = ws_pair
+    client.sendall(client_frame(OP_CLOSE, struct.pack("!H", 1000)))
+    assert ws.recv() is None and ws.closed
+    assert read_server_frame(client) == (OP_CLOSE, struct.pack("!H", 1000))
+
+
+@pytest.mark.parametrize("frames, reason", [
+    (lambda: bytes([0x80 | OP_TEXT, 2]) + b"hi", "unmasked_client_frame"),
+    (lambda: bytes([0xC0 | OP_TEXT]) + client_frame(OP_TEXT, b"x")[1:], "rsv_bits_set"),
+    (lambda: client_frame(OP_CONT, b"x"), "unexpected_continuation"),
+    (lambda: client_frame(OP_TEXT, b"a", fin=False) + client_frame(OP_BINARY, b"b"), "interleaved_message"),
+    (lambda: client_frame(OP_PING, b"x" * 126), "invalid_control_frame"),
+    (lambda: client_frame(0x3, b"x"), "unknown_opcode"),
+])
+def test_recv_rejects_protocol_errors(ws_pair, frames, reason):
+    ws, client = ws_pair
+    client.sendall(frames())
+    with pytest.raises(WebSocketError, match=reason):
+        ws.recv()
+
+
+@pytest.mark.parametrize("frames", [
+    lambda: client_frame(OP_BINARY, b"x" * 101),
+    # Từng frame nhỏ nhưng tổng message quá lớn
+    lambda: client_frame(OP_BINARY, b"x" * 60, fin=False) + client_frame(OP_CONT, b"x" * 60),
+])
+def test_recv_rejects_oversized_messages(ws_pair, frames):
+    ws, client = ws_pair
+    ws.max_message = 100
+    client.sendall(frames())
+    with pytest.raises(WebSocketError) as error:
+        ws.recv()
+    assert error.value.code == CLOSE_TOO_BIG
+
+
+def test_send_json_frame(ws_pair):
+    ws, client = ws_pair
+    assert ws.send_json({"status": "ok", "offset": 5})
+    assert read_server_frame(client) == (OP_TEXT, b'{"status": "ok", "offset": 5}')
+    big = {"data": "x" * 70000}
+    assert ws.send_json(big)
+    opcode, payload = read_server_frame(client)
+    assert opcode == OP_TEXT and len(payload) == len('{"data": ""}') + 70000
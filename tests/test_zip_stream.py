@@ -0,0 +1,41 @@
+"""
+test_zip_stream.py
+------------------
+Tải nhiều tài liệu thành một file ZIP gửi dần (stream_zip): tên trùng được đánh số,
+file nén được mới nén, file mất trên đĩa bị bỏ qua.
+"""
+
+import io
+import os
+import zipfile
+
+from zip_stream import stream_zip, unique_names
+
+
+def test_unique_names_case_insensitive():
+    assert list(unique_names(["a.pdf", "A.pdf", "a.pdf", "b"])) == ["a.pdf", "A (2).pdf", "a (3).pdf", "b"]
+
+
+def test_stream_zip_round_trip(tmp_path):
+    text = tmp_path / "ghi chú.txt"
+    text.write_bytes(b"noi dung " * 20000)
+    pdf = tmp_path / "de.pdf"
+    pdf.write_bytes(os.urandom(200000))
+    names = list(unique_names(["ghi chú.txt", "de.pdf", "de.pdf", "mat.txt"]))
+    entries = list(zip(names, [str(text), str(pdf), str(pdf), str(tmp_path / "mat.txt")]))
+
+    chunks = list(stream_zip(entries, chunk_size=4096))
+    assert len(chunks) > 3  # gửi dần, không phải một khối
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert zf.testzip() is None
+        # File không đọc được bị bỏ qua
+        assert zf.namelist() == ["ghi chú.txt", "de.pdf", "de (2).pdf"]
+        assert zf.read("ghi chú.txt") == text.read_bytes()
+        assert zf.read("de (2).pdf") == pdf.read_bytes()
+        assert zf.getinfo("ghi chú.txt").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.getinfo("de.pdf").compress_type == zipfile.ZIP_STORED
+
+
+def test_stream_zip_empty():
+    with zipfile.ZipFile(io.BytesIO(b"".join(stream_zip([])))) as zf:
+        assert zf.namelist() == []